@@ -0,0 +1,140 @@
+# Barrovivo/consultas.py
+"""
+Presupuesto de consultas por vista.
+
+Una vista declara cuántas consultas SQL puede hacer por request (en todas las
+bases: primaria y réplicas), sin importar cuántos pedidos o productos muestre:
+
+    class PerfilView(LoginRequiredMixin, TemplateView):
+        presupuesto_consultas = 5
+
+o, en vistas función, con el decorador @presupuesto_consultas(5).
+
+PresupuestoConsultasMiddleware compara con el presupuesto las consultas que ya
+cuenta Barrovivo.rendimiento (Medicion de la request); las vistas sin
+presupuesto no cuestan nada extra. Si se pasa, según PRESUPUESTO_CONSULTAS:
+- "error": lanza PresupuestoConsultasExcedido con el SQL de la request. Es lo
+  que pone Barrovivo.pruebas.PruebasRunner (TEST_RUNNER), así un N+1 nuevo
+  hace fallar el test que visite la vista.
+- "log": lo deja en el log (producción), solo con el conteo.
+- "": no revisa nada.
+Las respuestas en streaming se cuentan solo hasta armar la respuesta.
+"""
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from Barrovivo import rendimiento
+
+logger = logging.getLogger(__name__)
+
+
+class PresupuestoConsultasExcedido(AssertionError):
+    pass
+
+
+def presupuesto_consultas(n: int):
+    """Para vistas función (en las de clase basta el atributo)."""
+    def decorador(vista):
+        vista.presupuesto_consultas = n
+        return vista
+    return decorador
+
+
+def presupuesto_de(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None
+    vista = getattr(match.func, "view_class", match.func)
+    return getattr(vista, "presupuesto_consultas", None)
+
+
+class PresupuestoConsultasMiddleware:
+    """Después de RendimientoMiddleware (usa su Medicion) y antes de sesión y usuario, para contarlos."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        modo = getattr(settings, "PRESUPUESTO_CONSULTAS", "")
+        if not modo:
+            return self.get_response(request)
+        medicion, token = self._empezar(request)
+        inicio = medicion.consultas
+        try:
+            response = self.get_response(request)
+        finally:
+            self._soltar(request, token)
+        return self._revisar(request, response, modo, medicion.consultas - inicio)
+
+    async def __acall__(self, request):
+        modo = getattr(settings, "PRESUPUESTO_CONSULTAS", "")
+        if not modo:
+            return await self.get_response(request)
+        medicion, token = self._empezar(request)
+        inicio = medicion.consultas
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._soltar(request, token)
+        return self._revisar(request, response, modo, medicion.consultas - inicio)
+
+    def _empezar(self, request):
+        medicion = rendimiento._medicion.get()
+        token = None
+        if medicion is None:  # sin RendimientoMiddleware: se mide aquí
+            medicion = rendimiento.Medicion()
+            token = rendimiento._medicion.set(medicion)
+        request._presupuesto_sql = None
+        return medicion, token
+
+    def _soltar(self, request, token) -> None:
+        if token is not None:
+            rendimiento._medicion.reset(token)
+        anotadas = request._presupuesto_sql
+        if anotadas is not None:
+            conexiones, anotar, _ = anotadas
+            # Por identidad: si en la request se abrió una conexión, connection_created le
+            # agregó sus wrappers después de `anotar` y sacar "el último" quitaría el ajeno
+            for conexion in conexiones:
+                try:
+                    conexion.execute_wrappers.remove(anotar)
+                except ValueError:
+                    pass
+
+    def _revisar(self, request, response, modo: str, usadas: int):
+        anotadas = request._presupuesto_sql
+        limite = presupuesto_de(request)
+        if limite is not None and usadas > limite:
+            mensaje = f"{request.method} {request.path}: {usadas} consultas, presupuesto {limite}"
+            if modo == "error":
+                sql = anotadas[2] if anotadas is not None else []
+                raise PresupuestoConsultasExcedido(mensaje + ":\n" + "\n".join(sql))
+            logger.warning(mensaje)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # El SQL para el mensaje solo se junta en "error" y en vistas con presupuesto
+        if getattr(settings, "PRESUPUESTO_CONSULTAS", "") != "error" or presupuesto_de(request) is None:
+            return None
+        consultas = []
+
+        def anotar(execute, sql, params, many, context):
+            consultas.append(sql)
+            return execute(sql, params, many, context)
+
+        conexiones = connections.all(initialized_only=False)
+        for conexion in conexiones:
+            conexion.execute_wrappers.append(anotar)
+        request._presupuesto_sql = (conexiones, anotar, consultas)
+        return None
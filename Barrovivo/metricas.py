@@ -0,0 +1,58 @@
+# Barrovivo/metricas.py
+"""
+Base común de las métricas en memoria (por proceso): chat (usuario.metricas_chat),
+caché del catálogo (producto.cache_catalogo) y rendimiento por vista
+(Barrovivo.rendimiento).
+
+VentanaMetricas lleva, por clave (ruta, vista...), contadores que solo suman y
+las últimas `muestras` observaciones de cada serie para sacar cuantiles.
+"""
+import threading
+from collections import deque
+from typing import Dict, Iterable, Optional, Tuple
+
+
+def percentil(ordenadas, p: float) -> float:
+    if not ordenadas:
+        return 0.0
+    i = min(len(ordenadas) - 1, max(0, int(round(p / 100 * (len(ordenadas) - 1)))))
+    return ordenadas[i]
+
+
+class VentanaMetricas:
+    def __init__(self, muestras: int = 1000):
+        self.muestras = muestras
+        self._lock = threading.Lock()
+        self._claves: Dict[str, Tuple[Dict[str, float], Dict[str, deque]]] = {}
+
+    def registrar(self, clave: str, contadores: Optional[Dict[str, float]] = None,
+                  observaciones: Optional[Dict[str, float]] = None) -> None:
+        with self._lock:
+            sumas, series = self._claves.setdefault(clave, ({}, {}))
+            for nombre, n in (contadores or {}).items():
+                sumas[nombre] = sumas.get(nombre, 0) + n
+            for nombre, valor in (observaciones or {}).items():
+                series.setdefault(nombre, deque(maxlen=self.muestras)).append(valor)
+
+    def foto(self, cuantiles: Iterable[float] = (50, 95, 99)) -> Dict[str, dict]:
+        """
+        {clave: {"contadores": {...}, "cuantiles": {serie: {p: valor}}}}, ordenado por clave.
+        Copia bajo el candado y ordena las muestras fuera de él.
+        """
+        with self._lock:
+            copia = {
+                clave: (dict(sumas), {nombre: list(d) for nombre, d in series.items()})
+                for clave, (sumas, series) in self._claves.items()
+            }
+        foto = {}
+        for clave, (sumas, series) in sorted(copia.items()):
+            por_serie = {}
+            for nombre, valores in series.items():
+                ordenadas = sorted(valores)
+                por_serie[nombre] = {p: percentil(ordenadas, p) for p in cuantiles}
+            foto[clave] = {"contadores": sumas, "cuantiles": por_serie}
+        return foto
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._claves.clear()
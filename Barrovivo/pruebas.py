@@ -0,0 +1,11 @@
+# Barrovivo/pruebas.py
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class PruebasRunner(DiscoverRunner):
+    """Runner de `manage.py test`: presupuesto de consultas estricto (Barrovivo/consultas.py)."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.PRESUPUESTO_CONSULTAS = "error"
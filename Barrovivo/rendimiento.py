@@ -0,0 +1,258 @@
+# Barrovivo/rendimiento.py
+"""
+Métricas de rendimiento por vista (por proceso, como usuario.metricas_chat).
+
+RendimientoMiddleware mide cada request y lo agrupa por el nombre de la URL
+resuelta ("pedido:carrito", "usuario:chat_api"...; "<sin_ruta>" si no resolvió):
+- total: desde que entra al middleware hasta tener la respuesta (en streaming,
+  hasta que termina el stream, p. ej. el chat por SSE).
+- db: consultas SQL y su tiempo, en todas las conexiones (medir_consulta se
+  instala en cada conexión con connection_created, ver PedidoConfig.ready).
+- plantillas: el render de las TemplateResponse (las vistas basadas en clase).
+- groq: llamadas salientes a la API del LLM (usuario.groq_client usa medir()).
+
+Guarda las últimas MUESTRAS requests de cada vista para p50/p95/p99, que se ven
+en JSON (usuario:rendimiento_metricas, staff) y en formato de texto de
+Prometheus (usuario:rendimiento_prometheus). Si SERVER_TIMING está activo, la
+respuesta lleva la cabecera Server-Timing con lo mismo (no en streaming: las
+cabeceras salen antes de medir).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from Barrovivo.metricas import VentanaMetricas
+
+MUESTRAS = 1000  # ventana por vista
+SIN_RUTA = "<sin_ruta>"
+COMPONENTES = ("total", "db", "plantillas", "groq")
+CUANTILES = (50, 95, 99)
+
+# Medición de la request en curso (None fuera de una request). Se hereda en
+# sync_to_async/async_to_sync, así cuentan también las consultas de otro hilo.
+_medicion: ContextVar[Optional["Medicion"]] = ContextVar("rendimiento_medicion", default=None)
+
+
+class Medicion:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.segundos: Dict[str, float] = dict.fromkeys(COMPONENTES, 0.0)
+        self._lock = threading.Lock()
+
+    def sumar(self, componente: str, segundos: float, consultas: int = 0) -> None:
+        with self._lock:
+            self.segundos[componente] += segundos
+            self.consultas += consultas
+
+    def terminar(self) -> None:
+        self.segundos["total"] = time.perf_counter() - self.inicio
+
+    def server_timing(self) -> str:
+        partes = [f'db;dur={self.segundos["db"] * 1000:.1f};desc="{self.consultas} consultas"']
+        for componente in ("plantillas", "groq"):
+            if self.segundos[componente]:
+                partes.append(f"{componente};dur={self.segundos[componente] * 1000:.1f}")
+        partes.append(f'total;dur={self.segundos["total"] * 1000:.1f}')
+        return ", ".join(partes)
+
+
+@contextmanager
+def medir(componente: str):
+    """Suma lo que tarde el bloque al componente de la request en curso (si hay)."""
+    medicion = _medicion.get()
+    if medicion is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.sumar(componente, time.perf_counter() - inicio)
+
+
+def medir_consulta(execute, sql, params, many, context):
+    """execute_wrapper de todas las conexiones; fuera de una request no hace nada."""
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.sumar("db", time.perf_counter() - inicio, consultas=1)
+
+
+def instalar_en_conexion(sender, connection, **kwargs) -> None:
+    # connection_created vuelve a llegar si la conexión se reabre
+    if medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_consulta)
+
+
+class MetricasRendimiento:
+    def __init__(self):
+        self._ventana = VentanaMetricas(MUESTRAS)
+
+    def registrar(self, vista: str, medicion: Medicion) -> None:
+        self._ventana.registrar(
+            vista,
+            {"requests": 1, "consultas": medicion.consultas, **medicion.segundos},
+            {"consultas": medicion.consultas, **medicion.segundos},
+        )
+
+    def _foto(self) -> Dict[str, dict]:
+        foto = {}
+        for nombre, datos in self._ventana.foto(CUANTILES).items():
+            c = datos["contadores"]
+            foto[nombre] = {
+                "requests": c["requests"],
+                "consultas": c["consultas"],
+                "acumulado": {componente: c[componente] for componente in COMPONENTES},
+                "cuantiles": datos["cuantiles"],
+            }
+        return foto
+
+    def resumen(self) -> dict:
+        vistas = {}
+        for nombre, v in self._foto().items():
+            fila = {"requests": v["requests"]}
+            for componente in COMPONENTES:
+                fila[componente] = {f"p{p}_ms": round(v["cuantiles"][componente][p] * 1000, 1) for p in CUANTILES}
+            fila["consultas"] = {f"p{p}": v["cuantiles"]["consultas"][p] for p in CUANTILES}
+            vistas[nombre] = fila
+        return {"muestras_por_vista": MUESTRAS, "vistas": vistas}
+
+    def prometheus(self) -> str:
+        """Formato de texto de Prometheus: un summary por vista y componente, y otro de consultas."""
+        foto = self._foto()
+        lineas = [
+            "# HELP barrovivo_request_segundos Tiempo por request, por vista y componente.",
+            "# TYPE barrovivo_request_segundos summary",
+        ]
+        for nombre, v in foto.items():
+            for componente in COMPONENTES:
+                etiquetas = f'vista="{_escapar(nombre)}",componente="{componente}"'
+                for p in CUANTILES:
+                    lineas.append(f'barrovivo_request_segundos{{{etiquetas},quantile="{p / 100}"}} '
+                                  f'{v["cuantiles"][componente][p]:.6f}')
+                lineas.append(f'barrovivo_request_segundos_sum{{{etiquetas}}} {v["acumulado"][componente]:.6f}')
+                lineas.append(f'barrovivo_request_segundos_count{{{etiquetas}}} {v["requests"]}')
+        lineas += [
+            "# HELP barrovivo_request_consultas Consultas SQL por request, por vista.",
+            "# TYPE barrovivo_request_consultas summary",
+        ]
+        for nombre, v in foto.items():
+            etiquetas = f'vista="{_escapar(nombre)}"'
+            for p in CUANTILES:
+                lineas.append(f'barrovivo_request_consultas{{{etiquetas},quantile="{p / 100}"}} '
+                              f'{v["cuantiles"]["consultas"][p]}')
+            lineas.append(f'barrovivo_request_consultas_sum{{{etiquetas}}} {v["consultas"]}')
+            lineas.append(f'barrovivo_request_consultas_count{{{etiquetas}}} {v["requests"]}')
+        return "\n".join(lineas) + "\n"
+
+    def reiniciar(self) -> None:
+        self._ventana.reiniciar()
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metricas = MetricasRendimiento()
+
+
+def nombre_vista(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None and match.view_name else SIN_RUTA
+
+
+class RendimientoMiddleware:
+    """
+    Va primero en MIDDLEWARE para que el total incluya todos los demás.
+    Sirve en WSGI y en ASGI sin cambiar de modo (las vistas async, como el chat
+    por SSE, siguen siendo async).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._terminar(request, response, medicion)
+
+    async def __acall__(self, request):
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._terminar(request, response, medicion)
+
+    def _terminar(self, request, response, medicion):
+        if response.streaming:
+            self._al_terminar_stream(request, response, medicion)
+            return response
+        medicion.terminar()
+        metricas.registrar(nombre_vista(request), medicion)
+        if getattr(settings, "SERVER_TIMING", False):
+            response["Server-Timing"] = medicion.server_timing()
+        return response
+
+    def process_template_response(self, request, response):
+        # Es el último process_template_response: el render viene justo después
+        inicio = time.perf_counter()
+        medicion = _medicion.get()
+        if medicion is not None:
+            response.add_post_render_callback(
+                lambda r: medicion.sumar("plantillas", time.perf_counter() - inicio)
+            )
+        return response
+
+    def _al_terminar_stream(self, request, response, medicion):
+        """Registra cuando se consume el stream; mientras, lo que haga cuenta para esta request."""
+        vista = nombre_vista(request)
+        contenido = response.streaming_content
+
+        def terminar():
+            medicion.terminar()
+            metricas.registrar(vista, medicion)
+
+        if response.is_async:
+            async def envuelto():
+                anterior = _medicion.get()
+                _medicion.set(medicion)
+                try:
+                    async for parte in contenido:
+                        yield parte
+                finally:
+                    _medicion.set(anterior)
+                    terminar()
+        else:
+            def envuelto():
+                anterior = _medicion.get()
+                _medicion.set(medicion)
+                try:
+                    yield from contenido
+                finally:
+                    _medicion.set(anterior)
+                    terminar()
+
+        response.streaming_content = envuelto()
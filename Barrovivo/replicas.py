@@ -0,0 +1,137 @@
+# Barrovivo/replicas.py
+"""
+Lecturas a réplicas, escrituras a la primaria.
+
+- LecturaEscrituraRouter: los modelos de MODELOS_LECTURA (catálogo, favoritos,
+  pedidos para reportes y analítica) se leen de un alias "lectura*"; todo lo
+  demás (carrito, usuarios, sesiones, jobs) y toda escritura va a "default".
+  Dentro de una transacción de la primaria se lee de la primaria.
+- Leer lo que uno escribió: si la request escribió algo (un INSERT, UPDATE o
+  DELETE que llegó a la primaria; ver marcar_escrituras), lo que resta de la request y las requests de esa sesión
+  durante DB_PRIMARIA_PEGADA_SEGUNDOS leen de la primaria
+  (PrimariaPegadaMiddleware). Así, tras el checkout, "gracias", el perfil y el
+  stock no salen de una réplica atrasada. Fuera de una request (comandos,
+  señales de un save), el hilo que escribió sigue leyendo de la primaria.
+- usar_primaria(): para forzarlo en un bloque de código.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+MODELOS_LECTURA = {
+    "producto.producto",
+    "producto.categoria",
+    "producto.producto_categorias",
+    "producto.favorito",
+    "pedido.pedido",
+    "pedido.pedidoitem",
+    "usuario.ventaagregada",
+}
+
+SESSION_PRIMARIA_HASTA = "db_primaria_hasta"
+
+# True: esta request/bloque lee de la primaria.
+_primaria = ContextVar("db_primaria", default=False)
+# True desde la primera escritura: en una request hasta que termina; fuera de
+# ellas (comandos, shell, señales) para el resto del hilo.
+_escribio = ContextVar("db_escribio", default=False)
+
+# Un get_or_create que encuentra la fila pasa por db_for_write sin escribir:
+# se mira el SQL que de verdad se ejecuta
+_ESCRITURAS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+@contextmanager
+def usar_primaria():
+    token = _primaria.set(True)
+    try:
+        yield
+    finally:
+        _primaria.reset(token)
+
+
+def marcar_escrituras(execute, sql, params, many, context):
+    """execute_wrapper de la primaria: solo una escritura real pega las lecturas a ella."""
+    resultado = execute(sql, params, many, context)
+    if not _escribio.get() and sql.lstrip()[:7].upper().startswith(_ESCRITURAS):
+        _escribio.set(True)
+    return resultado
+
+
+def instalar_en_conexion(sender, connection, **kwargs) -> None:
+    # connection_created vuelve a llegar si la conexión se reabre
+    if connection.alias == DEFAULT_DB_ALIAS and marcar_escrituras not in connection.execute_wrappers:
+        connection.execute_wrappers.append(marcar_escrituras)
+
+
+class LecturaEscrituraRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in MODELOS_LECTURA:
+            return DEFAULT_DB_ALIAS
+        if _primaria.get() or _escribio.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        disponibles = replicas()
+        return random.choice(disponibles) if disponibles else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas y primaria tienen los mismos datos (con algo de retraso)
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema por replicación
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimariaPegadaMiddleware:
+    """Después de AuthenticationMiddleware (usa la sesión). Sirve en WSGI y en ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        session = getattr(request, "session", None)
+        pegada = session is not None and session.get(SESSION_PRIMARIA_HASTA, 0) > time.time()
+        token_primaria = _primaria.set(pegada)
+        token_escribio = _escribio.set(False)
+        try:
+            response = self.get_response(request)
+            if _escribio.get() and session is not None:
+                session[SESSION_PRIMARIA_HASTA] = time.time() + settings.DB_PRIMARIA_PEGADA_SEGUNDOS
+            return response
+        finally:
+            _primaria.reset(token_primaria)
+            _escribio.reset(token_escribio)
+
+    async def __acall__(self, request):
+        # La sesión se carga de la base: en async, con su API async
+        session = getattr(request, "session", None)
+        pegada = session is not None and await session.aget(SESSION_PRIMARIA_HASTA, 0) > time.time()
+        token_primaria = _primaria.set(pegada)
+        token_escribio = _escribio.set(False)
+        try:
+            response = await self.get_response(request)
+            if _escribio.get() and session is not None:
+                await session.aset(SESSION_PRIMARIA_HASTA, time.time() + settings.DB_PRIMARIA_PEGADA_SEGUNDOS)
+            return response
+        finally:
+            _primaria.reset(token_primaria)
+            _escribio.reset(token_escribio)
@@ -14,6 +14,8 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 
+from . import basedatos
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / ".env")
 
@@ -52,12 +54,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Barrovivo.rendimiento.RendimientoMiddleware',
+    'Barrovivo.consultas.PresupuestoConsultasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',  # <— aquí
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'Barrovivo.replicas.PrimariaPegadaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,6 +82,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.media', 
+                'pedido.context_processors.carrito',
+                'producto.context_processors.catalogo',
             ],
         },
     },
@@ -88,12 +95,26 @@ WSGI_APPLICATION = 'Barrovivo.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# SQLite afinado para varios escritores (WAL, pragmas, BEGIN IMMEDIATE y conexiones
+# persistentes) o Postgres con réplicas (DB_PRIMARIA / DB_REPLICAS); ver Barrovivo/basedatos.py.
+DATABASES = basedatos.bases_de_datos(BASE_DIR / 'db.sqlite3')
+
+# Vistas con `presupuesto_consultas`: "log" avisa si se pasan, "error" lanza excepción
+# (los tests corren con "error"), "" no cuenta (Barrovivo/consultas.py)
+PRESUPUESTO_CONSULTAS = os.getenv("PRESUPUESTO_CONSULTAS", "log")
+TEST_RUNNER = 'Barrovivo.pruebas.PruebasRunner'
+
+# Métricas por vista (Barrovivo/rendimiento.py): cabecera Server-Timing en las respuestas
+# y token para que Prometheus lea /api/rendimiento/metricas/prometheus/ sin sesión de staff.
+# Server-Timing muestra tiempo de base de datos y número de consultas a cualquiera: solo
+# para desarrollo (SERVER_TIMING=1).
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN", "")
+
+# Lecturas del catálogo y reportes a "lectura*", escrituras a "default" (Barrovivo/replicas.py)
+DATABASE_ROUTERS = ['Barrovivo.replicas.LecturaEscrituraRouter']
+# Tras escribir, la sesión lee de la primaria este tiempo (lo que puede tardar en replicar)
+DB_PRIMARIA_PEGADA_SEGUNDOS = int(os.getenv("DB_PRIMARIA_PEGADA_SEGUNDOS", "10"))
 
 
 # Password validation
@@ -164,3 +185,39 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"   # fijo
 GROQ_MODEL   = "llama-3.1-8b-instant"                               # fijo y rápido
 GROQ_TIMEOUT = 12                                                   # fijo y razonable
+GROQ_POOL_SIZE = 10                                                 # conexiones keep-alive
+GROQ_CACHE_BACKEND = os.getenv("GROQ_CACHE_BACKEND", "local")       # "local", "django:<alias>" o "" (sin caché)
+GROQ_CACHE_TTL = 600                                                # segundos
+GROQ_CACHE_MAX_ITEMS = 512                                          # LRU local
+
+# Chat: si las reglas locales reconocen el mensaje con esta confianza (0..1), no se llama al LLM para el parse
+CHAT_UMBRAL_SIN_LLM = 0.8
+
+# Reporte PDF: pedidos por lote y tamaño del pool de procesos (uno por worker, compartido por
+# todas las exportaciones) que renderiza los lotes en paralelo (None = todos los núcleos)
+REPORTES_PDF_LOTE = 200
+REPORTES_PDF_PROCESOS = int(os.getenv("REPORTES_PDF_PROCESOS", "0")) or None
+
+# Caché del catálogo (páginas y fragmentos): "locmem" (por proceso), "file:/ruta/al/dir"
+# o "redis://host:6379/1" (Redis o compatible: Valkey, KeyDB...). Con varios workers usar
+# file: o redis: con locmem cada proceso no ve las invalidaciones (versión, favoritos) de los demás
+CATALOGO_CACHE = os.getenv("CATALOGO_CACHE", "locmem")
+CATALOGO_CACHE_TTL = 600  # segundos; la invalidación real es por versión (producto.cache_catalogo)
+
+if CATALOGO_CACHE.startswith(("redis://", "rediss://", "unix://")):
+    _cache_catalogo = {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CATALOGO_CACHE}
+elif CATALOGO_CACHE.startswith("file:"):
+    _cache_catalogo = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                       "LOCATION": CATALOGO_CACHE[len("file:"):]}
+else:
+    _cache_catalogo = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "catalogo"}
+
+# Los conjuntos de favoritos por usuario (Favorito.ids_de) solo se cachean si la caché del
+# catálogo es compartida entre procesos: con locmem, un toggle en un worker no borraría la
+# entrada de los demás y el corazón saldría viejo hasta el TTL. Con locmem se leen de la base.
+CATALOGO_CACHE_COMPARTIDA = _cache_catalogo["BACKEND"] != "django.core.cache.backends.locmem.LocMemCache"
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "catalogo": _cache_catalogo,
+}
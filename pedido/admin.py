@@ -8,18 +8,26 @@ class CarritoAdmin(admin.ModelAdmin):
     list_filter = ['fecha_creacion', 'fecha_actualizacion']
     search_fields = ['usuario__username', 'usuario__email']
     readonly_fields = ['fecha_creacion', 'fecha_actualizacion']
+
+    def get_queryset(self, request):
+        # Totales de toda la página en la misma consulta del changelist
+        return super().get_queryset(request).select_related('usuario').con_totales()
     
     def obtener_cantidad_total(self, obj):
         return obj.obtener_cantidad_total()
     obtener_cantidad_total.short_description = 'Cantidad total'
+    obtener_cantidad_total.admin_order_field = 'cantidad_total'
     
     def obtener_total(self, obj):
         return f"${obj.obtener_total():,}"
     obtener_total.short_description = 'Total'
+    obtener_total.admin_order_field = 'total'
 
 @admin.register(ItemCarrito)
 class ItemCarritoAdmin(admin.ModelAdmin):
     list_display = ['producto', 'carrito', 'cantidad', 'subtotal', 'fecha_agregado']
+    # __str__ del carrito y el subtotal leen usuario y producto: en la misma consulta
+    list_select_related = ['producto', 'carrito__usuario']
     list_filter = ['fecha_agregado']
     search_fields = ['producto__nombre', 'carrito__usuario__username']
     readonly_fields = ['fecha_agregado']
@@ -36,10 +44,14 @@ class PedidoItemInline(admin.TabularInline):
     readonly_fields = ('producto', 'cantidad', 'precio')
     can_delete = False
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('producto')
+
 
 @admin.register(Pedido)
 class PedidoAdmin(admin.ModelAdmin):
     list_display = ('id', 'usuario', 'correo', 'fecha',  'total')
+    list_select_related = ('usuario',)
     list_filter = ('fecha', 'departamento', 'municipio')
     search_fields = ('usuario__username', 'nombre_cliente', 'correo', 'cedula')
     readonly_fields = ('fecha',)
@@ -49,5 +61,6 @@ class PedidoAdmin(admin.ModelAdmin):
 @admin.register(PedidoItem)
 class PedidoItemAdmin(admin.ModelAdmin):
     list_display = ('pedido', 'producto', 'cantidad', 'precio')
+    list_select_related = ('pedido__usuario', 'producto')
     search_fields = ('producto__nombre',)
     list_filter = ('pedido__fecha',)
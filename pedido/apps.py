@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class PedidoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pedido'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from Barrovivo import basedatos, rendimiento, replicas
+        # WAL y demás PRAGMAs en cada conexión nueva (el checkout es el que sufre los locks)
+        connection_created.connect(basedatos.aplicar_pragmas, dispatch_uid="barrovivo_sqlite_pragmas")
+        # Tiempo y número de consultas por request (RendimientoMiddleware)
+        connection_created.connect(rendimiento.instalar_en_conexion, dispatch_uid="barrovivo_rendimiento_db")
+        # Leer de la primaria tras escribir (LecturaEscrituraRouter)
+        connection_created.connect(replicas.instalar_en_conexion, dispatch_uid="barrovivo_replicas_escrituras")
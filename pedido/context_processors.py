@@ -0,0 +1,6 @@
+from .services.carrito_actual import cantidad_en_sesion
+
+
+def carrito(request):
+    """Expone la cantidad de unidades del carrito a todas las plantillas (badge del navbar)."""
+    return {"carrito_cantidad": cantidad_en_sesion(request)}
@@ -0,0 +1,89 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict
+
+from django.core.management.base import BaseCommand
+
+from Barrovivo import basedatos
+
+
+def simular(modo: str, pragmas: Dict[str, str], hilos: int = 8, transacciones: int = 50,
+            pausa: float = 0.0005) -> dict:
+    """
+    `hilos` escritores sobre una base SQLite temporal, cada uno con su conexión,
+    haciendo transacciones como las del checkout: leer stock, descontarlo y
+    crear el pedido. Devuelve cuántas confirmaron, cuántas fallaron por lock y
+    cuánto tardó todo.
+    """
+    carpeta = tempfile.mkdtemp(prefix="bench_escrituras_")
+    ruta = os.path.join(carpeta, "bench.sqlite3")
+    try:
+        con = sqlite3.connect(ruta)
+        con.executescript("""
+            CREATE TABLE producto (id INTEGER PRIMARY KEY, cantidad_disp INTEGER NOT NULL);
+            CREATE TABLE pedido (id INTEGER PRIMARY KEY, producto_id INTEGER NOT NULL, cantidad INTEGER NOT NULL);
+            INSERT INTO producto VALUES (1, 1000000);
+        """)
+        con.close()
+
+        conteo = {"confirmadas": 0, "bloqueadas": 0}
+        lock = threading.Lock()
+
+        def escritor():
+            con = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False)
+            for nombre, valor in pragmas.items():
+                con.execute(f"PRAGMA {nombre}={valor}")
+            for _ in range(transacciones):
+                try:
+                    con.execute(f"BEGIN {modo}")
+                    con.execute("SELECT cantidad_disp FROM producto WHERE id = 1").fetchone()
+                    time.sleep(pausa)  # lo que tarda la vista entre leer y escribir
+                    con.execute("UPDATE producto SET cantidad_disp = cantidad_disp - 1 WHERE id = 1")
+                    con.execute("INSERT INTO pedido (producto_id, cantidad) VALUES (1, 1)")
+                    con.execute("COMMIT")
+                    resultado = "confirmadas"
+                except sqlite3.OperationalError as e:
+                    if "locked" not in str(e) and "busy" not in str(e):
+                        raise
+                    if con.in_transaction:
+                        con.execute("ROLLBACK")
+                    resultado = "bloqueadas"
+                with lock:
+                    conteo[resultado] += 1
+            con.close()
+
+        inicio = time.perf_counter()
+        hebras = [threading.Thread(target=escritor) for _ in range(hilos)]
+        for h in hebras:
+            h.start()
+        for h in hebras:
+            h.join()
+        return {**conteo, "segundos": time.perf_counter() - inicio}
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+class Command(BaseCommand):
+    help = ("Compara escritores concurrentes sobre SQLite con la configuración anterior "
+            "(journal por defecto, BEGIN diferido) y la de Barrovivo/basedatos.py.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=8)
+        parser.add_argument("--transacciones", type=int, default=50, help="Por hilo.")
+
+    def handle(self, *args, **options):
+        casos = [
+            ("Antes (DEFERRED, sin pragmas)", "DEFERRED", {}),
+            ("Ahora (IMMEDIATE + pragmas)", "IMMEDIATE", basedatos.pragmas()),
+        ]
+        for titulo, modo, pragmas in casos:
+            r = simular(modo, pragmas, options["hilos"], options["transacciones"])
+            total = r["confirmadas"] + r["bloqueadas"]
+            self.stdout.write(
+                f"{titulo}: {r['confirmadas']}/{total} confirmadas, "
+                f"{r['bloqueadas']} 'database is locked', {total / r['segundos']:.0f} tx/s"
+            )
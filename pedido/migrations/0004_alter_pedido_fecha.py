@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedido', '0003_pedido_apto_info'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pedido',
+            name='fecha',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
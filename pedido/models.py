@@ -1,24 +1,57 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from producto.models import Producto
 
+
+def _totales_carrito(prefijo=""):
+    """Expresiones de agregado (total, unidades, líneas) sobre ItemCarrito, opcionalmente vía relación."""
+    subtotal = ExpressionWrapper(
+        F(f"{prefijo}cantidad") * F(f"{prefijo}producto__precio"),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    return {
+        "total": Coalesce(Sum(subtotal), Value(Decimal("0")), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        "cantidad_total": Coalesce(Sum(f"{prefijo}cantidad"), 0),
+        "lineas": Count(f"{prefijo}id"),
+    }
+
+
+class CarritoQuerySet(models.QuerySet):
+    def con_totales(self):
+        """Anota total, cantidad_total y lineas por carrito en una sola consulta (p. ej. changelist del admin)."""
+        return self.annotate(**_totales_carrito("items__"))
+
+
 # Autor: Luis Angel Nerio
 class Carrito(models.Model):
     """Modelo para representar el carrito de compras de un usuario."""
     usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='carrito')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    objects = CarritoQuerySet.as_manager()
     
     def __str__(self):
         return f"Carrito de {self.usuario.username}"
+
+    def resumen(self):
+        """Total, unidades y número de líneas del carrito calculados en SQL (una sola consulta)."""
+        if hasattr(self, "total") and hasattr(self, "cantidad_total") and hasattr(self, "lineas"):
+            # Ya viene anotado por CarritoQuerySet.con_totales()
+            return {"total": self.total, "cantidad_total": self.cantidad_total, "lineas": self.lineas}
+        return ItemCarrito.objects.filter(carrito=self).aggregate(**_totales_carrito())
     
     def obtener_total(self):
         """Calcula el total del carrito."""
-        return sum(item.subtotal for item in self.items.all())
+        return self.resumen()["total"]
     
     def obtener_cantidad_total(self):
         """Calcula la cantidad total de items en el carrito."""
-        return sum(item.cantidad for item in self.items.all())
+        return self.resumen()["cantidad_total"]
 
 class ItemCarrito(models.Model):
     """Modelo para representar un item individual en el carrito."""
@@ -39,9 +72,25 @@ class ItemCarrito(models.Model):
         return self.producto.precio * self.cantidad
     
 
+class PedidoQuerySet(models.QuerySet):
+    def con_items(self, producto=None):
+        """
+        Pedidos con sus líneas y el producto de cada línea en dos consultas,
+        trayendo solo las columnas que muestran perfil, factura y reportes.
+        Con `producto`, solo las líneas de ese producto.
+        """
+        items = PedidoItem.objects.select_related("producto").only(
+            "pedido", "cantidad", "precio",
+            "producto__nombre", "producto__imagen", "producto__imagen_variantes",
+        )
+        if producto is not None:
+            items = items.filter(producto=producto)
+        return self.prefetch_related(models.Prefetch("items", queryset=items))
+
+
 class Pedido(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
-    fecha = models.DateTimeField(auto_now_add=True)
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
     nombre_cliente = models.CharField(max_length=200)
     cedula = models.CharField(max_length=20)
     celular = models.CharField(max_length=20)
@@ -52,6 +101,13 @@ class Pedido(models.Model):
     apto_info = models.CharField(max_length=100, blank=True)
     total = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = PedidoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Historial del perfil: pedidos del usuario, más recientes primero
+            models.Index(fields=["usuario", "-fecha"], name="pedido_usuario_fecha_idx"),
+        ]
     
     def __str__(self):
         return f"Pedido {self.id} de {self.usuario.username}"
@@ -0,0 +1,79 @@
+# pedido/services/carrito_actual.py
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+
+from ..models import Carrito, ItemCarrito
+
+# Cantidad de unidades en el carrito guardada en sesión para el badge del navbar
+SESSION_CANTIDAD = "carrito_cantidad"
+
+
+def _guardar_cantidad(session, cantidad: int) -> None:
+    # Solo escribimos si cambió, para no forzar un guardado de sesión en cada request
+    if session.get(SESSION_CANTIDAD) != cantidad:
+        session[SESSION_CANTIDAD] = cantidad
+
+
+class CarritoActual:
+    """
+    Carrito del usuario memoizado durante una request.
+    El carrito, sus ítems y el resumen se consultan una sola vez; cualquier
+    vista que modifique el carrito debe llamar a invalidar().
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @classmethod
+    def de_request(cls, request) -> "CarritoActual":
+        actual = getattr(request, "_carrito_actual", None)
+        if actual is None:
+            actual = request._carrito_actual = cls(request)
+        return actual
+
+    @cached_property
+    def carrito(self) -> Carrito:
+        carrito, _ = Carrito.objects.get_or_create(usuario=self.request.user)
+        return carrito
+
+    @cached_property
+    def items(self):
+        return list(ItemCarrito.objects.filter(carrito=self.carrito).select_related("producto"))
+
+    @cached_property
+    def resumen(self) -> dict:
+        # Los ítems ya vienen con su producto: el resumen no cuesta otra consulta
+        resumen = {
+            "total": sum((it.subtotal for it in self.items), Decimal("0")),
+            "cantidad_total": sum(it.cantidad for it in self.items),
+            "lineas": len(self.items),
+        }
+        _guardar_cantidad(self.request.session, resumen["cantidad_total"])
+        return resumen
+
+    @property
+    def total(self):
+        return self.resumen["total"]
+
+    def invalidar(self) -> None:
+        """Descarta lo memoizado (menos el carrito) y recalcula la cantidad en sesión."""
+        self.__dict__.pop("items", None)
+        self.__dict__.pop("resumen", None)
+        _guardar_cantidad(self.request.session, self.carrito.obtener_cantidad_total())
+
+
+def cantidad_en_sesion(request) -> int:
+    """Cantidad del carrito para el navbar; solo consulta la BD la primera vez por sesión."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return 0
+    cantidad = request.session.get(SESSION_CANTIDAD)
+    if cantidad is None:
+        cantidad = ItemCarrito.objects.filter(carrito__usuario=user).aggregate(
+            n=Coalesce(Sum("cantidad"), 0)
+        )["n"]
+        _guardar_cantidad(request.session, cantidad)
+    return cantidad
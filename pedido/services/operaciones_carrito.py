@@ -0,0 +1,155 @@
+# pedido/services/operaciones_carrito.py
+"""
+Operaciones sobre el carrito con el tope por stock.
+
+Las usan tanto las vistas HTML (que redirigen y dejan un mensaje) como el API
+JSON (que responde la línea y los totales); así las dos formas recortan igual.
+Cada operación devuelve un dict:
+
+    {"item": ItemCarrito | None, "nivel": "success" | "warning", "mensaje": str}
+
+`item` es None cuando la línea quedó fuera del carrito.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from django.contrib.humanize.templatetags.humanize import intcomma
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Least
+
+from ..models import ItemCarrito
+
+
+def _stock(producto) -> int:
+    return int(getattr(producto, "cantidad_disp", 0) or 0)
+
+
+def _resultado(item: Optional[ItemCarrito], nivel: str, mensaje: str) -> dict:
+    return {"item": item, "nivel": nivel, "mensaje": mensaje}
+
+
+def cantidad_permitida(stock: int, nueva: int) -> Tuple[int, str, str]:
+    """(cantidad final, nivel, mensaje) para poner una línea en `nueva`; 0 = sacarla del carrito."""
+    if stock <= 0 or nueva <= 0:
+        return 0, "warning", "Producto sin stock o cantidad inválida. Se removió del carrito."
+    if nueva > stock:
+        return stock, "warning", f"Cantidad ajustada a {stock} por límite de stock."
+    return nueva, "success", "Cantidad actualizada."
+
+
+def _sumar(item: ItemCarrito, n: int, stock: int) -> None:
+    """Suma en la base (F) para no pisar un agregar concurrente, sin pasar del stock."""
+    ItemCarrito.objects.filter(pk=item.pk).update(cantidad=Least(F("cantidad") + n, stock))
+    item.refresh_from_db(fields=["cantidad"])
+
+
+def agregar(actual, producto, cantidad: int) -> dict:
+    """Suma `cantidad` unidades del producto sin pasar del stock."""
+    cantidad = max(1, cantidad)
+    stock = _stock(producto)
+    item = ItemCarrito.objects.filter(carrito=actual.carrito, producto=producto).first()
+    en_carrito = int(item.cantidad or 0) if item else 0
+    disponible = max(0, stock - en_carrito)
+
+    if disponible <= 0:
+        return _resultado(item, "warning", "No hay más unidades disponibles de este producto.")
+
+    agregar = min(cantidad, disponible)
+    if item is None:
+        try:
+            with transaction.atomic():
+                item = ItemCarrito.objects.create(carrito=actual.carrito, producto=producto, cantidad=agregar)
+        except IntegrityError:
+            # Otra request creó la línea entre la lectura y el create (unique carrito+producto): se suma a esa
+            item = ItemCarrito.objects.get(carrito=actual.carrito, producto=producto)
+            _sumar(item, agregar, stock)
+    else:
+        _sumar(item, agregar, stock)
+    actual.invalidar()
+    if agregar < cantidad:
+        return _resultado(item, "warning", f"Solo se agregaron {agregar} unidad(es). Límite por stock: {stock}.")
+    return _resultado(item, "success", f"{producto.nombre} agregado al carrito.")
+
+
+def actualizar(actual, item: ItemCarrito, nueva: int) -> dict:
+    """Pone la línea en `nueva` unidades (recortada al stock); sin stock o con 0 la quita."""
+    cantidad, nivel, mensaje = cantidad_permitida(_stock(item.producto), nueva)
+    if cantidad == 0:
+        item.delete()
+        item = None
+    else:
+        item.cantidad = cantidad
+        item.save(update_fields=["cantidad"])
+    actual.invalidar()
+    return _resultado(item, nivel, mensaje)
+
+
+def remover(actual, item: ItemCarrito) -> dict:
+    nombre = item.producto.nombre
+    item.delete()
+    actual.invalidar()
+    return _resultado(None, "success", f"{nombre} removido del carrito.")
+
+
+def actualizar_lote(actual, cambios: Dict[int, int]) -> Dict[int, dict]:
+    """
+    Aplica varios {item_id: cantidad} de una vez: una consulta para leer las
+    líneas, un bulk_update y un DELETE. Los ids que no son del carrito se ignoran.
+    """
+    items = list(
+        ItemCarrito.objects.filter(carrito=actual.carrito, id__in=list(cambios)).select_related("producto")
+    )
+    resultados: Dict[int, dict] = {}
+    cambiados: List[ItemCarrito] = []
+    quitados: List[int] = []
+    for item in items:
+        cantidad, nivel, mensaje = cantidad_permitida(_stock(item.producto), cambios[item.id])
+        if cantidad == 0:
+            quitados.append(item.id)
+            resultados[item.id] = _resultado(None, nivel, mensaje)
+            continue
+        if cantidad != item.cantidad:
+            item.cantidad = cantidad
+            cambiados.append(item)
+        resultados[item.id] = _resultado(item, nivel, mensaje)
+
+    if cambiados or quitados:
+        with transaction.atomic():
+            if cambiados:
+                ItemCarrito.objects.bulk_update(cambiados, ["cantidad"])
+            if quitados:
+                ItemCarrito.objects.filter(id__in=quitados).delete()
+        actual.invalidar()
+    return resultados
+
+
+def serializar_item(item: Optional[ItemCarrito]) -> Optional[dict]:
+    if item is None:
+        return None
+    stock = _stock(item.producto)
+    return {
+        "id": item.id,
+        "producto": item.producto_id,
+        "nombre": item.producto.nombre,
+        "cantidad": item.cantidad,
+        "precio": str(item.producto.precio),
+        "subtotal": str(item.subtotal),
+        "subtotal_texto": intcomma(item.subtotal),  # igual que en el template
+        "stock": stock,
+        "al_tope": item.cantidad >= stock,  # para deshabilitar el botón +
+    }
+
+
+def serializar_totales(actual) -> dict:
+    resumen = actual.resumen
+    return {
+        "total": str(resumen["total"]),
+        "total_texto": intcomma(resumen["total"]),
+        "cantidad_total": resumen["cantidad_total"],
+        "lineas": resumen["lineas"],
+    }
+
+
+def serializar(actual) -> dict:
+    """Estado completo del carrito para el API: todas las líneas y los totales."""
+    return {"items": [serializar_item(it) for it in actual.items], "carrito": serializar_totales(actual)}
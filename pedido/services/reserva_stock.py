@@ -0,0 +1,79 @@
+# pedido/services/reserva_stock.py
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from producto.models import Producto
+
+
+class StockInsuficiente(Exception):
+    """Se lanza cuando una o más líneas del carrito no tienen stock suficiente."""
+
+    def __init__(self, faltantes: List[dict]):
+        self.faltantes = faltantes  # [{producto_id, nombre, solicitado, disponible}]
+        nombres = ", ".join(f["nombre"] for f in faltantes)
+        super().__init__(f"No hay stock suficiente para: {nombres}")
+
+
+class _Revertir(Exception):
+    pass
+
+
+def _agrupar(items: Iterable) -> Dict[int, int]:
+    """producto_id -> cantidad total pedida (acepta ItemCarrito o cualquier objeto con producto_id/cantidad)."""
+    lineas: Dict[int, int] = {}
+    for it in items:
+        lineas[it.producto_id] = lineas.get(it.producto_id, 0) + int(it.cantidad)
+    return lineas
+
+
+def reservar_stock(items: Iterable) -> Dict[int, int]:
+    """
+    Descuenta el stock de todas las líneas en UN solo UPDATE condicional:
+      UPDATE producto SET cantidad_disp = cantidad_disp - CASE id ... END
+      WHERE (id = a AND cantidad_disp >= na) OR (id = b AND cantidad_disp >= nb) ...
+    Si alguna línea no cumple la condición se revierte todo y se lanza
+    StockInsuficiente con el detalle de las líneas que fallaron.
+    También suma las unidades a Producto.unidades_vendidas en la misma sentencia.
+    Debe llamarse dentro de una transacción (p. ej. la del checkout).
+    """
+    lineas = _agrupar(items)
+    if not lineas:
+        return lineas
+
+    condicion = Q()
+    cuando = []
+    for producto_id, cantidad in lineas.items():
+        if cantidad <= 0:
+            raise ValueError("La cantidad a restar debe ser positiva.")
+        condicion |= Q(pk=producto_id, cantidad_disp__gte=cantidad)
+        cuando.append(When(pk=producto_id, then=Value(cantidad)))
+    delta = Case(*cuando, default=Value(0), output_field=IntegerField())
+
+    try:
+        with transaction.atomic():
+            actualizados = Producto.objects.filter(condicion).update(
+                cantidad_disp=F("cantidad_disp") - delta,
+                unidades_vendidas=F("unidades_vendidas") + delta,
+            )
+            if actualizados != len(lineas):
+                raise _Revertir
+    except _Revertir:
+        raise StockInsuficiente(_faltantes(lineas))
+    return lineas
+
+
+def _faltantes(lineas: Dict[int, int]) -> List[dict]:
+    """Solo se consulta en el camino de error (después del rollback)."""
+    out = []
+    productos = Producto.objects.filter(pk__in=lineas).values_list("id", "nombre", "cantidad_disp")
+    for producto_id, nombre, disponible in productos:
+        if disponible < lineas[producto_id]:
+            out.append({
+                "producto_id": producto_id,
+                "nombre": nombre,
+                "solicitado": lineas[producto_id],
+                "disponible": disponible,
+            })
+    return out
@@ -1,3 +1,566 @@
-from django.test import TestCase
+import contextvars
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.db import connection, connections, transaction
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from Barrovivo import basedatos, replicas
+from Barrovivo.consultas import (
+    PresupuestoConsultasExcedido, PresupuestoConsultasMiddleware, presupuesto_consultas, presupuesto_de,
+)
+from producto import cache_catalogo
+from producto.models import Producto
+from usuario.models import VentaAgregada
+from usuario.views import PerfilView
+from .context_processors import carrito as carrito_context
+from .management.commands.bench_escrituras import simular
+from .models import Carrito, ItemCarrito, Pedido, PedidoItem
+from .services.reserva_stock import reservar_stock, StockInsuficiente
+
+DATOS_CHECKOUT = {
+    "correo": "cliente@barrovivo.co",
+    "nombres": "Ana",
+    "apellidos": "Pérez",
+    "cedula": "123456",
+    "departamento": "Antioquia",
+    "municipio": "El Carmen de Viboral",
+    "direccion": "Calle 1 # 2-3",
+    "apto_info": "",
+    "telefono": "3000000000",
+    "metodo": "credito",
+    "numero_tarjeta": "1111 2222 3333 4444",
+    "fecha_exp": "12/30",
+    "cvc": "123",
+    "nombre_en_tarjeta": "ANA PEREZ",
+}
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="ana@barrovivo.co", password="clave-segura-123")
+        self.client.force_login(self.user)
+        self.matera = Producto.objects.create(nombre="Matera", precio=Decimal("50000"), cantidad_disp=5)
+        self.plato = Producto.objects.create(nombre="Plato", precio=Decimal("30000"), cantidad_disp=3)
+        carrito = Carrito.objects.create(usuario=self.user)
+        ItemCarrito.objects.create(carrito=carrito, producto=self.matera, cantidad=2)
+        ItemCarrito.objects.create(carrito=carrito, producto=self.plato, cantidad=1)
+
+    def test_checkout_actualiza_stock_y_unidades_vendidas(self):
+        resp = self.client.post(reverse("pedido:checkout"), DATOS_CHECKOUT)
+        self.assertRedirects(resp, reverse("pedido:gracias"))
+
+        self.matera.refresh_from_db()
+        self.plato.refresh_from_db()
+        self.assertEqual(self.matera.cantidad_disp, 3)
+        self.assertEqual(self.matera.unidades_vendidas, 2)
+        self.assertEqual(self.plato.unidades_vendidas, 1)
+        self.assertEqual(Pedido.objects.get().total, Decimal("130000"))
+
+    def test_checkout_suma_a_la_analitica(self):
+        self.client.post(reverse("pedido:checkout"), DATOS_CHECKOUT)
+
+        dia = VentaAgregada.objects.get(dimension=VentaAgregada.DIA)
+        self.assertEqual((dia.ingresos, dia.unidades, dia.pedidos), (Decimal("130000"), 3, 1))
+        matera = VentaAgregada.objects.get(dimension=VentaAgregada.PRODUCTO, clave=str(self.matera.id))
+        self.assertEqual(matera.unidades, 2)
+
+    def test_recalcular_unidades_vendidas(self):
+        self.client.post(reverse("pedido:checkout"), DATOS_CHECKOUT)
+        Producto.objects.update(unidades_vendidas=0)
+
+        Producto.recalcular_unidades_vendidas()
+
+        self.matera.refresh_from_db()
+        self.assertEqual(self.matera.unidades_vendidas, PedidoItem.objects.get(producto=self.matera).cantidad)
+
+    def test_checkout_sin_stock_no_descuenta_nada(self):
+        # Otro comprador se llevó el stock del plato mientras tanto
+        Producto.objects.filter(pk=self.plato.pk).update(cantidad_disp=0)
+
+        resp = self.client.post(reverse("pedido:checkout"), DATOS_CHECKOUT)
+        self.assertRedirects(resp, reverse("pedido:carrito"))
+
+        self.matera.refresh_from_db()
+        self.assertEqual(self.matera.cantidad_disp, 5)
+        self.assertEqual(self.matera.unidades_vendidas, 0)
+        self.assertFalse(Pedido.objects.exists())
+        self.assertEqual(ItemCarrito.objects.count(), 2)
+
+
+class ReservaStockTests(TestCase):
+    def _productos(self, n):
+        return [
+            Producto.objects.create(nombre=f"Producto {i}", precio=Decimal("1000"), cantidad_disp=10)
+            for i in range(n)
+        ]
+
+    def _lineas(self, productos, cantidad=1):
+        return [ItemCarrito(producto=p, cantidad=cantidad) for p in productos]
+
+    def test_sentencias_constantes_sin_importar_las_lineas(self):
+        # SAVEPOINT + UPDATE + RELEASE, igual para 1 que para 8 líneas
+        for n in (1, 8):
+            lineas = self._lineas(self._productos(n))
+            with self.assertNumQueries(3):
+                reservar_stock(lineas)
+
+    def test_reporta_lineas_que_fallan(self):
+        ok, falla = self._productos(2)
+        lineas = self._lineas([ok]) + self._lineas([falla], cantidad=11)
+
+        with self.assertRaises(StockInsuficiente) as ctx:
+            reservar_stock(lineas)
+
+        self.assertEqual([f["producto_id"] for f in ctx.exception.faltantes], [falla.id])
+        ok.refresh_from_db()
+        self.assertEqual(ok.cantidad_disp, 10)
+
+
+class ResumenCarritoTests(TestCase):
+    def setUp(self):
+        self.productos = [
+            Producto.objects.create(nombre=f"Producto {i}", precio=Decimal("1500"), cantidad_disp=10)
+            for i in range(3)
+        ]
+
+    def _carrito(self, username):
+        carrito = Carrito.objects.create(usuario=User.objects.create_user(username=username))
+        for i, p in enumerate(self.productos, start=1):
+            ItemCarrito.objects.create(carrito=carrito, producto=p, cantidad=i)
+        return carrito
+
+    def test_resumen_en_una_consulta(self):
+        carrito = self._carrito("ana")
+        with self.assertNumQueries(1):
+            resumen = carrito.resumen()
+        self.assertEqual(resumen, {"total": Decimal("9000"), "cantidad_total": 6, "lineas": 3})
+
+    def test_resumen_carrito_vacio(self):
+        carrito = Carrito.objects.create(usuario=User.objects.create_user(username="vacio"))
+        self.assertEqual(carrito.resumen(), {"total": Decimal("0"), "cantidad_total": 0, "lineas": 0})
+
+    def test_changelist_admin_no_crece_con_los_carritos(self):
+        admin = User.objects.create_superuser(username="admin", password="clave-segura-123")
+        self.client.force_login(admin)
+        url = reverse("admin:pedido_carrito_changelist")
+        self._carrito("ana")
+        self.client.get(url)  # calienta caches de sesión/permisos
+
+        with CaptureQueriesContext(connection) as una:
+            self.client.get(url)
+        for i in range(5):
+            self._carrito(f"cliente{i}")
+        with self.assertNumQueries(len(una)):
+            resp = self.client.get(url)
+        self.assertContains(resp, "$9,000")
+
+
+class CarritoActualTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="ana@barrovivo.co", password="clave-segura-123")
+        self.client.force_login(self.user)
+        self.producto = Producto.objects.create(nombre="Taza", precio=Decimal("20000"), cantidad_disp=5)
+
+    def test_badge_se_actualiza_al_agregar_y_remover(self):
+        self.client.post(reverse("pedido:agregar_al_carrito", args=[self.producto.id]), {"cantidad": 3})
+        resp = self.client.get(reverse("pedido:carrito"))
+        self.assertEqual(resp.context["carrito_cantidad"], 3)
+
+        item = ItemCarrito.objects.get()
+        self.client.post(reverse("pedido:remover_del_carrito", args=[item.id]))
+        resp = self.client.get(reverse("pedido:carrito"))
+        self.assertEqual(resp.context["carrito_cantidad"], 0)
+
+    def test_context_processor_usa_la_sesion(self):
+        self.client.post(reverse("pedido:agregar_al_carrito", args=[self.producto.id]), {"cantidad": 2})
+        request = RequestFactory().get("/")
+        request.user = self.user
+        request.session = self.client.session
+        request.session.keys()  # en una request real la sesión ya la cargó AuthenticationMiddleware
+
+        with self.assertNumQueries(0):
+            self.assertEqual(carrito_context(request), {"carrito_cantidad": 2})
+
+    def test_anonimo_no_consulta(self):
+        self.client.logout()
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        request.session = self.client.session
+        with self.assertNumQueries(0):
+            self.assertEqual(carrito_context(request), {"carrito_cantidad": 0})
+
+
+class CarritoApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="ana@barrovivo.co", password="clave-segura-123")
+        self.client.force_login(self.user)
+        self.taza = Producto.objects.create(nombre="Taza", precio=Decimal("20000"), cantidad_disp=5)
+        self.plato = Producto.objects.create(nombre="Plato", precio=Decimal("30000"), cantidad_disp=2)
+
+    def _post(self, nombre, *args, **datos):
+        return self.client.post(reverse(nombre, args=args), datos, content_type="application/json")
+
+    def test_agregar_recorta_al_stock_y_devuelve_totales(self):
+        data = self._post("pedido:api_agregar", self.taza.id, cantidad=3).json()
+        self.assertEqual(data["nivel"], "success")
+        self.assertEqual(data["item"]["cantidad"], 3)
+        self.assertEqual(data["carrito"]["total"], "60000.00")
+
+        data = self._post("pedido:api_agregar", self.taza.id, cantidad=4).json()
+        self.assertEqual(data["nivel"], "warning")
+        self.assertIn("Solo se agregaron 2", data["mensaje"])
+        self.assertEqual(data["item"]["cantidad"], 5)
+        self.assertTrue(data["item"]["al_tope"])
+        self.assertEqual(self.client.session["carrito_cantidad"], 5)
+
+    def test_agregar_sin_stock_no_crea_linea(self):
+        self.taza.cantidad_disp = 0
+        self.taza.save()
+        data = self._post("pedido:api_agregar", self.taza.id).json()
+        self.assertEqual(data["nivel"], "warning")
+        self.assertIsNone(data["item"])
+        self.assertFalse(ItemCarrito.objects.exists())
+
+    def test_agregar_concurrente_suma_a_la_linea_existente(self):
+        self._post("pedido:api_agregar", self.taza.id, cantidad=2)
+        # La otra request no vio la línea (la creó esta entre su lectura y su create)
+        with mock.patch.object(QuerySet, "first", return_value=None):
+            resp = self._post("pedido:api_agregar", self.taza.id, cantidad=2)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["item"]["cantidad"], 4)
+        self.assertEqual(ItemCarrito.objects.get().cantidad, 4)
+
+    def test_actualizar_y_remover(self):
+        self._post("pedido:api_agregar", self.taza.id, cantidad=1)
+        item = ItemCarrito.objects.get()
+
+        data = self._post("pedido:api_actualizar", item.id, cantidad=9).json()
+        self.assertEqual((data["item"]["cantidad"], data["nivel"]), (5, "warning"))
+
+        # Formulario normal también sirve
+        resp = self.client.post(reverse("pedido:api_actualizar", args=[item.id]), {"cantidad": 0})
+        self.assertIsNone(resp.json()["item"])
+        self.assertEqual(resp.json()["carrito"]["lineas"], 0)
+
+        self._post("pedido:api_agregar", self.taza.id)
+        item = ItemCarrito.objects.get()
+        data = self._post("pedido:api_remover", item.id).json()
+        self.assertEqual(data["carrito"]["cantidad_total"], 0)
+        self.assertEqual(self._post("pedido:api_remover", item.id).status_code, 404)
+
+    def test_lote_en_consultas_constantes(self):
+        carrito = Carrito.objects.create(usuario=self.user)
+        a = ItemCarrito.objects.create(carrito=carrito, producto=self.taza, cantidad=1)
+        b = ItemCarrito.objects.create(carrito=carrito, producto=self.plato, cantidad=1)
+        ajeno = ItemCarrito.objects.create(
+            carrito=Carrito.objects.create(usuario=User.objects.create_user(username="otro")),
+            producto=self.taza, cantidad=1,
+        )
+
+        items = [{"id": a.id, "cantidad": 4}, {"id": b.id, "cantidad": 7}, {"id": ajeno.id, "cantidad": 3}]
+        with CaptureQueriesContext(connection) as ctx:
+            data = self._post("pedido:api_actualizar_lote", items=items).json()
+        por_id = {r["id"]: r for r in data["items"]}
+        self.assertEqual(set(por_id), {a.id, b.id})
+        self.assertEqual(por_id[b.id]["item"]["cantidad"], 2)
+        self.assertEqual(por_id[b.id]["nivel"], "warning")
+        self.assertEqual(data["carrito"]["total"], "140000.00")
+        ajeno.refresh_from_db()
+        self.assertEqual(ajeno.cantidad, 1)
+
+        # Más líneas en el lote no suman consultas
+        c = ItemCarrito.objects.create(carrito=carrito, producto=Producto.objects.create(
+            nombre="Matera", precio=Decimal("1000"), cantidad_disp=9), cantidad=1)
+        items = [{"id": a.id, "cantidad": 3}, {"id": b.id, "cantidad": 1}, {"id": c.id, "cantidad": 2}]
+        with CaptureQueriesContext(connection) as ctx_mas:
+            self._post("pedido:api_actualizar_lote", items=items)
+        self.assertLessEqual(len(ctx_mas.captured_queries), len(ctx.captured_queries))
+
+    def test_errores(self):
+        resp = self.client.post(reverse("pedido:api_actualizar_lote"), "[1", content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self._post("pedido:api_actualizar_lote", items=[{"cantidad": 1}]).status_code, 400)
+
+        # Una cantidad ausente o inválida no se toma como 0: no borra la línea
+        item = ItemCarrito.objects.create(carrito=Carrito.objects.create(usuario=self.user),
+                                          producto=self.taza, cantidad=2)
+        for linea in ({"id": item.id}, {"id": item.id, "cantidad": "dos"}, {"id": item.id, "cantidad": None},
+                      {"id": item.id, "cantidad": -1}, {"id": item.id, "cantidad": 1.5}):
+            resp = self._post("pedido:api_actualizar_lote", items=[linea])
+            self.assertEqual(resp.status_code, 400, linea)
+            self.assertFalse(resp.json()["ok"])
+        item.refresh_from_db()
+        self.assertEqual(item.cantidad, 2)
+        self.client.logout()
+        self.assertEqual(self._post("pedido:api_agregar", self.taza.id).status_code, 401)
+
+    def test_template_usa_el_api(self):
+        self._post("pedido:api_agregar", self.taza.id)
+        resp = self.client.get(reverse("pedido:carrito"))
+        self.assertContains(resp, reverse("pedido:api_actualizar_lote"))
+        self.assertContains(resp, 'data-carrito="actualizar"')
+        self.assertContains(resp, "carrito.js")
+
+
+class BaseDatosSqliteTests(SimpleTestCase):
+    databases = {"default"}
+
+    def test_pragmas_desde_el_entorno(self):
+        self.assertEqual(basedatos.pragmas({})["journal_mode"], "wal")
+        p = basedatos.pragmas({"SQLITE_MMAP_SIZE": "0", "SQLITE_TEMP_STORE": ""})
+        self.assertEqual(p["mmap_size"], "0")
+        self.assertNotIn("temp_store", p)
+        with self.assertRaises(ValueError):
+            basedatos.pragmas({"SQLITE_SYNCHRONOUS": "normal; DROP TABLE x"})
+
+    def test_conexion_con_pragmas_e_immediate(self):
+        self.assertEqual(connection.settings_dict["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        with connection.cursor() as c:
+            c.execute("PRAGMA busy_timeout")
+            self.assertEqual(c.fetchone()[0], 5000)
+            c.execute("PRAGMA synchronous")
+            self.assertEqual(c.fetchone()[0], 1)  # NORMAL
+
+    def test_primaria_postgres_y_replicas(self):
+        bases = basedatos.bases_de_datos("/tmp/x.sqlite3", {
+            "DB_PRIMARIA": "postgres://barro:cl%40ve@db:5432/barrovivo",
+            "DB_REPLICAS": "postgres://barro:x@replica1/barrovivo, postgres://barro:x@replica2/barrovivo",
+        })
+        self.assertEqual(list(bases), ["default", "lectura", "lectura_2"])
+        self.assertEqual(bases["default"]["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual((bases["default"]["PASSWORD"], bases["default"]["PORT"]), ("cl@ve", "5432"))
+        self.assertEqual(bases["lectura_2"]["HOST"], "replica2")
+        self.assertEqual(bases["lectura"]["TEST"], {"MIRROR": "default"})
+
+        # Sin réplicas, "lectura" es el mismo archivo SQLite
+        bases = basedatos.bases_de_datos("/tmp/x.sqlite3", {})
+        self.assertEqual(bases["lectura"]["NAME"], bases["default"]["NAME"])
+
+    def test_escritores_concurrentes_sin_locks(self):
+        r = simular("IMMEDIATE", basedatos.pragmas({}), hilos=4, transacciones=20)
+        self.assertEqual((r["confirmadas"], r["bloqueadas"]), (80, 0))
+
+
+class ReplicaLecturaTests(TransactionTestCase):
+    """
+    La primaria es la base de prueba y la réplica un archivo SQLite aparte;
+    _replicar() copia la primaria a la réplica, así que entre copia y copia
+    la réplica va "atrasada" como una réplica real.
+    """
+    databases = {"default", "lectura"}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.carpeta = tempfile.mkdtemp()
+        cls.ruta_replica = os.path.join(cls.carpeta, "replica.sqlite3")
+        lectura = connections["lectura"]
+        lectura.close()
+        # En los tests "lectura" es espejo de default (comparten settings_dict): se reemplaza, no se edita
+        cls.settings_originales = lectura.settings_dict
+        lectura.settings_dict = {**lectura.settings_dict, "NAME": cls.ruta_replica}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["lectura"].close()
+        connections["lectura"].settings_dict = cls.settings_originales
+        shutil.rmtree(cls.carpeta, ignore_errors=True)
+
+    def setUp(self):
+        caches["catalogo"].clear()
+        self.user = User.objects.create_user(username="ana@barrovivo.co", password="clave-segura-123")
+        self.taza = Producto.objects.create(nombre="Taza", precio=Decimal("20000"), cantidad_disp=5)
+        ItemCarrito.objects.create(carrito=Carrito.objects.create(usuario=self.user), producto=self.taza, cantidad=2)
+        self._replicar()
+
+    def _replicar(self):
+        connections["lectura"].close()
+        connections["default"].ensure_connection()
+        destino = sqlite3.connect(self.ruta_replica)
+        connections["default"].connection.backup(destino)
+        destino.close()
+
+    def test_enrutamiento(self):
+        # Contexto limpio: en este hilo ya se escribió (setUp), y eso pega las lecturas a la primaria
+        contextvars.Context().run(self._enrutamiento)
+        self.assertEqual(replicas.LecturaEscrituraRouter().db_for_read(Producto), "default")
+
+    def _enrutamiento(self):
+        router = replicas.LecturaEscrituraRouter()
+        self.assertEqual(router.db_for_read(Producto), "lectura")
+        self.assertEqual(router.db_for_read(Pedido), "lectura")
+        self.assertEqual(router.db_for_read(ItemCarrito), "default")
+        self.assertEqual(router.db_for_read(User), "default")
+        self.assertEqual(router.db_for_write(Producto), "default")
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Producto), "default")
+        with replicas.usar_primaria():
+            self.assertEqual(router.db_for_read(Producto), "default")
+        self.assertFalse(router.allow_migrate("lectura", "producto"))
+
+    def _pasar_ventana_de_replica(self):
+        caches["catalogo"].delete(cache_catalogo._CLAVE_PRIMARIA)
+
+    def test_catalogo_lee_de_la_replica(self):
+        Producto.objects.create(nombre="Plato nuevo", precio=Decimal("30000"), cantidad_disp=5)
+        self._pasar_ventana_de_replica()
+        self.assertNotContains(self.client.get(reverse("producto:inicio")), "Plato nuevo")
+
+        self._replicar()
+        caches["catalogo"].clear()
+        self.assertContains(self.client.get(reverse("producto:inicio")), "Plato nuevo")
+
+    def test_tras_invalidar_la_cache_se_llena_desde_la_primaria(self):
+        detalle = reverse("producto:detalle", args=[self.taza.pk])
+        self._pasar_ventana_de_replica()
+        self.assertContains(self.client.get(detalle), "Taza")
+
+        # Otra sesión compra la última unidad; la réplica sigue con el stock viejo
+        Producto.objects.filter(pk=self.taza.pk).update(cantidad_disp=0)
+        cache_catalogo.invalidar()
+        self.assertEqual(Producto.objects.using("lectura").get(pk=self.taza.pk).cantidad_disp, 5)
+
+        # Un anónimo recalcula la versión nueva: la lee de la primaria, no de la réplica
+        self.assertEqual(self.client.get(detalle).context["producto"].cantidad_disp, 0)
+        self._pasar_ventana_de_replica()
+        self.assertEqual(self.client.get(detalle).context["producto"].cantidad_disp, 0)  # lo cacheado ya es lo nuevo
+
+    def test_leer_el_carrito_no_pega_la_sesion_a_la_primaria(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("pedido:carrito"))  # el carrito ya existe: get_or_create no escribe
+        self.assertNotIn(replicas.SESSION_PRIMARIA_HASTA, self.client.session)
+
+        self.client.post(reverse("pedido:agregar_al_carrito", args=[self.taza.id]), {"cantidad": 1})
+        self.assertGreater(self.client.session[replicas.SESSION_PRIMARIA_HASTA], time.time())
+
+    def test_tras_el_checkout_la_sesion_lee_de_la_primaria(self):
+        self.client.force_login(self.user)
+        resp = self.client.post(reverse("pedido:checkout"), DATOS_CHECKOUT)
+        self.assertRedirects(resp, reverse("pedido:gracias"))
+        self.assertEqual(Pedido.objects.using("lectura").count(), 0)  # la réplica no lo tiene aún
+
+        resp = self.client.get(reverse("usuario:perfil"))
+        self.assertEqual(len(resp.context["pedidos"]), 1)
+
+        # Pasado el tiempo de réplica, vuelve a leer de la réplica (aquí, atrasada a propósito)
+        session = self.client.session
+        session[replicas.SESSION_PRIMARIA_HASTA] = time.time() - 1
+        session.save()
+        resp = self.client.get(reverse("usuario:perfil"))
+        self.assertEqual(len(resp.context["pedidos"]), 0)
+
+
+class PresupuestoConsultasTests(TestCase):
+    """Perfil y factura no hacen una consulta por pedido o por ítem (N+1)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="ana@barrovivo.co", password="clave-segura-123")
+        self.client.force_login(self.user)
+        self.productos = [
+            Producto.objects.create(nombre=f"Pieza {i}", precio=Decimal("10000"), cantidad_disp=50)
+            for i in range(4)
+        ]
+
+    def _pedido(self, items):
+        pedido = Pedido.objects.create(usuario=self.user, total=Decimal("10000") * items, **{
+            "correo": "cliente@barrovivo.co", "nombre_cliente": "Ana Pérez", "cedula": "123456",
+            "departamento": "Antioquia", "municipio": "El Carmen de Viboral",
+            "direccion": "Calle 1 # 2-3", "celular": "3000000000",
+        })
+        PedidoItem.objects.bulk_create(
+            PedidoItem(pedido=pedido, producto=p, cantidad=1, precio=Decimal("10000"))
+            for p in self.productos[:items]
+        )
+        return pedido
+
+    def _consultas(self, url):
+        # En TestCase la réplica es la misma conexión que la primaria
+        with CaptureQueriesContext(connection) as consultas:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return len(consultas)
+
+    def test_perfil_no_crece_con_los_pedidos(self):
+        self._pedido(1)
+        self.client.get(reverse("usuario:perfil"))  # sesión y caché ya calientes
+        uno = self._consultas(reverse("usuario:perfil"))
+
+        for _ in range(4):
+            self._pedido(4)
+        self.assertEqual(self._consultas(reverse("usuario:perfil")), uno)
+
+    def test_factura_no_crece_con_los_items(self):
+        corto, largo = self._pedido(1), self._pedido(4)
+        self.client.get(reverse("pedido:factura_html", args=[corto.pk]))
+        self.assertEqual(
+            self._consultas(reverse("pedido:factura_html", args=[largo.pk])),
+            self._consultas(reverse("pedido:factura_html", args=[corto.pk])),
+        )
+
+    def test_vista_que_se_pasa_del_presupuesto_falla(self):
+        self._pedido(1)
+        with mock.patch.object(PerfilView, "presupuesto_consultas", 2):
+            with self.assertRaises(PresupuestoConsultasExcedido):
+                self.client.get(reverse("usuario:perfil"))
+
+    def test_en_log_cuenta_con_la_medicion_de_rendimiento(self):
+        self._pedido(1)
+        url = reverse("usuario:perfil")
+        self.client.get(url)
+        with override_settings(PRESUPUESTO_CONSULTAS="log"), \
+                mock.patch("Barrovivo.consultas.connections") as conexiones, \
+                mock.patch.object(PerfilView, "presupuesto_consultas", 2), \
+                CaptureQueriesContext(connection) as consultas, \
+                self.assertLogs("Barrovivo.consultas", "WARNING") as log:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertIn(f"{len(consultas)} consultas, presupuesto 2", log.output[0])
+        # No envuelve las conexiones: el conteo ya lo hace Barrovivo.rendimiento
+        conexiones.all.assert_not_called()
+
+    def test_vista_sin_presupuesto_no_anota_sql(self):
+        with mock.patch("Barrovivo.consultas.connections") as conexiones:
+            self.client.get(reverse("pedido:api_carrito"))
+        conexiones.all.assert_not_called()
+
+    def test_conexion_abierta_a_mitad_de_request_no_deja_el_wrapper(self):
+        def otro(execute, sql, params, many, context):  # lo que agrega connection_created al abrir
+            return execute(sql, params, many, context)
+
+        request = RequestFactory().get(reverse("usuario:perfil"))
+        request.resolver_match = resolve(request.path)
+
+        def get_response(request):
+            middleware.process_view(request, request.resolver_match.func, (), {})
+            connection.execute_wrappers.append(otro)
+            return HttpResponse()
+
+        middleware = PresupuestoConsultasMiddleware(get_response)
+        antes = list(connection.execute_wrappers)
+        try:
+            middleware(request)
+            self.assertEqual(connection.execute_wrappers, antes + [otro])
+        finally:
+            connection.execute_wrappers[:] = antes
+
+    def test_presupuesto_de_la_vista(self):
+        request = RequestFactory().get("/")
+        self.assertIsNone(presupuesto_de(request))
+        request.resolver_match = resolve(reverse("usuario:perfil"))
+        self.assertEqual(presupuesto_de(request), PerfilView.presupuesto_consultas)
+
+        vista = presupuesto_consultas(3)(lambda request: None)
+        request.resolver_match = mock.Mock(func=vista)
+        self.assertEqual(presupuesto_de(request), 3)
@@ -8,6 +8,13 @@ from .views import (
     GraciasView,
     FacturaHTMLView
 )
+from .views_api import (
+    CarritoApiView,
+    AgregarApiView,
+    ActualizarApiView,
+    ActualizarLoteApiView,
+    RemoverApiView,
+)
 
 app_name = "pedido"
 
@@ -17,6 +24,12 @@ urlpatterns = [
     path("agregar/<int:producto_id>/", AgregarAlCarritoView.as_view(), name="agregar_al_carrito"),
     path("actualizar/<int:item_id>/", ActualizarCantidadView.as_view(), name="actualizar_cantidad"),
     path("remover/<int:item_id>/", RemoverDelCarritoView.as_view(), name="remover_del_carrito"),
+    # API JSON del carrito (static/carrito.js)
+    path("api/carrito/", CarritoApiView.as_view(), name="api_carrito"),
+    path("api/carrito/agregar/<int:producto_id>/", AgregarApiView.as_view(), name="api_agregar"),
+    path("api/carrito/actualizar/", ActualizarLoteApiView.as_view(), name="api_actualizar_lote"),
+    path("api/carrito/actualizar/<int:item_id>/", ActualizarApiView.as_view(), name="api_actualizar"),
+    path("api/carrito/remover/<int:item_id>/", RemoverApiView.as_view(), name="api_remover"),
     path("checkout/", CheckoutView.as_view(), name="checkout"),
     path("gracias/", GraciasView.as_view(), name="gracias"),
     path("factura/<int:pk>/", FacturaHTMLView.as_view(), name="factura_html"),
@@ -14,29 +14,41 @@ from django.db import transaction
 from django.utils import timezone
 from django.utils.timezone import now
 from .models import Carrito, ItemCarrito, Pedido, PedidoItem
+from producto import cache_catalogo
 from producto.models import Producto
+from .services.reserva_stock import reservar_stock, StockInsuficiente
+from .services.carrito_actual import CarritoActual
+from .services import operaciones_carrito
+from usuario.services import analitica
 
 # Autor: Luis Angel Nerio  
 # Editado: Camilo Salazar 
 
+# nivel de operaciones_carrito -> nivel de django.contrib.messages
+NIVELES = {"success": messages.SUCCESS, "warning": messages.WARNING}
+
 
 class CarritoMixin(LoginRequiredMixin):
-    """Mixin para obtener/crear el carrito del usuario."""
+    """Mixin para obtener/crear el carrito del usuario (memoizado por request)."""
+    @property
+    def carrito_actual(self):
+        return CarritoActual.de_request(self.request)
+
     def get_carrito(self):
-        carrito, _ = Carrito.objects.get_or_create(usuario=self.request.user)
-        return carrito
+        return self.carrito_actual.carrito
 
 
 class CarritoDetalleView(CarritoMixin, TemplateView):
     """Vista para mostrar el detalle del carrito de compras."""
     template_name = "carrito_detalle.html"   
+    presupuesto_consultas = 10
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        carrito = self.get_carrito()
-        ctx["carrito"] = carrito
-        ctx["items"] = carrito.items.all()
-        ctx["total"] = carrito.obtener_total()
+        actual = self.carrito_actual
+        ctx["carrito"] = actual.carrito
+        ctx["items"] = actual.items
+        ctx["total"] = actual.total
         return ctx
 
 
@@ -44,32 +56,13 @@ class AgregarAlCarritoView(CarritoMixin, View):
     """POST: agregar un producto al carrito respetando el stock."""
     def post(self, request, producto_id, *args, **kwargs):
         producto = get_object_or_404(Producto, id=producto_id)
-        stock = int(getattr(producto, "cantidad_disp", 0) or 0)
         try:
             cantidad = max(1, int(request.POST.get("cantidad", 1)))
         except (TypeError, ValueError):
             cantidad = 1
 
-        carrito = self.get_carrito()
-        item, _ = ItemCarrito.objects.get_or_create(
-            carrito=carrito,
-            producto=producto,
-            defaults={"cantidad": 0},
-        )
-
-        actual = int(item.cantidad or 0)
-        disponible = max(0, stock - actual)
-
-        if disponible <= 0:
-            messages.warning(request, "No hay más unidades disponibles de este producto.")
-        else:
-            agregar = min(cantidad, disponible)
-            item.cantidad = actual + agregar
-            item.save()
-            if agregar < cantidad:
-                messages.warning(request, f"Solo se agregaron {agregar} unidad(es). Límite por stock: {stock}.")
-            else:
-                messages.success(request, f"{producto.nombre} agregado al carrito.")
+        r = operaciones_carrito.agregar(self.carrito_actual, producto, cantidad)
+        messages.add_message(request, NIVELES[r["nivel"]], r["mensaje"])
 
         next_url = request.POST.get("next") or reverse("pedido:carrito")
         return redirect(next_url)
@@ -85,28 +78,14 @@ class AgregarAlCarritoView(CarritoMixin, View):
 class ActualizarCantidadView(CarritoMixin, View):
     """POST: actualizar la cantidad de un item respetando el stock."""
     def post(self, request, item_id, *args, **kwargs):
-        item = get_object_or_404(ItemCarrito, id=item_id, carrito__usuario=request.user)
-        stock = int(getattr(item.producto, "cantidad_disp", 0) or 0)
-
+        item = get_object_or_404(ItemCarrito.objects.select_related("producto"), id=item_id, carrito__usuario=request.user)
         try:
             nueva = int(request.POST.get("cantidad", 1))
         except (TypeError, ValueError):
             nueva = 1
 
-        if stock <= 0 or nueva <= 0:
-            item.delete()
-            messages.warning(request, "Producto sin stock o cantidad inválida. Se removió del carrito.")
-            return redirect("pedido:carrito")
-
-        if nueva > stock:
-            item.cantidad = stock
-            item.save()
-            messages.warning(request, f"Cantidad ajustada a {stock} por límite de stock.")
-        else:
-            item.cantidad = nueva
-            item.save()
-            messages.success(request, "Cantidad actualizada.")
-
+        r = operaciones_carrito.actualizar(self.carrito_actual, item, nueva)
+        messages.add_message(request, NIVELES[r["nivel"]], r["mensaje"])
         return redirect("pedido:carrito")
 
     def get(self, request, item_id, *args, **kwargs):
@@ -116,10 +95,9 @@ class ActualizarCantidadView(CarritoMixin, View):
 class RemoverDelCarritoView(CarritoMixin, View):
     """POST/GET: remover un item del carrito."""
     def post(self, request, item_id, *args, **kwargs):
-        item = get_object_or_404(ItemCarrito, id=item_id, carrito__usuario=request.user)
-        nombre = item.producto.nombre
-        item.delete()
-        messages.success(request, f"{nombre} removido del carrito.")
+        item = get_object_or_404(ItemCarrito.objects.select_related("producto"), id=item_id, carrito__usuario=request.user)
+        r = operaciones_carrito.remover(self.carrito_actual, item)
+        messages.success(request, r["mensaje"])
         return redirect("pedido:carrito")
 
     def get(self, request, item_id, *args, **kwargs):
@@ -135,25 +113,23 @@ class CheckoutView(TemplateView):
     template_name = "checkout.html"
 
     # --- helpers ---
-    def get_carrito(self):
-        carrito, _ = Carrito.objects.get_or_create(usuario=self.request.user)
-        return carrito
+    @property
+    def carrito_actual(self):
+        return CarritoActual.de_request(self.request)
 
-    def _items_carrito(self, carrito):
-        """Trae los ítems sin depender de la relación inversa (evita itemcarrito_set)."""
-        return ItemCarrito.objects.filter(carrito=carrito)
+    def get_carrito(self):
+        return self.carrito_actual.carrito
 
     # --- GET (igual que lo tienes) ---
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        carrito = self.get_carrito()
-        items = self._items_carrito(carrito)
+        actual = self.carrito_actual
         ctx.update({
             "form_facturacion": FormularioFacturacion(),
             "form_envio": FormularioEnvio(),
             "form_pago": FormularioPago(),
-            "items": items,
-            "total": carrito.obtener_total(),
+            "items": actual.items,
+            "total": actual.total,
         })
         return ctx
 
@@ -163,52 +139,70 @@ class CheckoutView(TemplateView):
         f_env = FormularioEnvio(request.POST)
         f_pago = FormularioPago(request.POST)
 
+        actual = self.carrito_actual
         if not (f_fact.is_valid() and f_env.is_valid() and f_pago.is_valid()):
-            carrito = self.get_carrito()
             return self.render_to_response({
                 "form_facturacion": f_fact,
                 "form_envio": f_env,
                 "form_pago": f_pago,
-                "items": self._items_carrito(carrito),
-                "total": carrito.obtener_total(),
+                "items": actual.items,
+                "total": actual.total,
             })
 
-        carrito = self.get_carrito()
-        items_qs = self._items_carrito(carrito).select_related("producto")
+        carrito = actual.carrito
+        items = actual.items
 
-        if not items_qs.exists():
+        if not items:
             messages.warning(request, "Tu carrito está vacío.")
             return redirect("pedido:carrito")
 
         #numero_pedido = now().strftime("%y%m%d%H%M%S")
 #Editado por Camilo Salazar
-        with transaction.atomic():
-            # Crear Pedido
-            pedido = Pedido.objects.create(
-                usuario=request.user,
-                nombre_cliente=f"{f_fact.cleaned_data['nombres']} {f_fact.cleaned_data['apellidos']}",
-                correo=f_fact.cleaned_data["correo"],
-                cedula=f_fact.cleaned_data["cedula"],
-                celular=f_env.cleaned_data["telefono"],
-                departamento=f_env.cleaned_data["departamento"],
-                municipio=f_env.cleaned_data["municipio"],
-                direccion=f_env.cleaned_data["direccion"],
-                apto_info=f_env.cleaned_data.get("apto_info", ""),
-                total=carrito.obtener_total(),
-            )
-
-            # Crear PedidoItem y descontar stock
-            for it in items_qs:
-                prod = it.producto
-                prod.restar_cantidad(it.cantidad)
-                PedidoItem.objects.create(
-                    pedido=pedido,
-                    producto=prod,
-                    cantidad=it.cantidad,
-                    precio=prod.precio
+        try:
+            with transaction.atomic():
+                # Descontar stock de todas las líneas en una sola sentencia
+                reservar_stock(items)
+                # Cambió stock y ventas: el catálogo cacheado ya no sirve
+                cache_catalogo.invalidar()
+
+                # Crear Pedido
+                pedido = Pedido.objects.create(
+                    usuario=request.user,
+                    nombre_cliente=f"{f_fact.cleaned_data['nombres']} {f_fact.cleaned_data['apellidos']}",
+                    correo=f_fact.cleaned_data["correo"],
+                    cedula=f_fact.cleaned_data["cedula"],
+                    celular=f_env.cleaned_data["telefono"],
+                    departamento=f_env.cleaned_data["departamento"],
+                    municipio=f_env.cleaned_data["municipio"],
+                    direccion=f_env.cleaned_data["direccion"],
+                    apto_info=f_env.cleaned_data.get("apto_info", ""),
+                    total=actual.total,
+                )
+
+                # Crear todos los PedidoItem de una vez
+                PedidoItem.objects.bulk_create([
+                    PedidoItem(
+                        pedido=pedido,
+                        producto=it.producto,
+                        cantidad=it.cantidad,
+                        precio=it.producto.precio,
+                    )
+                    for it in items
+                ])
+                # Tablero de analítica: se suma a las tablas agregadas en la misma transacción
+                analitica.registrar_pedido(
+                    pedido, [(it.producto.id, it.cantidad, it.producto.precio) for it in items]
                 )
 
-            carrito.items.all().delete()
+                carrito.items.all().delete()
+                actual.invalidar()
+        except StockInsuficiente as e:
+            for f in e.faltantes:
+                messages.error(
+                    request,
+                    f"No hay stock suficiente de {f['nombre']}: pediste {f['solicitado']}, quedan {f['disponible']}.",
+                )
+            return redirect("pedido:carrito")
 
         request.session["ultima_compra_id"] = pedido.id
         return redirect("pedido:gracias")
@@ -216,6 +210,7 @@ class CheckoutView(TemplateView):
 
 class GraciasView(LoginRequiredMixin, TemplateView):
     template_name = "gracias.html"
+    presupuesto_consultas = 10
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
@@ -229,10 +224,11 @@ class GraciasView(LoginRequiredMixin, TemplateView):
 
 class FacturaHTMLView(LoginRequiredMixin, TemplateView):
     template_name = "factura_html.html"
+    presupuesto_consultas = 10
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        pedido = get_object_or_404(Pedido, id=kwargs.get("pk"), usuario=self.request.user)
+        pedido = get_object_or_404(Pedido.objects.con_items(), id=kwargs.get("pk"), usuario=self.request.user)
         ctx["pedido"] = pedido
-        ctx["itemsPedido"] = pedido.items.all()  
+        ctx["itemsPedido"] = pedido.items.all()  # ya prefetcheados con su producto
         return ctx
\ No newline at end of file
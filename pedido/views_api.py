@@ -0,0 +1,139 @@
+# pedido/views_api.py
+"""
+API JSON del carrito: misma lógica de stock que las vistas HTML
+(services/operaciones_carrito) pero respondiendo en una sola ida y vuelta la
+línea afectada, los totales y el tope por stock. Lo usa static/carrito.js.
+
+Los POST aceptan formulario (cantidad=N) o JSON ({"cantidad": N});
+el lote recibe {"items": [{"id": 3, "cantidad": 2}, ...]}.
+"""
+import json
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views import View
+
+from producto.models import Producto
+from .models import ItemCarrito
+from .services import operaciones_carrito
+from .services.carrito_actual import CarritoActual
+
+
+class DatosInvalidos(Exception):
+    pass
+
+
+def _datos(request) -> dict:
+    if request.content_type == "application/json":
+        try:
+            datos = json.loads(request.body.decode("utf-8") or "{}")
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise DatosInvalidos("JSON inválido")
+        if not isinstance(datos, dict):
+            raise DatosInvalidos("Se esperaba un objeto JSON")
+        return datos
+    return request.POST
+
+
+def _entero(valor, defecto: int = 1) -> int:
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return defecto
+
+
+def _cantidad_obligatoria(valor) -> int:
+    """Cantidad del lote: entero >= 0 (0 quita la línea). Sin valor o inválida es un error, no un 0."""
+    if isinstance(valor, bool):
+        raise ValueError(valor)
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if not valor.isdigit():
+            raise ValueError(valor)
+    elif not isinstance(valor, int):
+        raise TypeError(valor)
+    cantidad = int(valor)
+    if cantidad < 0:
+        raise ValueError(valor)
+    return cantidad
+
+
+class CarritoApiMixin(LoginRequiredMixin):
+    """401 en JSON en vez de redirigir al login; errores de entrada como 400."""
+    def handle_no_permission(self):
+        return JsonResponse({"ok": False, "error": "Inicia sesión para usar el carrito"}, status=401)
+
+    @property
+    def carrito_actual(self):
+        return CarritoActual.de_request(self.request)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except DatosInvalidos as e:
+            return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+    def responder(self, resultado: dict, **extra) -> JsonResponse:
+        return JsonResponse({
+            "ok": True,
+            "nivel": resultado["nivel"],
+            "mensaje": resultado["mensaje"],
+            "item": operaciones_carrito.serializar_item(resultado["item"]),
+            "carrito": operaciones_carrito.serializar_totales(self.carrito_actual),
+            **extra,
+        })
+
+    def get_item(self, item_id) -> ItemCarrito:
+        return get_object_or_404(
+            ItemCarrito.objects.select_related("producto"), id=item_id, carrito__usuario=self.request.user
+        )
+
+
+class CarritoApiView(CarritoApiMixin, View):
+    """GET: todas las líneas y los totales."""
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({"ok": True, **operaciones_carrito.serializar(self.carrito_actual)})
+
+
+class AgregarApiView(CarritoApiMixin, View):
+    def post(self, request, producto_id, *args, **kwargs):
+        producto = get_object_or_404(Producto, id=producto_id)
+        cantidad = _entero(_datos(request).get("cantidad", 1))
+        return self.responder(operaciones_carrito.agregar(self.carrito_actual, producto, cantidad))
+
+
+class ActualizarApiView(CarritoApiMixin, View):
+    def post(self, request, item_id, *args, **kwargs):
+        item = self.get_item(item_id)
+        nueva = _entero(_datos(request).get("cantidad", 1))
+        return self.responder(operaciones_carrito.actualizar(self.carrito_actual, item, nueva), id=item_id)
+
+
+class RemoverApiView(CarritoApiMixin, View):
+    def post(self, request, item_id, *args, **kwargs):
+        item = self.get_item(item_id)
+        return self.responder(operaciones_carrito.remover(self.carrito_actual, item), id=item_id)
+
+
+class ActualizarLoteApiView(CarritoApiMixin, View):
+    """POST {"items": [{"id", "cantidad"}, ...]}: varias líneas en una sola request."""
+    def post(self, request, *args, **kwargs):
+        lineas = _datos(request).get("items")
+        if not isinstance(lineas, list):
+            raise DatosInvalidos("Falta 'items'")
+        try:
+            cambios = {int(l["id"]): _cantidad_obligatoria(l["cantidad"]) for l in lineas}
+        except (AttributeError, TypeError, ValueError, KeyError):
+            raise DatosInvalidos("Cada línea necesita 'id' y 'cantidad' (entero, 0 para quitarla)")
+
+        resultados = operaciones_carrito.actualizar_lote(self.carrito_actual, cambios)
+        return JsonResponse({
+            "ok": True,
+            "items": [
+                {"id": item_id, "nivel": r["nivel"], "mensaje": r["mensaje"],
+                 "item": operaciones_carrito.serializar_item(r["item"])}
+                for item_id, r in resultados.items()
+            ],
+            "carrito": operaciones_carrito.serializar_totales(self.carrito_actual),
+        })
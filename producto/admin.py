@@ -8,7 +8,7 @@ class ProductoAdmin(admin.ModelAdmin):
     list_filter = ['es_activo', 'categorias', 'creado']
     search_fields = ['nombre', 'descripcion']
     filter_horizontal = ['categorias']
-    readonly_fields = ['creado', 'actualizado']
+    readonly_fields = ['creado', 'actualizado', 'unidades_vendidas']
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
@@ -0,0 +1,221 @@
+# producto/busqueda.py
+"""
+Índice de búsqueda de texto completo para el catálogo.
+
+- SQLite: tabla virtual FTS5 `producto_busqueda` (rowid = id del producto).
+- PostgreSQL: tabla `producto_busqueda` con una columna tsvector + índice GIN.
+- Otros motores: se cae a `icontains` (mismo resultado, sin índice).
+
+El texto se guarda normalizado con `normalizar` (minúsculas, sin acentos), igual
+que `usuario.chat_service._norm`, así "jarrón" y "jarron" encuentran lo mismo, y
+cada palabra reducida con `raiz` (plurales simples), así "materas" encuentra
+"matera" y "flor" encuentra "flores".
+"""
+import re
+import unicodedata
+from typing import Iterable, List, Optional
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+TABLA = "producto_busqueda"
+
+
+def normalizar(s: Optional[str]) -> Optional[str]:
+    """minúsculas + sin acentos + trim."""
+    if not s:
+        return None
+    s = s.strip().lower()
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
+    return s
+
+
+def raiz(token: str) -> str:
+    """
+    Quita el plural simple y la "e" final tras consonante, igual al indexar y al
+    buscar: materas/matera -> matera, flores/flor -> flor, verdes/verde -> verd.
+    """
+    if not token.isalpha() or len(token) <= 3:
+        return token
+    if token.endswith("s"):
+        token = token[:-1]
+    if len(token) > 3 and token.endswith("e") and token[-2] not in "aeiou":
+        token = token[:-1]
+    return token
+
+
+def tokens(texto: Optional[str]) -> List[str]:
+    return [raiz(t) for t in re.findall(r"[a-z0-9]+", normalizar(texto) or "")]
+
+
+def texto_indexado(texto: Optional[str]) -> str:
+    """Lo que se guarda en el índice: los tokens de `texto` separados por espacios."""
+    return " ".join(tokens(texto))
+
+
+def _motor() -> str:
+    return connection.vendor  # "sqlite", "postgresql", ...
+
+
+# =========================
+# Esquema
+# =========================
+def crear_indice(schema_editor) -> None:
+    """Crea la tabla del índice según el motor (la usa la migración)."""
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA} USING fts5("
+            "nombre, descripcion, categorias, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLA} ("
+            "producto_id bigint PRIMARY KEY REFERENCES producto_producto(id) ON DELETE CASCADE "
+            "DEFERRABLE INITIALLY DEFERRED, "
+            "documento tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TABLA}_documento_gin ON {TABLA} USING gin (documento)"
+        )
+
+
+def eliminar_indice(schema_editor) -> None:
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA}")
+
+
+def indice_disponible() -> bool:
+    return _motor() in ("sqlite", "postgresql")
+
+
+# =========================
+# Sincronización
+# =========================
+def _documento(producto) -> tuple:
+    categorias = " ".join(c.nombre for c in producto.categorias.all()) if producto.pk else ""
+    return (
+        texto_indexado(producto.nombre),
+        texto_indexado(producto.descripcion),
+        texto_indexado(categorias),
+    )
+
+
+def indexar(producto) -> None:
+    if not indice_disponible():
+        return
+    nombre, descripcion, categorias = _documento(producto)
+    with connection.cursor() as cur:
+        if _motor() == "sqlite":
+            cur.execute(f"DELETE FROM {TABLA} WHERE rowid = %s", [producto.pk])
+            cur.execute(
+                f"INSERT INTO {TABLA} (rowid, nombre, descripcion, categorias) VALUES (%s, %s, %s, %s)",
+                [producto.pk, nombre, descripcion, categorias],
+            )
+        else:
+            cur.execute(
+                f"INSERT INTO {TABLA} (producto_id, documento) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'B') || "
+                "setweight(to_tsvector('simple', %s), 'C')) "
+                "ON CONFLICT (producto_id) DO UPDATE SET documento = EXCLUDED.documento",
+                [producto.pk, nombre, categorias, descripcion],
+            )
+
+
+def desindexar(producto_id: int) -> None:
+    if not indice_disponible():
+        return
+    columna = "rowid" if _motor() == "sqlite" else "producto_id"
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {TABLA} WHERE {columna} = %s", [producto_id])
+
+
+def reconstruir() -> int:
+    """Vacía y vuelve a llenar el índice con todos los productos. Devuelve cuántos indexó."""
+    from .models import Producto
+
+    if not indice_disponible():
+        return 0
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {TABLA}")
+    n = 0
+    for producto in Producto.objects.prefetch_related("categorias").iterator(chunk_size=500):
+        indexar(producto)
+        n += 1
+    return n
+
+
+# =========================
+# Consulta
+# =========================
+def _expresion(terminos: Iterable[str], operador: str) -> Optional[str]:
+    """
+    Convierte términos (palabras o frases) en una consulta del motor.
+    Cada término es una frase con prefijo en la última palabra ("mater" encuentra "matera").
+    Solo se usan tokens [a-z0-9], así que no hay inyección en la sintaxis del motor.
+    """
+    partes = []
+    for termino in terminos:
+        toks = tokens(termino)
+        if not toks:
+            continue
+        if _motor() == "sqlite":
+            partes.append('"' + " ".join(toks) + '"*')
+        else:
+            partes.append("(" + " <-> ".join(toks[:-1] + [toks[-1] + ":*"]) + ")")
+    if not partes:
+        return None
+    if _motor() == "sqlite":
+        return f" {operador.upper()} ".join(partes)
+    return (" | " if operador == "or" else " & ").join(partes)
+
+
+def buscar(queryset, terminos: Iterable[str], operador: str = "and"):
+    """
+    Filtra `queryset` (de Producto) por los términos y anota `relevancia` (mayor = mejor).
+    operador="and": todos los términos; "or": cualquiera.
+    """
+    terminos = [t for t in terminos if t]
+    expr = _expresion(terminos, operador)
+    if expr is None:
+        return queryset
+
+    tabla_producto = queryset.model._meta.db_table
+    if _motor() == "sqlite":
+        ids = RawSQL(f"SELECT rowid FROM {TABLA} WHERE {TABLA} MATCH %s", [expr])
+        # bm25: menor es mejor; los pesos priorizan nombre > categorías > descripción
+        relevancia = RawSQL(
+            f"SELECT -bm25({TABLA}, 10.0, 1.0, 4.0) FROM {TABLA} "
+            f"WHERE {TABLA} MATCH %s AND rowid = {tabla_producto}.id",
+            [expr], output_field=FloatField(),
+        )
+    elif _motor() == "postgresql":
+        ids = RawSQL(
+            f"SELECT producto_id FROM {TABLA} WHERE documento @@ to_tsquery('simple', %s)", [expr]
+        )
+        relevancia = RawSQL(
+            f"SELECT ts_rank(documento, to_tsquery('simple', %s)) FROM {TABLA} "
+            f"WHERE producto_id = {tabla_producto}.id",
+            [expr], output_field=FloatField(),
+        )
+    else:
+        return _buscar_icontains(queryset, terminos, operador)
+
+    return queryset.filter(pk__in=ids).annotate(relevancia=relevancia)
+
+
+def _buscar_icontains(queryset, terminos: List[str], operador: str):
+    q = None
+    for t in terminos:
+        nt = " ".join(tokens(t))
+        cond = Q(nombre__icontains=nt) | Q(descripcion__icontains=nt)
+        if q is None:
+            q = cond
+        else:
+            q = (q | cond) if operador == "or" else (q & cond)
+    qs = queryset.filter(q) if q is not None else queryset
+    return qs.annotate(relevancia=Value(0.0, output_field=FloatField()))
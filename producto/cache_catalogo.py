@@ -0,0 +1,124 @@
+# producto/cache_catalogo.py
+"""
+Caché del catálogo (alias "catalogo" en CACHES; ver CATALOGO_CACHE en settings).
+
+- Se guardan las páginas ya consultadas (PaginaKeyset) por vista + parámetros
+  GET + idioma, y los fragmentos HTML de tarjetas y detalle ({% cache %} en los
+  templates, con `catalogo_version` en la clave).
+- Las páginas y fragmentos no llevan nada por usuario: favoritos y el badge del
+  carrito se marcan / renderizan por fuera de lo cacheado. Los favoritos viven
+  aparte, como conjunto de ids por usuario ("favoritos:<id>", ver
+  Favorito.ids_de) que no depende de la versión del catálogo y que solo se
+  guarda si la caché es compartida entre procesos (CATALOGO_CACHE_COMPARTIDA).
+- Invalidación por versión: cualquier cambio de Producto, Categoria, sus M2M o
+  un checkout que mueve stock sube "catalogo:version" y todas las claves viejas
+  quedan huérfanas (expiran solas por TTL).
+- Réplicas: tras subir la versión, durante DB_PRIMARIA_PEGADA_SEGUNDOS lo que
+  se recalcula se lee de la primaria; si no, el primer anónimo podría llenar la
+  versión nueva desde una réplica atrasada y dejar el stock viejo todo el TTL.
+"""
+import hashlib
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import translation
+
+from Barrovivo import replicas
+from Barrovivo.metricas import VentanaMetricas
+
+ALIAS = "catalogo"
+_CLAVE_VERSION = "catalogo:version"
+# Existe mientras las réplicas pueden no tener aún el cambio que subió la versión
+_CLAVE_PRIMARIA = "catalogo:primaria"
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def ttl() -> int:
+    return getattr(settings, "CATALOGO_CACHE_TTL", 600)
+
+
+def version() -> int:
+    c = _cache()
+    v = c.get(_CLAVE_VERSION)
+    if v is None:
+        # add() no pisa la versión si otro proceso la creó entre el get y aquí
+        c.add(_CLAVE_VERSION, 1, None)
+        v = c.get(_CLAVE_VERSION) or 1
+    return v
+
+
+def _subir_version() -> None:
+    c = _cache()
+    try:
+        c.incr(_CLAVE_VERSION)
+    except ValueError:  # no existía (caché reiniciada): cualquier valor nuevo sirve
+        c.set(_CLAVE_VERSION, 2, None)
+    c.set(_CLAVE_PRIMARIA, True, settings.DB_PRIMARIA_PEGADA_SEGUNDOS)
+
+
+def invalidar() -> None:
+    """
+    Sube la versión ya (esta misma petición ve datos frescos) y otra vez al
+    confirmar la transacción, por si otra petición cacheó datos viejos entre medio.
+    """
+    _subir_version()
+    transaction.on_commit(_subir_version)
+
+
+# =========================
+# Métricas (por proceso, como usuario.metricas_chat)
+# =========================
+class MetricasCache:
+    def __init__(self):
+        self._ventana = VentanaMetricas()
+
+    def registrar(self, nombre: str, acierto: bool) -> None:
+        self._ventana.registrar(nombre, {"hits": int(acierto), "misses": int(not acierto)})
+
+    def resumen(self) -> dict:
+        vistas = {}
+        for nombre, datos in self._ventana.foto().items():
+            c = datos["contadores"]
+            total = c["hits"] + c["misses"]
+            vistas[nombre] = {"hits": c["hits"], "misses": c["misses"],
+                              "tasa_aciertos": round(c["hits"] / total, 3) if total else 0.0}
+        return {"version": version(), "vistas": vistas}
+
+    def reiniciar(self) -> None:
+        self._ventana.reiniciar()
+
+
+metricas = MetricasCache()
+
+
+# =========================
+# Uso desde las vistas
+# =========================
+def clave(nombre: str, request, *extra) -> str:
+    """nombre + versión + idioma + parámetros GET (ordenados) + extra. `request` puede ser None."""
+    params = sorted((k, tuple(sorted(request.GET.getlist(k)))) for k in request.GET) if request else []
+    crudo = repr((params, extra)).encode("utf-8")
+    return f"catalogo:{nombre}:{version()}:{translation.get_language()}:{hashlib.sha1(crudo).hexdigest()}"
+
+
+def obtener(nombre: str, request, calcular: Callable, *extra):
+    """Devuelve lo cacheado para esta vista/parámetros o lo calcula y lo guarda."""
+    c = _cache()
+    k = clave(nombre, request, *extra)
+    valor = c.get(k)
+    if valor is not None:
+        metricas.registrar(nombre, True)
+        return valor
+    metricas.registrar(nombre, False)
+    if c.get(_CLAVE_PRIMARIA):
+        with replicas.usar_primaria():
+            valor = calcular()
+    else:
+        valor = calcular()
+    c.set(k, valor, ttl())
+    return valor
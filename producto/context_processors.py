@@ -0,0 +1,15 @@
+from django.utils import translation
+from django.utils.functional import SimpleLazyObject
+
+from . import cache_catalogo
+
+
+def catalogo(request):
+    """
+    `catalogo_version` para la clave de los {% cache %} del catálogo (versión + idioma).
+    Es perezoso: las páginas sin fragmentos cacheados no consultan la caché.
+    """
+    return {
+        "catalogo_version": SimpleLazyObject(lambda: f"{cache_catalogo.version()}-{translation.get_language()}"),
+        "catalogo_ttl": cache_catalogo.ttl(),
+    }
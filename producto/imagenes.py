@@ -0,0 +1,166 @@
+# producto/imagenes.py
+"""
+Miniaturas de `Producto.imagen`.
+
+Por cada imagen subida se generan versiones WebP y JPEG en varios anchos
+(ANCHOS), junto al original y con el hash del contenido en el nombre:
+
+    productos/MateraNavidadRoja.pnj.jpeg
+    productos/materanavidadroja-3f2a9c1d04be-320w.webp
+    productos/materanavidadroja-3f2a9c1d04be-320w.jpg
+
+Así las URLs se pueden cachear para siempre: si la imagen cambia, cambia el nombre.
+Lo generado se guarda en `Producto.imagen_variantes`:
+
+    {"origen": <imagen.name>, "hash": ..., "webp": [[160, ruta], ...], "jpeg": [[160, ruta], ...]}
+
+- derivar(): solo storage + Pillow (sin base de datos); lo usan los procesos
+  del comando `generar_miniaturas`.
+- generar(): derivar + guardar en el producto (lo llama la señal al subir).
+- url() / srcset(): para templates (tag `imagen_producto`) y el API del chat.
+"""
+import hashlib
+import logging
+import posixpath
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.text import slugify
+from PIL import Image, ImageOps
+
+from . import cache_catalogo
+
+logger = logging.getLogger(__name__)
+
+ANCHOS = (160, 320, 640, 960)
+# formato -> (formato de Pillow, extensión, opciones)
+FORMATOS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def _rgb(img: Image.Image) -> Image.Image:
+    """JPEG no tiene transparencia: lo transparente queda en blanco."""
+    if img.mode == "RGB":
+        return img
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        fondo = Image.new("RGB", img.size, (255, 255, 255))
+        fondo.paste(img, mask=img.getchannel("A"))
+        return fondo
+    return img.convert("RGB")
+
+
+def _base(nombre: str) -> Tuple[str, str]:
+    """('productos', 'materanavidadroja') para 'productos/MateraNavidadRoja.pnj.jpeg'."""
+    carpeta, archivo = posixpath.split(nombre)
+    return carpeta, slugify(archivo.split(".")[0]) or "imagen"
+
+
+def derivar(nombre: str, storage=default_storage) -> Dict:
+    """Genera (si no existen ya) las miniaturas de `nombre` y devuelve el dict de variantes."""
+    with storage.open(nombre, "rb") as f:
+        datos = f.read()
+    h = hashlib.sha256(datos).hexdigest()[:12]
+
+    with Image.open(BytesIO(datos)) as original:
+        img = _rgb(ImageOps.exif_transpose(original))
+    ancho_original = img.width
+    carpeta, base = _base(nombre)
+
+    variantes: Dict = {"origen": nombre, "hash": h, "webp": [], "jpeg": []}
+    for ancho in sorted({min(a, ancho_original) for a in ANCHOS}):
+        copia = None
+        for formato, (pil, ext, opciones) in FORMATOS.items():
+            ruta = posixpath.join(carpeta, f"{base}-{h}-{ancho}w.{ext}")
+            if not storage.exists(ruta):
+                if copia is None:
+                    alto = max(1, round(img.height * ancho / ancho_original))
+                    copia = img if ancho == ancho_original else img.resize((ancho, alto), Image.LANCZOS)
+                buf = BytesIO()
+                copia.save(buf, pil, **opciones)
+                ruta = storage.save(ruta, ContentFile(buf.getvalue()))
+            variantes[formato].append([ancho, ruta])
+    return variantes
+
+
+def derivar_seguro(nombre: str) -> Tuple[Optional[Dict], str]:
+    """Para el pool de procesos: no deja escapar excepciones (una imagen rota no tumba el lote)."""
+    try:
+        return derivar(nombre), ""
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def inicializar_worker() -> None:
+    """Initializer del ProcessPoolExecutor (spawn): los hijos arrancan sin Django configurado."""
+    import django
+    django.setup()
+
+
+def _rutas(variantes: Dict) -> set:
+    return {ruta for formato in FORMATOS for _, ruta in variantes.get(formato, [])}
+
+
+def guardar(producto, variantes: Dict, storage=default_storage) -> None:
+    """Guarda las variantes (sin disparar señales ni tocar `actualizado`) y borra las que ya no se usan."""
+    from .models import Producto
+
+    anteriores = producto.imagen_variantes or {}
+    sobrantes = _rutas(anteriores) - _rutas(variantes)
+    if anteriores.get("origen") and Producto.objects.exclude(pk=producto.pk).filter(imagen=anteriores["origen"]).exists():
+        sobrantes = set()  # otro producto usa la misma imagen
+    Producto.objects.filter(pk=producto.pk).update(imagen_variantes=variantes)
+    producto.imagen_variantes = variantes
+    cache_catalogo.invalidar()
+    for ruta in sobrantes:
+        storage.delete(ruta)
+
+
+def desactualizada(producto) -> bool:
+    nombre = producto.imagen.name if producto.imagen else ""
+    return (producto.imagen_variantes or {}).get("origen", "") != nombre
+
+
+def generar(producto) -> bool:
+    """Genera las miniaturas del producto si su imagen cambió. Devuelve True si quedaron al día."""
+    if not producto.imagen:
+        if producto.imagen_variantes:
+            guardar(producto, {})
+        return True
+    if not desactualizada(producto):
+        return True
+    variantes, error = derivar_seguro(producto.imagen.name)
+    if variantes is None:
+        logger.warning("No se pudieron generar miniaturas de %s: %s", producto.imagen.name, error)
+        return False
+    guardar(producto, variantes)
+    return True
+
+
+# =========================
+# URLs para templates / API
+# =========================
+def _vigentes(producto, formato: str) -> List[List]:
+    variantes = producto.imagen_variantes or {}
+    if not producto.imagen or variantes.get("origen") != producto.imagen.name:
+        return []
+    return variantes.get(formato, [])
+
+
+def srcset(producto, formato: str = "webp") -> str:
+    return ", ".join(f"{default_storage.url(ruta)} {ancho}w" for ancho, ruta in _vigentes(producto, formato))
+
+
+def url(producto, ancho: int = 640, formato: str = "jpeg") -> Optional[str]:
+    """La variante más chica que cubre `ancho` (o la más grande); sin variantes, el original."""
+    lista = _vigentes(producto, formato)
+    if lista:
+        ruta = next((r for a, r in lista if a >= ancho), lista[-1][1])
+        return default_storage.url(ruta)
+    if producto.imagen:
+        return producto.imagen.url
+    return None
@@ -0,0 +1,49 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from producto import imagenes
+from producto.models import Producto
+
+
+class Command(BaseCommand):
+    help = "Genera las miniaturas WebP/JPEG de las imágenes de producto que aún no las tienen."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1,
+                            help="Procesos para redimensionar en paralelo (1 = sin pool).")
+        parser.add_argument("--todas", action="store_true",
+                            help="Revisa también las que ya están al día (recrea los archivos que falten).")
+
+    def handle(self, *args, **options):
+        productos = [
+            p for p in Producto.objects.exclude(imagen="").exclude(imagen__isnull=True)
+            .only("id", "imagen", "imagen_variantes")
+            if options["todas"] or imagenes.desactualizada(p)
+        ]
+        nombres = [p.imagen.name for p in productos]
+
+        procesos = min(options["procesos"], len(nombres))
+        if procesos > 1:
+            # Los hijos no usan la base; cerramos las conexiones para no compartirlas
+            connections.close_all()
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(procesos, mp_context=ctx, initializer=imagenes.inicializar_worker) as pool:
+                resultados = list(pool.map(imagenes.derivar_seguro, nombres))
+        else:
+            resultados = [imagenes.derivar_seguro(n) for n in nombres]
+
+        errores = 0
+        for producto, (variantes, error) in zip(productos, resultados):
+            if variantes is None:
+                errores += 1
+                self.stderr.write(f"{producto.imagen.name}: {error}")
+                continue
+            imagenes.guardar(producto, variantes)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Miniaturas generadas para {len(productos) - errores} producto(s); {errores} con error."
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from producto import cache_catalogo
+from producto.models import Producto
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el contador Producto.unidades_vendidas a partir de PedidoItem."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            cambiados = Producto.recalcular_unidades_vendidas()
+            if cambiados:
+                cache_catalogo.invalidar()  # el orden por ventas cambió
+        self.stdout.write(self.style.SUCCESS(f"Unidades vendidas recalculadas ({cambiados} producto(s) actualizados)."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from producto import busqueda
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de texto completo de productos (FTS5 / tsvector)."
+
+    def handle(self, *args, **options):
+        if not busqueda.indice_disponible():
+            self.stdout.write(self.style.WARNING("El motor de base de datos no tiene índice de búsqueda; se usa icontains."))
+            return
+        with transaction.atomic():
+            n = busqueda.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"Índice de búsqueda reconstruido ({n} producto(s))."))
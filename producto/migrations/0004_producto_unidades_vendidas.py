@@ -0,0 +1,31 @@
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def poblar_unidades_vendidas(apps, schema_editor):
+    Producto = apps.get_model("producto", "Producto")
+    PedidoItem = apps.get_model("pedido", "PedidoItem")
+    vendidos = (
+        PedidoItem.objects.values("producto_id")
+        .annotate(total=Sum("cantidad"))
+        .values_list("producto_id", "total")
+    )
+    for producto_id, total in vendidos:
+        Producto.objects.filter(pk=producto_id).update(unidades_vendidas=total or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0003_favorito'),
+        ('pedido', '0003_pedido_apto_info'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='unidades_vendidas',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='Unidades vendidas'),
+        ),
+        migrations.RunPython(poblar_unidades_vendidas, migrations.RunPython.noop),
+    ]
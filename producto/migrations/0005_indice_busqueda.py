@@ -0,0 +1,56 @@
+import unicodedata
+
+from django.db import migrations
+
+from producto import busqueda
+
+
+def normalizar(s):
+    """Copia de busqueda.normalizar al crear el índice: la migración no cambia si esa cambia."""
+    if not s:
+        return None
+    s = s.strip().lower()
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
+    return s
+
+
+def crear_indice(apps, schema_editor):
+    busqueda.crear_indice(schema_editor)
+    Producto = apps.get_model("producto", "Producto")
+    vendor = schema_editor.connection.vendor
+    for p in Producto.objects.prefetch_related("categorias"):
+        categorias = " ".join(c.nombre for c in p.categorias.all())
+        campos = [
+            normalizar(p.nombre) or "",
+            normalizar(p.descripcion) or "",
+            normalizar(categorias) or "",
+        ]
+        if vendor == "sqlite":
+            schema_editor.execute(
+                f"INSERT INTO {busqueda.TABLA} (rowid, nombre, descripcion, categorias) VALUES (%s, %s, %s, %s)",
+                [p.pk, *campos],
+            )
+        elif vendor == "postgresql":
+            schema_editor.execute(
+                f"INSERT INTO {busqueda.TABLA} (producto_id, documento) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'C') || "
+                "setweight(to_tsvector('simple', %s), 'B'))",
+                [p.pk, *campos],
+            )
+
+
+def eliminar_indice(apps, schema_editor):
+    busqueda.eliminar_indice(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0004_producto_unidades_vendidas'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0006_producto_imagen_variantes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('cantidad_disp__gt', 0), ('es_activo', True)), fields=['nombre', 'id'], name='producto_visible_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('cantidad_disp__gt', 0), ('es_activo', True)), fields=['-id'], name='producto_visible_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('cantidad_disp__gt', 0), ('es_activo', True)), fields=['-unidades_vendidas', '-id'], name='producto_visible_ventas_idx'),
+        ),
+    ]
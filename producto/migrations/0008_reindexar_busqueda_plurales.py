@@ -0,0 +1,69 @@
+# Generated by Django 5.2 on 2026-10-18 16:05
+
+import re
+import unicodedata
+
+from django.db import migrations
+
+TABLA = "producto_busqueda"
+
+
+# Copias de busqueda.normalizar / raiz / texto_indexado tal como estaban al escribir
+# esta migración: si la normalización cambia, va en una migración nueva.
+def normalizar(s):
+    if not s:
+        return None
+    s = s.strip().lower()
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
+    return s
+
+
+def raiz(token):
+    if not token.isalpha() or len(token) <= 3:
+        return token
+    if token.endswith("s"):
+        token = token[:-1]
+    if len(token) > 3 and token.endswith("e") and token[-2] not in "aeiou":
+        token = token[:-1]
+    return token
+
+
+def texto_indexado(texto):
+    return " ".join(raiz(t) for t in re.findall(r"[a-z0-9]+", normalizar(texto) or ""))
+
+
+def reindexar(apps, schema_editor):
+    """El índice ahora guarda las palabras con busqueda.raiz: se vuelve a llenar."""
+    vendor = schema_editor.connection.vendor
+    if vendor not in ("sqlite", "postgresql"):
+        return
+    schema_editor.execute(f"DELETE FROM {TABLA}")
+    Producto = apps.get_model("producto", "Producto")
+    for p in Producto.objects.prefetch_related("categorias"):
+        categorias = " ".join(c.nombre for c in p.categorias.all())
+        campos = [texto_indexado(p.nombre), texto_indexado(p.descripcion), texto_indexado(categorias)]
+        if vendor == "sqlite":
+            schema_editor.execute(
+                f"INSERT INTO {TABLA} (rowid, nombre, descripcion, categorias) VALUES (%s, %s, %s, %s)",
+                [p.pk, *campos],
+            )
+        else:
+            schema_editor.execute(
+                f"INSERT INTO {TABLA} (producto_id, documento) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'C') || "
+                "setweight(to_tsvector('simple', %s), 'B'))",
+                [p.pk, *campos],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0007_indices_catalogo'),
+    ]
+
+    operations = [
+        migrations.RunPython(reindexar, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
 from django.utils.text import slugify
 from django.conf import settings
+from django.core.cache import caches
+
+from . import cache_catalogo
 
 # Autor: Maria Alejandra Ocampo
 class Categoria(models.Model):
@@ -31,14 +34,29 @@ class Producto(models.Model):
 
     precio = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Precio")
     imagen = models.ImageField(upload_to="productos/", blank=True, null=True, verbose_name="Imagen")
+    # Miniaturas WebP/JPEG de `imagen` (las genera producto.imagenes al subirla)
+    imagen_variantes = models.JSONField(default=dict, blank=True, editable=False)
     cantidad_disp = models.PositiveIntegerField(default=0, verbose_name="Cantidad disponible")
     es_activo = models.BooleanField(default=True, verbose_name="Visible")
+    # Contador desnormalizado de unidades vendidas (lo mantiene el checkout).
+    unidades_vendidas = models.PositiveIntegerField(default=0, db_index=True, verbose_name="Unidades vendidas")
 
     creado = models.DateTimeField(auto_now_add=True)
     actualizado = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["nombre"]
+        # Índices parciales sobre lo que ve el catálogo (es_activo y con stock), uno
+        # por cada orden de la paginación por cursor: el filtro y el ORDER BY salen
+        # del mismo índice, sin recorrer la tabla ni ordenar en memoria.
+        indexes = [
+            models.Index(fields=["nombre", "id"], name="producto_visible_nombre_idx",
+                         condition=models.Q(es_activo=True, cantidad_disp__gt=0)),
+            models.Index(fields=["-id"], name="producto_visible_id_idx",
+                         condition=models.Q(es_activo=True, cantidad_disp__gt=0)),
+            models.Index(fields=["-unidades_vendidas", "-id"], name="producto_visible_ventas_idx",
+                         condition=models.Q(es_activo=True, cantidad_disp__gt=0)),
+        ]
 
     def __str__(self) -> str:
         return self.nombre
@@ -60,6 +78,25 @@ class Producto(models.Model):
         self.cantidad_disp += cantidad
         self.save(update_fields=["cantidad_disp"])
 
+    @classmethod
+    def recalcular_unidades_vendidas(cls) -> int:
+        """Reconstruye `unidades_vendidas` a partir de los PedidoItem. Devuelve cuántos productos cambió."""
+        from pedido.models import PedidoItem
+
+        vendidos = dict(
+            PedidoItem.objects.values("producto_id")
+            .annotate(total=models.Sum("cantidad"))
+            .values_list("producto_id", "total")
+        )
+        cambiados = []
+        for producto in cls.objects.only("id", "unidades_vendidas"):
+            total = int(vendidos.get(producto.id) or 0)
+            if producto.unidades_vendidas != total:
+                producto.unidades_vendidas = total
+                cambiados.append(producto)
+        cls.objects.bulk_update(cambiados, ["unidades_vendidas"], batch_size=500)
+        return len(cambiados)
+
 #Autor: Luis Angel Nerio
 class Favorito(models.Model):
     """Modelo para los productos favoritos de los usuarios."""
@@ -74,3 +111,47 @@ class Favorito(models.Model):
 
     def __str__(self):
         return f"{self.usuario}  {self.producto}"
+
+    # ——— Conjunto de favoritos por usuario en la caché del catálogo ———
+    # Las señales de Favorito lo borran ante cualquier cambio; se vuelve a leer de la base al pedirlo.
+    # Solo con una caché compartida (CATALOGO_CACHE_COMPARTIDA): el borrado tiene que verse en
+    # todos los workers.
+    @staticmethod
+    def _clave_cache(usuario_id) -> str:
+        return f"favoritos:{usuario_id}"
+
+    @classmethod
+    def ids_de(cls, usuario) -> frozenset:
+        """Ids de productos favoritos del usuario (una consulta por usuario hasta que cambien)."""
+        if not usuario.is_authenticated:
+            return frozenset()
+        if not settings.CATALOGO_CACHE_COMPARTIDA:
+            return frozenset(cls.objects.filter(usuario=usuario).values_list("producto_id", flat=True))
+        cache = caches[cache_catalogo.ALIAS]
+        clave = cls._clave_cache(usuario.pk)
+        ids = cache.get(clave)
+        if ids is None:
+            ids = frozenset(cls.objects.filter(usuario=usuario).values_list("producto_id", flat=True))
+            cache.set(clave, ids, cache_catalogo.ttl())
+        return ids
+
+    @classmethod
+    def invalidar_cache(cls, usuario_id) -> None:
+        caches[cache_catalogo.ALIAS].delete(cls._clave_cache(usuario_id))
+
+    @classmethod
+    def alternar(cls, usuario, producto) -> bool:
+        """Agrega o quita el producto de favoritos. Devuelve True si quedó como favorito."""
+        # Sin escribir el conjunto derivado de vuelta: dos toggles a la vez se pisarían.
+        # Las señales borran la entrada y el próximo ids_de la lee de la base.
+        borrados, _ = cls.objects.filter(usuario=usuario, producto=producto).delete()
+        if not borrados:
+            cls.objects.get_or_create(usuario=usuario, producto=producto)
+        return not borrados
+
+    @classmethod
+    def marcar(cls, usuario, productos) -> None:
+        """Pone `es_favorito` en cada producto dado (sin consultar la base si el conjunto está en caché)."""
+        fav_ids = cls.ids_de(usuario)
+        for p in productos:
+            p.es_favorito = p.id in fav_ids
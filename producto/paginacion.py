@@ -0,0 +1,123 @@
+# producto/paginacion.py
+"""
+Paginación por cursor (keyset) para los catálogos.
+
+En vez de OFFSET/COUNT, cada página filtra "después del último producto visto"
+según el mismo orden del queryset, así que el costo por página es constante
+aunque el catálogo tenga decenas de miles de productos.
+"""
+import base64
+import binascii
+import json
+from typing import List, Optional, Sequence
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+POR_PAGINA = 24
+PARAM_CURSOR = "cursor"
+
+
+def _codificar(valores: list) -> str:
+    raw = json.dumps(valores, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decodificar(cursor: Optional[str], n: int) -> Optional[list]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valores = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != n:
+        return None
+    return valores
+
+
+def _convertir(queryset, orden: Sequence[str], valores: list) -> Optional[list]:
+    """
+    Pasa cada valor del cursor por el campo (o anotación) de su posición.
+    Un cursor manipulado ("abc" para un id, listas, null) da None: primera página.
+    """
+    convertidos = []
+    for campo, valor in zip(orden, valores):
+        if not isinstance(valor, (str, int, float)):
+            return None
+        nombre = campo.lstrip("-")
+        anotacion = queryset.query.annotations.get(nombre)
+        try:
+            field = anotacion.output_field if anotacion is not None else queryset.model._meta.get_field(nombre)
+            convertidos.append(field.to_python(valor))
+        except (FieldDoesNotExist, ValidationError, ValueError, TypeError):
+            return None
+    return convertidos
+
+
+def _despues_de(orden: Sequence[str], valores: list) -> Q:
+    """(a > va) OR (a = va AND b > vb) OR ... respetando asc/desc de cada campo."""
+    condicion = Q()
+    iguales = Q()
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip("-")
+        op = "lt" if campo.startswith("-") else "gt"
+        condicion |= iguales & Q(**{f"{nombre}__{op}": valor})
+        iguales &= Q(**{nombre: valor})
+    return condicion
+
+
+class PaginaKeyset:
+    def __init__(self, items: List, cursor_siguiente: Optional[str], es_primera: bool):
+        self.items = items
+        self.cursor_siguiente = cursor_siguiente
+        self.es_primera = es_primera
+
+    @property
+    def tiene_siguiente(self) -> bool:
+        return self.cursor_siguiente is not None
+
+
+def paginar_keyset(queryset, orden: Sequence[str], cursor: Optional[str] = None,
+                   por_pagina: int = POR_PAGINA) -> PaginaKeyset:
+    """
+    `orden` debe terminar en un campo único (p. ej. "-id") para que el cursor sea estable.
+    Trae por_pagina + 1 filas para saber si hay siguiente página sin hacer COUNT.
+    """
+    orden = list(orden)
+    valores = _decodificar(cursor, len(orden))
+    if valores is not None:
+        valores = _convertir(queryset, orden, valores)
+    qs = queryset.order_by(*orden)
+    if valores is not None:
+        qs = qs.filter(_despues_de(orden, valores))
+
+    items = list(qs[:por_pagina + 1])
+    siguiente = None
+    if len(items) > por_pagina:
+        items = items[:por_pagina]
+        ultimo = items[-1]
+        siguiente = _codificar([getattr(ultimo, c.lstrip("-")) for c in orden])
+    return PaginaKeyset(items, siguiente, es_primera=valores is None)
+
+
+class KeysetPaginacionMixin:
+    """Para vistas de catálogo: pagina por cursor y arma las URLs de navegación."""
+    por_pagina = POR_PAGINA
+
+    def paginar(self, queryset, orden: Sequence[str]) -> PaginaKeyset:
+        return paginar_keyset(queryset, orden, self.request.GET.get(PARAM_CURSOR), self.por_pagina)
+
+    def contexto_paginacion(self, pagina: PaginaKeyset) -> dict:
+        params = self.request.GET.copy()
+        params.pop(PARAM_CURSOR, None)
+        primera_url = f"?{params.urlencode()}" if params else "?"
+        siguiente_url = None
+        if pagina.tiene_siguiente:
+            params[PARAM_CURSOR] = pagina.cursor_siguiente
+            siguiente_url = f"?{params.urlencode()}"
+        return {
+            "pagina": pagina,
+            "pagina_siguiente_url": siguiente_url,
+            "pagina_primera_url": None if pagina.es_primera else primera_url,
+        }
@@ -0,0 +1,78 @@
+# producto/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import busqueda, cache_catalogo, imagenes
+from .models import Categoria, Favorito, Producto
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, raw=False, **kwargs):
+    if not raw:
+        busqueda.indexar(instance)
+
+
+@receiver(post_save, sender=Producto)
+def generar_miniaturas(sender, instance, raw=False, **kwargs):
+    if not raw and imagenes.desactualizada(instance):
+        imagenes.generar(instance)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    busqueda.desindexar(instance.pk)
+
+
+@receiver(m2m_changed, sender=Producto.categorias.through)
+def reindexar_por_categorias(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        busqueda.indexar(instance)
+    else:
+        # instance es una Categoria; pk_set son productos (None en post_clear)
+        productos = Producto.objects.filter(pk__in=pk_set) if pk_set else instance.productos.all()
+        for producto in productos.prefetch_related("categorias"):
+            busqueda.indexar(producto)
+
+
+@receiver(post_save, sender=Categoria)
+def reindexar_categoria(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    for producto in instance.productos.prefetch_related("categorias"):
+        busqueda.indexar(producto)
+
+
+@receiver(pre_delete, sender=Categoria)
+def recordar_productos_de_categoria(sender, instance, **kwargs):
+    # Al borrar la categoría se borran sus filas de la tabla intermedia sin m2m_changed
+    instance._productos_a_reindexar = list(instance.productos.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Categoria)
+def reindexar_categoria_borrada(sender, instance, **kwargs):
+    pks = getattr(instance, "_productos_a_reindexar", None)
+    if pks:
+        for producto in Producto.objects.filter(pk__in=pks).prefetch_related("categorias"):
+            busqueda.indexar(producto)
+
+
+# Caché del catálogo: cualquier cambio de productos/categorías deja viejas las páginas cacheadas
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=Categoria)
+def invalidar_catalogo(sender, raw=False, **kwargs):
+    if not raw:
+        cache_catalogo.invalidar()
+
+
+@receiver(m2m_changed, sender=Producto.categorias.through)
+def invalidar_catalogo_por_categorias(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        cache_catalogo.invalidar()
+
+
+@receiver([post_save, post_delete], sender=Favorito)
+def invalidar_favoritos(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Favorito.invalidar_cache(instance.usuario_id)
@@ -0,0 +1,24 @@
+from django import template
+
+from producto import imagenes
+
+register = template.Library()
+
+
+@register.inclusion_tag("imagen_producto.html")
+def imagen_producto(producto, sizes="100vw", ancho=640, clase="", estilo="", lazy=True):
+    """
+    <picture> con srcset WebP + JPEG de las miniaturas del producto.
+    Sin miniaturas (aún no generadas o imagen rota) cae al archivo original.
+    Uso: {% imagen_producto p sizes="(max-width: 576px) 50vw, 25vw" clase="img-fluid" %}
+    """
+    return {
+        "producto": producto,
+        "src": imagenes.url(producto, ancho),
+        "srcset_webp": imagenes.srcset(producto, "webp"),
+        "srcset_jpeg": imagenes.srcset(producto, "jpeg"),
+        "sizes": sizes,
+        "clase": clase,
+        "estilo": estilo,
+        "lazy": lazy,
+    }
@@ -1,3 +1,336 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from . import busqueda, cache_catalogo, imagenes
+from .models import Categoria, Favorito, Producto
+from .paginacion import _codificar, paginar_keyset
+
+
+class PaginacionKeysetTests(TestCase):
+    def setUp(self):
+        # Nombres y ventas repetidos para ejercitar el desempate por id
+        for i in range(25):
+            Producto.objects.create(
+                nombre=f"Producto {i % 7}", precio=Decimal("1000"),
+                cantidad_disp=5, unidades_vendidas=i % 3,
+            )
+
+    def _recorrer(self, orden, por_pagina=4):
+        vistos, cursor = [], None
+        while True:
+            pagina = paginar_keyset(Producto.objects.all(), orden, cursor, por_pagina)
+            vistos.extend(p.id for p in pagina.items)
+            if not pagina.tiene_siguiente:
+                return vistos
+            cursor = pagina.cursor_siguiente
+
+    def test_recorre_todo_en_el_mismo_orden(self):
+        for orden in (("-id",), ("nombre", "id"), ("-unidades_vendidas", "-id"), ("unidades_vendidas", "-id")):
+            esperado = list(Producto.objects.order_by(*orden).values_list("id", flat=True))
+            self.assertEqual(self._recorrer(orden), esperado, orden)
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        pagina = paginar_keyset(Producto.objects.all(), ("-id",), "no-es-un-cursor", 5)
+        self.assertTrue(pagina.es_primera)
+        self.assertEqual(len(pagina.items), 5)
+
+    def test_cursor_manipulado_vuelve_a_la_primera_pagina(self):
+        casos = {
+            reverse("producto:inicio"): (["abc", "zz"], ["x", [1]], ["x", None]),
+            reverse("usuario:home"): (["zz"], [[1]], [{"id": 1}]),
+        }
+        for url, cursores in casos.items():
+            for valores in cursores:
+                resp = self.client.get(url, {"cursor": _codificar(valores)})
+                self.assertEqual(resp.status_code, 200, (url, valores))
+                self.assertEqual(len(resp.context["productos"]), 24, (url, valores))
+                self.assertIsNone(resp.context["pagina_primera_url"], (url, valores))
+
+    def test_home_pagina_y_marca_favoritos_de_la_pagina(self):
+        user = User.objects.create_user(username="ana", password="clave-segura-123")
+        ultimo = Producto.objects.order_by("-id").first()
+        Favorito.objects.create(usuario=user, producto=ultimo)
+        self.client.force_login(user)
+
+        resp = self.client.get(reverse("usuario:home"))
+
+        productos = resp.context["productos"]
+        self.assertEqual(len(productos), 24)
+        self.assertTrue(productos[0].es_favorito)
+        self.assertFalse(productos[1].es_favorito)
+        self.assertIsNotNone(resp.context["pagina_siguiente_url"])
+
+        resp = self.client.get(reverse("usuario:home") + resp.context["pagina_siguiente_url"])
+        self.assertEqual(len(resp.context["productos"]), 1)
+        self.assertIsNone(resp.context["pagina_siguiente_url"])
+
+
+class BusquedaTests(TestCase):
+    def setUp(self):
+        self.matera = Producto.objects.create(
+            nombre="Matera Jardín Verde", descripcion="Cerámica pintada a mano", precio=Decimal("40000"), cantidad_disp=3)
+        self.jarron = Producto.objects.create(
+            nombre="Jarrón grande", descripcion="Flores azules de El Carmen", precio=Decimal("90000"), cantidad_disp=2)
+        self.plato = Producto.objects.create(
+            nombre="Plato azul", descripcion="Plato pando", precio=Decimal("25000"), cantidad_disp=4)
+
+    def _ids(self, terminos, operador="and"):
+        return list(busqueda.buscar(Producto.objects.all(), terminos, operador)
+                    .order_by("-relevancia", "id").values_list("id", flat=True))
+
+    def test_sin_acentos_y_por_prefijo(self):
+        self.assertEqual(self._ids(["jarron"]), [self.jarron.id])
+        self.assertEqual(self._ids(["mater"]), [self.matera.id])
+        self.assertEqual(self._ids(["JARDIN"]), [self.matera.id])
+
+    def test_singular_y_plural(self):
+        self.assertEqual(self._ids(["materas"]), [self.matera.id])
+        self.assertEqual(self._ids(["Jarrones grandes"]), [self.jarron.id])
+        self.assertEqual(self._ids(["flor azul"]), [self.jarron.id])  # "Flores azules"
+        self.assertEqual(self._ids(["verdes"]), [self.matera.id])
+        self.assertEqual(self._ids(["platos pandos"]), [self.plato.id])
+
+    def test_ranking_prioriza_el_nombre(self):
+        self.assertEqual(self._ids(["azul"]), [self.plato.id, self.jarron.id])
+
+    def test_se_sincroniza_al_editar_y_borrar(self):
+        self.plato.nombre = "Bandeja cobalto"
+        self.plato.save()
+        self.assertEqual(self._ids(["cobalto"]), [self.plato.id])
+        self.plato.delete()
+        self.assertEqual(self._ids(["cobalto"]), [])
+
+    def test_categorias_indexadas(self):
+        cat = Categoria.objects.create(nombre="Navidad")
+        self.matera.categorias.add(cat)
+        self.assertEqual(self._ids(["navidad"]), [self.matera.id])
+        cat.delete()
+        self.assertEqual(self._ids(["navidad"]), [])
+
+    def test_reconstruir(self):
+        self.assertEqual(busqueda.reconstruir(), 3)
+        self.assertEqual(self._ids(["plato", "jarron"], operador="or"), [self.plato.id, self.jarron.id])
+
+    def test_home_con_q(self):
+        resp = self.client.get(reverse("usuario:home"), {"q": "azul"})
+        self.assertEqual([p.id for p in resp.context["productos"]], [self.plato.id, self.jarron.id])
+
+
+class ImagenesTests(TestCase):
+    def setUp(self):
+        self.media = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def _subida(self, nombre="Matera Roja.pnj.jpeg", tam=(1200, 800), formato="PNG", modo="RGBA"):
+        buf = BytesIO()
+        Image.new(modo, tam, (200, 80, 40, 255) if modo == "RGBA" else (200, 80, 40)).save(buf, formato)
+        return SimpleUploadedFile(nombre, buf.getvalue())
+
+    def test_al_subir_genera_webp_y_jpeg_con_hash(self):
+        p = Producto.objects.create(nombre="Matera", precio=Decimal("1"), imagen=self._subida())
+        p.refresh_from_db()
+
+        v = p.imagen_variantes
+        self.assertEqual(v["origen"], p.imagen.name)
+        self.assertEqual([a for a, _ in v["webp"]], list(imagenes.ANCHOS))
+        self.assertEqual([a for a, _ in v["jpeg"]], list(imagenes.ANCHOS))
+        ancho, ruta = v["jpeg"][1]
+        self.assertRegex(ruta, rf"^productos/matera_roja-{v['hash']}-320w\.jpg$")
+        with Image.open(self.media / ruta) as img:
+            self.assertEqual((img.format, img.size), ("JPEG", (320, 213)))
+
+        self.assertIn("-960w.webp 960w", imagenes.srcset(p, "webp"))
+        self.assertTrue(imagenes.url(p, 300).endswith("-320w.jpg"))
+        self.assertTrue(imagenes.url(p, 5000).endswith("-960w.jpg"))
+
+    def test_imagen_pequena_no_se_agranda(self):
+        p = Producto.objects.create(nombre="Taza", precio=Decimal("1"), imagen=self._subida(tam=(200, 100)))
+        self.assertEqual([a for a, _ in p.imagen_variantes["jpeg"]], [160, 200])
+
+    def test_cambiar_imagen_regenera_y_borra_las_viejas(self):
+        p = Producto.objects.create(nombre="Matera", precio=Decimal("1"), imagen=self._subida())
+        viejas = [r for _, r in p.imagen_variantes["webp"]]
+        p.imagen = self._subida("otra.jpg", formato="JPEG", modo="RGB", tam=(700, 700))
+        p.save()
+
+        self.assertEqual(p.imagen_variantes["origen"], p.imagen.name)
+        self.assertEqual([a for a, _ in p.imagen_variantes["webp"]], [160, 320, 640, 700])
+        self.assertFalse(any((self.media / r).exists() for r in viejas))
+
+    def test_template_tag_usa_original_sin_variantes(self):
+        p = Producto.objects.create(nombre="Matera", precio=Decimal("1"), imagen=self._subida())
+        html = Template("{% load imagenes_producto %}{% imagen_producto p sizes='25vw' %}").render(Context({"p": p}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('sizes="25vw"', html)
+        self.assertIn("-640w.jpg", html)
+
+        Producto.objects.filter(pk=p.pk).update(imagen_variantes={})
+        p.refresh_from_db()
+        html = Template("{% load imagenes_producto %}{% imagen_producto p %}").render(Context({"p": p}))
+        self.assertNotIn("srcset", html)
+        self.assertIn(p.imagen.url, html)
+
+    def test_comando_rellena_las_que_faltan(self):
+        con = Producto.objects.create(nombre="Matera", precio=Decimal("1"), imagen=self._subida())
+        Producto.objects.filter(pk=con.pk).update(imagen_variantes={})
+        rota = Producto.objects.create(nombre="Rota", precio=Decimal("1"))
+        Producto.objects.filter(pk=rota.pk).update(imagen="productos/no-existe.jpg")
+        Producto.objects.create(nombre="Sin imagen", precio=Decimal("1"))
+
+        call_command("generar_miniaturas", procesos=1, stdout=StringIO(), stderr=StringIO())
+
+        con.refresh_from_db()
+        rota.refresh_from_db()
+        self.assertEqual(con.imagen_variantes["origen"], con.imagen.name)
+        self.assertEqual(rota.imagen_variantes, {})
+
+
+class CacheCatalogoTests(TestCase):
+    def setUp(self):
+        caches[cache_catalogo.ALIAS].clear()
+        cache_catalogo.metricas.reiniciar()
+        self.platos = Categoria.objects.create(nombre="Platos")
+        self.plato = Producto.objects.create(nombre="Plato Lirio", precio=Decimal("30000"), cantidad_disp=5)
+        self.taza = Producto.objects.create(nombre="Taza", precio=Decimal("8000"), cantidad_disp=5)
+        self.plato.categorias.add(self.platos)
+
+    def _consultas(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url, params)
+        return resp, len(ctx.captured_queries)
+
+    def test_segunda_visita_sale_de_cache(self):
+        url = reverse("producto:inicio")
+        _, primera = self._consultas(url)
+        resp, segunda = self._consultas(url)
+
+        self.assertEqual(segunda, 0)
+        self.assertGreater(primera, segunda)
+        self.assertContains(resp, "Plato Lirio")
+        self.assertEqual(cache_catalogo.metricas.resumen()["vistas"]["productos"], {
+            "hits": 1, "misses": 1, "tasa_aciertos": 0.5,
+        })
+
+    def test_parametros_distintos_no_comparten_pagina(self):
+        url = reverse("usuario:home")
+        self.assertContains(self.client.get(url, {"cat": "platos"}), "Plato Lirio")
+        self.assertNotContains(self.client.get(url, {"cat": "platos"}), "Taza")
+        self.assertContains(self.client.get(url), "Taza")
+
+    def test_cambios_de_producto_y_categorias_invalidan(self):
+        url = reverse("usuario:home")
+        self.client.get(url, {"cat": "platos"})
+
+        self.taza.categorias.add(self.platos)
+        self.assertContains(self.client.get(url, {"cat": "platos"}), "Taza")
+
+        self.plato.precio = Decimal("31000")
+        self.plato.save()
+        resp = self.client.get(url)
+        self.assertContains(resp, "31\xa0000")
+        self.assertNotContains(resp, "30\xa0000")
+
+    def test_detalle_y_fragmentos_cacheados(self):
+        url = reverse("producto:detalle", args=[self.plato.pk])
+        _, primera = self._consultas(url)
+        resp, segunda = self._consultas(url)
+        self.assertEqual(segunda, 0)
+        self.assertContains(resp, "Platos")
+
+        # El stock no sale de un fragmento viejo: el checkout invalida
+        Producto.objects.filter(pk=self.plato.pk).update(cantidad_disp=1)
+        cache_catalogo.invalidar()
+        self.assertContains(self.client.get(url), "Ya no puedes seleccionar más")
+
+    def test_metricas_solo_staff(self):
+        url = reverse("usuario:cache_metricas")
+        self.client.force_login(User.objects.create_user(username="cliente"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user(username="staff", is_staff=True))
+        self.assertIn("version", self.client.get(url).json())
+
+
+@override_settings(CATALOGO_CACHE_COMPARTIDA=True)  # la locmem de los tests hace de caché compartida
+class FavoritosCacheTests(TestCase):
+    def setUp(self):
+        caches[cache_catalogo.ALIAS].clear()
+        self.usuario = User.objects.create_user(username="ana", password="x")
+        self.plato = Producto.objects.create(nombre="Plato Lirio", precio=Decimal("30000"), cantidad_disp=5)
+        self.taza = Producto.objects.create(nombre="Taza", precio=Decimal("8000"), cantidad_disp=5)
+        Favorito.objects.create(usuario=self.usuario, producto=self.plato)
+
+    def test_marcar_sin_consultas_con_el_conjunto_en_cache(self):
+        Favorito.ids_de(self.usuario)
+        productos = [self.plato, self.taza]
+        with self.assertNumQueries(0):
+            Favorito.marcar(self.usuario, productos)
+        self.assertEqual([p.es_favorito for p in productos], [True, False])
+
+    def test_alternar_actualiza_el_conjunto(self):
+        Favorito.ids_de(self.usuario)
+        self.assertTrue(Favorito.alternar(self.usuario, self.taza))
+        self.assertEqual(Favorito.ids_de(self.usuario), {self.plato.pk, self.taza.pk})
+        self.assertFalse(Favorito.alternar(self.usuario, self.plato))
+        self.assertEqual(Favorito.ids_de(self.usuario), {self.taza.pk})
+        self.assertEqual(set(self.usuario.favoritos.values_list("producto_id", flat=True)), {self.taza.pk})
+
+    def test_toggles_intercalados_no_pierden_cambios(self):
+        # Dos requests leen el mismo conjunto y cada una alterna un producto distinto
+        jarron = Producto.objects.create(nombre="Jarrón", precio=Decimal("9000"), cantidad_disp=5)
+        antes = Favorito.ids_de(self.usuario)
+        Favorito.alternar(self.usuario, self.taza)
+        caches[cache_catalogo.ALIAS].set(Favorito._clave_cache(self.usuario.pk), antes)  # la otra llenó la caché con lo viejo
+        Favorito.alternar(self.usuario, jarron)
+        self.assertEqual(Favorito.ids_de(self.usuario), {self.plato.pk, self.taza.pk, jarron.pk})
+
+    def test_cambios_por_fuera_invalidan(self):
+        Favorito.ids_de(self.usuario)
+        Favorito.objects.create(usuario=self.usuario, producto=self.taza)
+        self.assertIn(self.taza.pk, Favorito.ids_de(self.usuario))
+        self.plato.delete()  # borra el favorito en cascada
+        self.assertEqual(Favorito.ids_de(self.usuario), {self.taza.pk})
+
+    @override_settings(CATALOGO_CACHE_COMPARTIDA=False)
+    def test_con_cache_por_proceso_no_se_guarda_el_conjunto(self):
+        # Otro worker no vería el borrado de la entrada: se lee de la base cada vez
+        self.assertEqual(Favorito.ids_de(self.usuario), {self.plato.pk})
+        self.assertIsNone(caches[cache_catalogo.ALIAS].get(Favorito._clave_cache(self.usuario.pk)))
+        with self.assertNumQueries(1):
+            Favorito.ids_de(self.usuario)
+
+    def test_toggle_json(self):
+        url = reverse("producto:toggle_favorito", args=[self.taza.pk])
+        self.assertEqual(self.client.post(url, HTTP_ACCEPT="application/json").status_code, 401)
+
+        self.client.force_login(self.usuario)
+        resp = self.client.post(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(resp.json(), {"producto": self.taza.pk, "es_favorito": True, "total": 2})
+        resp = self.client.post(url, HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(resp.json()["es_favorito"], False)
+
+        # Sin cabeceras sigue redirigiendo
+        resp = self.client.post(url, {"next": reverse("producto:favoritos")})
+        self.assertRedirects(resp, reverse("producto:favoritos"), fetch_redirect_response=False)
+
+    def test_detalle_marca_favorito_desde_el_conjunto(self):
+        self.client.force_login(self.usuario)
+        resp = self.client.get(reverse("producto:detalle", args=[self.plato.pk]))
+        self.assertTrue(resp.context["es_favorito"])
+        self.assertContains(resp, "data-favorito")
@@ -4,30 +4,35 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views import View
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
+from django.http import JsonResponse
 from django.urls import reverse
+from . import cache_catalogo
 from .models import Producto, Favorito
+from .paginacion import KeysetPaginacionMixin
 
 
-class InicioProductosView(ListView):
-    """Catálogo en /producto/: lista productos visibles con stock."""
+class InicioProductosView(KeysetPaginacionMixin, ListView):
+    """Catálogo en /producto/: lista productos visibles con stock (paginado por cursor)."""
     template_name = "home.html"
     context_object_name = "productos"
+    orden = ("nombre", "id")
+    presupuesto_consultas = 11
 
     def get_queryset(self):
         return (Producto.objects
                 .filter(es_activo=True, cantidad_disp__gt=0)
-                .order_by("nombre"))
+                .order_by(*self.orden))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Agregar información de favoritos para cada producto
-        if self.request.user.is_authenticated:
-            favoritos_ids = set(
-                Favorito.objects.filter(usuario=self.request.user)
-                .values_list('producto_id', flat=True)
-            )
-            for producto in context['productos']:
-                producto.es_favorito = producto.id in favoritos_ids
+        # La página (sin datos del usuario) sale de la caché del catálogo
+        pagina = cache_catalogo.obtener(
+            "productos", self.request, lambda: self.paginar(self.object_list, self.orden)
+        )
+        # Favoritos solo para los productos de la página visible
+        Favorito.marcar(self.request.user, pagina.items)
+        context["productos"] = pagina.items
+        context.update(self.contexto_paginacion(pagina))
         return context
 
 
@@ -35,6 +40,11 @@ class ProductoDetalleView(DetailView):
     model = Producto
     template_name = "detalle.html"
     context_object_name = "producto"
+    presupuesto_consultas = 12
+
+    def get_object(self, queryset=None):
+        buscar = super().get_object
+        return cache_catalogo.obtener("detalle", None, lambda: buscar(queryset), self.kwargs.get(self.pk_url_kwarg))
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
@@ -58,13 +68,8 @@ class ProductoDetalleView(DetailView):
             sin_stock = False
             al_tope = (cantidad >= stock)
 
-        # Verificar si el producto está en favoritos
-        es_favorito = False
-        if self.request.user.is_authenticated:
-            es_favorito = Favorito.objects.filter(
-                usuario=self.request.user, 
-                producto=self.object
-            ).exists()
+        # Verificar si el producto está en favoritos (conjunto cacheado por usuario)
+        es_favorito = self.object.pk in Favorito.ids_de(self.request.user)
 
         ctx.update({
             "cantidad": cantidad,
@@ -78,18 +83,34 @@ class ProductoDetalleView(DetailView):
 
 
 class ToggleFavoritoView(LoginRequiredMixin, View):
-    """Añade o quita un producto de favoritos del usuario."""
+    """
+    Añade o quita un producto de favoritos del usuario.
+    Con `Accept: application/json` (o X-Requested-With) responde JSON en vez de
+    redirigir; lo usa static/favoritos.js.
+    """
+    def es_ajax(self):
+        return (self.request.headers.get("Accept") == "application/json"
+                or self.request.headers.get("X-Requested-With") == "XMLHttpRequest")
+
+    def handle_no_permission(self):
+        if self.es_ajax():
+            return JsonResponse({"error": "Inicia sesión para agregar a favoritos"}, status=401)
+        return super().handle_no_permission()
+
     def post(self, request, producto_id, *args, **kwargs):
         producto = get_object_or_404(Producto, pk=producto_id)
-        favorito, created = Favorito.objects.get_or_create(
-            usuario=request.user, 
-            producto=producto
-        )
-        
-        if created:
+        es_favorito = Favorito.alternar(request.user, producto)
+
+        if self.es_ajax():
+            return JsonResponse({
+                "producto": producto.id,
+                "es_favorito": es_favorito,
+                "total": len(Favorito.ids_de(request.user)),
+            })
+
+        if es_favorito:
             messages.success(request, f"{producto.nombre} añadido a favoritos.")
         else:
-            favorito.delete()
             messages.success(request, f"{producto.nombre} quitado de favoritos.")
 
         # Volver a donde estaba el usuario
@@ -103,20 +124,25 @@ class ToggleFavoritoView(LoginRequiredMixin, View):
             return redirect("producto:inicio")
 
 #Autor: Luis Angel Nerio
-class FavoritosView(LoginRequiredMixin, ListView):
+class FavoritosView(LoginRequiredMixin, KeysetPaginacionMixin, ListView):
     """Vista para mostrar los productos favoritos del usuario."""
     template_name = "favoritos.html"
     context_object_name = "productos"
+    orden = ("nombre", "id")
+    presupuesto_consultas = 10
 
     def get_queryset(self):
         return Producto.objects.filter(
             favoritos__usuario=self.request.user,
             es_activo=True
-        ).order_by("nombre")
+        ).order_by(*self.orden)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        pagina = self.paginar(self.object_list, self.orden)
         # Marcar todos como favoritos ya que están en esta vista
-        for producto in context['productos']:
+        for producto in pagina.items:
             producto.es_favorito = True
+        context["productos"] = pagina.items
+        context.update(self.contexto_paginacion(pagina))
         return context
\ No newline at end of file
@@ -0,0 +1,107 @@
+// static/carrito.js
+// Carrito sin recargar: los formularios data-carrito van al API JSON
+// (pedido/views_api.py) y la página se actualiza con la respuesta.
+// Los botones +/- acumulan cambios y los mandan juntos al endpoint de lote.
+(function () {
+  const lista = document.getElementById("carrito-lineas");
+  if (!lista) return;
+  const urlLote = lista.dataset.apiLote;
+  const pendientes = new Map();  // item_id -> cantidad
+  let temporizador = null;
+
+  function csrf() {
+    const campo = document.querySelector("input[name=csrfmiddlewaretoken]");
+    return campo ? campo.value : "";
+  }
+
+  async function enviar(url, datos) {
+    const r = await fetch(url, {
+      method: "POST",
+      headers: {"Content-Type": "application/json", "Accept": "application/json", "X-CSRFToken": csrf()},
+      body: JSON.stringify(datos || {}),
+      credentials: "same-origin",
+    });
+    if (!r.ok) throw new Error(`HTTP ${r.status}`);
+    return r.json();
+  }
+
+  function linea(id) {
+    return lista.querySelector(`.js-carrito-linea[data-item="${id}"]`);
+  }
+
+  function pintarTotales(carrito) {
+    if (carrito.lineas === 0) {
+      window.location.reload();  // muestra el estado vacío
+      return;
+    }
+    document.querySelectorAll(".js-carrito-total").forEach(n => { n.textContent = carrito.total_texto; });
+    const badge = document.getElementById("carrito-badge");
+    if (badge) {
+      badge.textContent = carrito.cantidad_total;
+      badge.classList.toggle("d-none", !carrito.cantidad_total);
+    }
+  }
+
+  function pintarLinea(id, item, nivel, mensaje) {
+    const fila = linea(id);
+    if (!fila) return;
+    if (!item) {
+      fila.remove();
+      return;
+    }
+    const input = fila.querySelector("input[name=cantidad]");
+    const mas = fila.querySelector("[data-delta='1']");
+    if (input) {
+      input.value = item.cantidad;
+      input.max = item.stock;
+    }
+    if (mas) mas.disabled = item.al_tope;
+    const aviso = fila.querySelector(".js-carrito-aviso");
+    if (aviso) aviso.textContent = nivel === "warning" ? mensaje : "";
+  }
+
+  async function enviarPendientes() {
+    temporizador = null;
+    if (!pendientes.size) return;
+    const items = Array.from(pendientes, ([id, cantidad]) => ({id: Number(id), cantidad}));
+    pendientes.clear();
+    try {
+      const data = await enviar(urlLote, {items});
+      data.items.forEach(r => pintarLinea(r.id, r.item, r.nivel, r.mensaje));
+      pintarTotales(data.carrito);
+    } catch (e) {
+      window.location.reload();
+    }
+  }
+
+  lista.addEventListener("click", function (ev) {
+    const boton = ev.target.closest("[data-delta]");
+    if (!boton) return;
+    const form = boton.closest("form[data-carrito]");
+    const input = form.querySelector("input[name=cantidad]");
+    const max = parseInt(input.max || "0", 10) || Infinity;
+    const nuevo = Math.min(max, Math.max(1, parseInt(input.value || "1", 10) + parseInt(boton.dataset.delta, 10)));
+    input.value = nuevo;
+    pendientes.set(form.closest(".js-carrito-linea").dataset.item, nuevo);
+    clearTimeout(temporizador);
+    temporizador = setTimeout(enviarPendientes, 400);
+  });
+
+  lista.addEventListener("submit", async function (ev) {
+    const form = ev.target;
+    if (!form.dataset.carrito) return;
+    ev.preventDefault();
+    const id = form.closest(".js-carrito-linea").dataset.item;
+    pendientes.delete(id);
+    const datos = form.dataset.carrito === "actualizar"
+      ? {cantidad: parseInt(form.querySelector("input[name=cantidad]").value || "1", 10)}
+      : {};
+    try {
+      const data = await enviar(form.dataset.api, datos);
+      pintarLinea(id, data.item, data.nivel, data.mensaje);
+      pintarTotales(data.carrito);
+    } catch (e) {
+      form.submit();
+    }
+  });
+})();
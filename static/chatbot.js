@@ -19,6 +19,58 @@ async function callChatAPI(message) {
   });
   return await r.json();
 }
+// Stream SSE: onProducts en cuanto termina la búsqueda, onToken por cada fragmento del texto
+async function streamChatAPI(message, {onProducts, onToken}) {
+  const r = await fetch("/api/chat/stream/", {
+    method: "POST",
+    headers: {"Content-Type": "application/json"},
+    body: JSON.stringify({message})
+  });
+  if (!r.ok || !r.body) throw new Error(`HTTP ${r.status}`);
+
+  const reader = r.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const {value, done} = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, {stream: true});
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = "message", data = "";
+      raw.split("\n").forEach(line => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      });
+      const payload = data ? JSON.parse(data) : {};
+      if (event === "products") onProducts(payload.products || []);
+      else if (event === "token") onToken(payload.t || "");
+      else if (event === "error") throw new Error(payload.error || "error");
+      else if (event === "done") return;
+    }
+  }
+}
+function renderProducts(container, products) {
+  if (Array.isArray(products) && products.length) {
+    const ul = el("ul", "list-unstyled");
+    products.forEach(p => {
+      const li = el("li");
+      const a = el("a");
+      a.href = `/producto/${p.id}/`; // ajusta a tu URL real de detalle
+      a.textContent = `${p.nombre} — $${Math.round(p.precio).toLocaleString()}`;
+      li.appendChild(a);
+      ul.appendChild(li);
+    });
+    const wrap = el("div", "bv-msg bv-msg-bot");
+    wrap.appendChild(ul);
+    container.appendChild(wrap);
+    container.scrollTop = container.scrollHeight;
+  } else {
+    pushMsg(container, "No encontré coincidencias exactas. ¿Quieres probar otro color o tipo?", "bot");
+  }
+}
 (function initBVChat() {
   const box = document.getElementById("bv-chat-box");
   const toggle = document.getElementById("bv-chat-toggle");
@@ -43,32 +95,37 @@ async function callChatAPI(message) {
     pushMsg(msgs, "Estoy pensando…", "bot");
     const loader = msgs.lastChild;
 
+    // Primero productos (apenas termina la búsqueda), luego el texto token a token
+    let answer = null, shown = false;
     try {
-      const data = await callChatAPI(text);
-      msgs.removeChild(loader);
-      if (!data.ok) { pushMsg(msgs, "No pude conectarme ahora. Intenta de nuevo.", "bot"); return; }
-      pushMsg(msgs, data.text || "Listo.", "bot");
-
-      if (Array.isArray(data.products) && data.products.length) {
-        const ul = el("ul", "list-unstyled");
-        data.products.forEach(p => {
-          const li = el("li");
-          const a = el("a");
-          a.href = `/producto/${p.id}/`; // ajusta a tu URL real de detalle
-          a.textContent = `${p.nombre} — $${Math.round(p.precio).toLocaleString()}`;
-          li.appendChild(a);
-          ul.appendChild(li);
-        });
-        const wrap = el("div", "bv-msg bv-msg-bot");
-        wrap.appendChild(ul);
-        msgs.appendChild(wrap);
-        msgs.scrollTop = msgs.scrollHeight;
-      } else {
-        pushMsg(msgs, "No encontré coincidencias exactas. ¿Quieres probar otro color o tipo?", "bot");
-      }
+      await streamChatAPI(text, {
+        onProducts(products) {
+          if (loader.parentNode) msgs.removeChild(loader);
+          renderProducts(msgs, products);
+          shown = true;
+        },
+        onToken(t) {
+          if (!answer) { pushMsg(msgs, "", "bot"); answer = msgs.lastChild; }
+          answer.textContent += t;
+          msgs.scrollTop = msgs.scrollHeight;
+        }
+      });
+      if (loader.parentNode) msgs.removeChild(loader);
     } catch (err) {
-      msgs.removeChild(loader);
-      pushMsg(msgs, "Ocurrió un error. ¿Intentamos otra vez?", "bot");
+      if (loader.parentNode) msgs.removeChild(loader);
+      if (answer || shown) { // ya mostramos parte de la respuesta
+        if (!answer) pushMsg(msgs, "No pude redactar la respuesta ahora, pero estos son los productos que encontré.", "bot");
+        return;
+      }
+      // Fallback: API JSON clásica
+      try {
+        const data = await callChatAPI(text);
+        if (!data.ok) { pushMsg(msgs, "No pude conectarme ahora. Intenta de nuevo.", "bot"); return; }
+        pushMsg(msgs, data.text || "Listo.", "bot");
+        renderProducts(msgs, data.products);
+      } catch (err2) {
+        pushMsg(msgs, "Ocurrió un error. ¿Intentamos otra vez?", "bot");
+      }
     }
   });
 
@@ -0,0 +1,42 @@
+// static/favoritos.js
+// Envía los formularios de favoritos (form[data-favorito]) por fetch y actualiza
+// el corazón sin recargar. Si algo falla, se envía el formulario normal.
+document.addEventListener("submit", async function (ev) {
+  const form = ev.target;
+  if (!(form instanceof HTMLFormElement) || !form.hasAttribute("data-favorito")) return;
+  ev.preventDefault();
+
+  let data;
+  try {
+    const r = await fetch(form.action, {
+      method: "POST",
+      headers: {"Accept": "application/json", "X-Requested-With": "XMLHttpRequest"},
+      body: new FormData(form),
+      credentials: "same-origin",
+    });
+    if (!r.ok) throw new Error(`HTTP ${r.status}`);
+    data = await r.json();
+  } catch (e) {
+    form.submit();
+    return;
+  }
+
+  // Página de favoritos: la fila desaparece
+  if (form.dataset.favorito === "quitar") {
+    const fila = form.closest(".favoritos-row");
+    if (fila) fila.remove();
+    if (data.total === 0) window.location.reload();  // muestra el estado vacío
+    return;
+  }
+
+  const boton = form.querySelector(".btn-favorito");
+  const icono = form.querySelector("i.bi");
+  if (boton) {
+    boton.classList.toggle("favorito-activo", data.es_favorito);
+    boton.title = data.es_favorito ? form.dataset.tituloQuitar : form.dataset.tituloAgregar;
+  }
+  if (icono) {
+    icono.classList.toggle("bi-heart-fill", data.es_favorito);
+    icono.classList.toggle("bi-heart", !data.es_favorito);
+  }
+});
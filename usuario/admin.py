@@ -1,3 +1,23 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ReporteCheckpoint, ReporteJob, VentaAgregada
+
+
+@admin.register(ReporteCheckpoint)
+class ReporteCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'ultimo_pedido_id', 'actualizado']
+    readonly_fields = ['actualizado']
+
+
+@admin.register(ReporteJob)
+class ReporteJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'formato', 'estado', 'solicitado_por', 'creado', 'terminado']
+    list_filter = ['estado', 'formato']
+    readonly_fields = ['firma', 'version_datos', 'creado', 'iniciado', 'terminado']
+
+
+@admin.register(VentaAgregada)
+class VentaAgregadaAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'dimension', 'clave', 'ingresos', 'unidades', 'pedidos']
+    list_filter = ['dimension']
+    date_hierarchy = 'fecha'
@@ -1,22 +1,17 @@
 # usuario/chat_service.py
 from typing import List, Optional, Dict, Tuple
-from django.db.models import Q
 from django.conf import settings
+from django.core.cache import caches
+from asgiref.sync import sync_to_async
 from producto.models import Producto, Categoria
-import unicodedata
+from producto import busqueda, cache_catalogo, imagenes
 import re
 
 # =========================
 # Normalización básica
 # =========================
-def _norm(s: Optional[str]) -> Optional[str]:
-    """minúsculas + sin acentos + trim."""
-    if not s:
-        return None
-    s = s.strip().lower()
-    s = unicodedata.normalize("NFD", s)
-    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
-    return s
+# La misma normalización con la que se llena el índice de búsqueda de productos
+_norm = busqueda.normalizar
 
 def _tokenize(text: str) -> List[str]:
     """Tokeniza por palabras (solo letras/números), normalizado."""
@@ -78,66 +73,111 @@ for canon, data in CANON_SYNONYMS.items():
 # Ordenamos frases por longitud descendente para evitar solapamientos ("bandeja" vs "bandeja ceramica")
 PHRASES.sort(key=lambda x: len(x[0]), reverse=True)
 
+# =========================
+# Matcher compilado (una sola pasada por el texto)
+# =========================
+# Frases: búsqueda por subcadena; en una misma posición gana la más larga (orden de la alternancia).
+_PHRASE_CANON: Dict[str, str] = dict(PHRASES)
+_PHRASE_RE = re.compile("|".join(re.escape(p) for p, _ in PHRASES)) if PHRASES else None
+# Palabras: token completo, con los mismos límites que _tokenize ([a-z0-9]+).
+_WORD_RE = re.compile(
+    r"(?<![a-z0-9])(?:"
+    + "|".join(re.escape(w) for w in sorted(INVERTED, key=len, reverse=True))
+    + r")(?![a-z0-9])"
+)
+
+
+def _canons_in_text(text: str) -> List[Tuple[int, str]]:
+    """Todas las menciones (posición, canónica) de frases y palabras sinónimas, en orden de aparición."""
+    nt = _norm(text) or ""
+    found, spans = [], []
+    if _PHRASE_RE is not None:
+        for m in _PHRASE_RE.finditer(nt):
+            found.append((m.start(), _PHRASE_CANON[m.group()]))
+            spans.append(m.span())
+    # Las palabras dentro de una frase ya reconocida no cuentan aparte ("florero para plantar")
+    found += [
+        (m.start(), INVERTED[m.group()]) for m in _WORD_RE.finditer(nt)
+        if not any(a <= m.start() < b for a, b in spans)
+    ]
+    found.sort(key=lambda x: x[0])
+    return found
+
+
 def _first_canon_in_text(text: str) -> Optional[str]:
     """
     Devuelve la canónica según la primera aparición en el texto.
     Primero buscamos frases (multi-palabra), luego palabras tokenizadas.
     """
     nt = _norm(text) or ""
+    if _PHRASE_RE is not None:
+        m = _PHRASE_RE.search(nt)
+        if m:
+            return _PHRASE_CANON[m.group()]
+    m = _WORD_RE.search(nt)
+    return INVERTED[m.group()] if m else None
 
-    # 1) Buscar frases en orden de aparición
-    earliest = (len(nt) + 1, None)  # (posicion, canon)
-    for phrase, canon in PHRASES:
-        pos = nt.find(phrase)
-        if pos != -1 and pos < earliest[0]:
-            earliest = (pos, canon)
-
-    # 2) Si no hubo frases, miramos por tokens
-    if earliest[1] is None:
-        tokens = _tokenize(text)
-        for i, tok in enumerate(tokens):
-            canon = INVERTED.get(tok)
-            if canon:
-                return canon
-        return None
+# =========================
+# Canónica -> Categoria (en la caché del catálogo: cambia de versión con cada
+# cambio de Categoria, también en los demás procesos)
+# =========================
+CANON_CATEGORIAS_CACHE_KEY = "chat:canon_categoria_ids"
 
-    return earliest[1]
 
-def _get_categoria(canon: str) -> Optional[Categoria]:
-    """Busca la categoría por slug o nombre aproximado de la canónica (singular/plural y sinónimos)."""
-    if not canon:
-        return None
+def _clave_canon_categorias() -> str:
+    return f"{CANON_CATEGORIAS_CACHE_KEY}:{cache_catalogo.version()}"
 
-    q = Q(slug__icontains=canon) | Q(nombre__icontains=canon)
 
-    # Sumamos sinónimos de esa canónica
-    for s in CANON_SYNONYMS.get(canon, {}).get("palabras", []):
-        ns = _norm(s)
-        if ns:
-            q |= Q(slug__icontains=ns) | Q(nombre__icontains=ns)
+def _canon_categoria_ids() -> Dict[str, Optional[int]]:
+    """
+    Resuelve todas las canónicas contra las categorías en una sola consulta y lo guarda en caché.
+    Equivale al antiguo OR de icontains por slug/nombre (primera por nombre).
+    """
+    c = caches[cache_catalogo.ALIAS]
+    clave = _clave_canon_categorias()
+    ids = c.get(clave)
+    if ids is not None:
+        return ids
+    categorias = [
+        (c.id, (c.slug or "").lower(), _norm(c.nombre) or "")
+        for c in Categoria.objects.order_by("nombre").only("id", "slug", "nombre")
+    ]
+    ids = {}
+    for canon, data in CANON_SYNONYMS.items():
+        terms = {canon} | {ns for ns in (_norm(s) for s in data["palabras"]) if ns}
+        ids[canon] = next(
+            (cid for cid, slug, nombre in categorias if any(t in slug or t in nombre for t in terms)),
+            None,
+        )
+    c.set(clave, ids, cache_catalogo.ttl())
+    return ids
+
 
-    return Categoria.objects.filter(q).first()
+def _get_categoria_id(canon: str) -> Optional[int]:
+    """Id de la categoría de la canónica (singular/plural y sinónimos), sin consultar la BD si está en caché."""
+    if not canon:
+        return None
+    return _canon_categoria_ids().get(canon)
 
 def _fallback_nombre_contains(qs, canon: str):
     """
     Si no se encontró la categoría M2M, filtramos por nombre/descripcion del producto
-    usando los sinónimos de la canónica como fallback estricto.
+    usando los sinónimos de la canónica como fallback estricto (índice de búsqueda, OR).
     """
     syns = CANON_SYNONYMS.get(canon, {}).get("palabras", [])
-    q = Q()
-    for s in syns:
-        ns = _norm(s)
-        if not ns:
-            continue
-        q |= Q(nombre__icontains=ns) | Q(descripcion__icontains=ns)
-    return qs.filter(q)
+    return busqueda.buscar(qs, syns, operador="or")
+
+# Las tarjetas del chat miden ~300px: con la miniatura de 640 sobra aun en pantallas 2x
+ANCHO_IMAGEN_CHAT = 640
 
 def _img_url(p):
     """
-    Devuelve la URL de imagen del producto si existe.
+    Devuelve la URL de imagen del producto si existe (la miniatura si ya se generó).
     Intenta campos comunes: imagen, foto, image, portada...
     """
-    for attr in ["imagen", "foto", "image", "imagen_principal", "foto_principal", "portada"]:
+    if getattr(p, "imagen", None):
+        return imagenes.url(p, ANCHO_IMAGEN_CHAT)
+    for attr in ["foto", "image", "imagen_principal", "foto_principal", "portada"]:
         f = getattr(p, attr, None)
         if f:
             try:
@@ -146,6 +186,54 @@ def _img_url(p):
                 pass
     return None
 
+def _canon_de_criterios(criteria: dict, user_text: str) -> Optional[str]:
+    """Canónica a partir del tipo del LLM o del texto del usuario."""
+    tipo_llm = _norm(criteria.get("tipo"))
+    return _first_canon_in_text(tipo_llm or "") or _first_canon_in_text(user_text)
+
+def _productos_qs(criteria: dict, canon: str, cat_id: Optional[int], limit: int):
+    color    = _norm(criteria.get("color"))
+    kws      = [_norm(k) for k in (criteria.get("palabras_clave") or []) if _norm(k)]
+
+    # 2) Query base
+    qs = Producto.objects.filter(es_activo=True, cantidad_disp__gt=0).prefetch_related("categorias").distinct()
+
+    # 3) Intento por categoría real (M2M)
+    if cat_id:
+        qs = qs.filter(categorias__id=cat_id)
+    else:
+        # 4) Fallback estricto por texto de producto usando sinónimos de la canónica
+        qs = _fallback_nombre_contains(qs, canon)
+
+    # 4b) Rango de precio si viene como {"min", "max"} numérico
+    rango = criteria.get("rango_precio")
+    if isinstance(rango, dict):
+        if isinstance(rango.get("min"), (int, float)):
+            qs = qs.filter(precio__gte=rango["min"])
+        if isinstance(rango.get("max"), (int, float)):
+            qs = qs.filter(precio__lte=rango["max"])
+
+    # 5) Filtro suave por color/keywords (si existen), con ranking del índice
+    terminos = ([color] if color else []) + kws
+    if terminos:
+        qs = busqueda.buscar(qs, terminos, operador="or")
+        orden = ("-relevancia", "precio", "nombre")
+    else:
+        orden = ("precio", "nombre")
+
+    # 6) Orden y límite
+    return qs.order_by(*orden)[:limit]
+
+def _serializar(p) -> dict:
+    return {
+        "id": p.id,
+        "nombre": p.nombre,
+        "precio": float(p.precio),
+        "nota": (p.descripcion or "")[:180],
+        "imagen": _img_url(p),
+        "imagen_srcset": imagenes.srcset(p, "webp") if getattr(p, "imagen", None) else "",
+    }
+
 def search_products(criteria: dict, user_text: str, limit: int = 8) -> List[dict]:
     """
     Reglas:
@@ -154,47 +242,149 @@ def search_products(criteria: dict, user_text: str, limit: int = 8) -> List[dict
       3) Si no localiza categoría M2M, hace fallback por nombre/descr usando los sinónimos.
       4) Filtro suave adicional por color/keywords si vienen del LLM.
     """
-    tipo_llm = _norm(criteria.get("tipo"))
-    color    = _norm(criteria.get("color"))
-    kws      = [_norm(k) for k in (criteria.get("palabras_clave") or []) if _norm(k)]
-
-    # 1) Canónica a partir del tipo del LLM o del texto del usuario
-    canon = _first_canon_in_text(tipo_llm or "") or _first_canon_in_text(user_text)
+    # 1) Canónica
+    canon = _canon_de_criterios(criteria, user_text)
     if not canon:
         # Sin categoría clara: no devolvemos nada (comportamiento estricto que pediste)
         return []
 
-    # 2) Query base
-    qs = Producto.objects.filter(es_activo=True, cantidad_disp__gt=0).prefetch_related("categorias").distinct()
+    # 7) Serialización
+    return [_serializar(p) for p in _productos_qs(criteria, canon, _get_categoria_id(canon), limit)]
 
-    # 3) Intento por categoría real (M2M)
-    cat = _get_categoria(canon)
-    if cat:
-        qs = qs.filter(categorias=cat)
+async def asearch_products(criteria: dict, user_text: str, limit: int = 8) -> List[dict]:
+    """Versión async de search_products (ORM async; mismas reglas)."""
+    canon = _canon_de_criterios(criteria, user_text)
+    if not canon:
+        return []
+    cat_id = await sync_to_async(_get_categoria_id)(canon)
+    return [_serializar(p) async for p in _productos_qs(criteria, canon, cat_id, limit)]
+
+def criterios_cambian_busqueda(criteria: dict, user_text: str) -> bool:
+    """True si los criterios del LLM cambian el resultado respecto a buscar solo con el texto."""
+    return bool(
+        criteria.get("color")
+        or isinstance(criteria.get("rango_precio"), dict)
+        or criteria.get("palabras_clave")
+        or _canon_de_criterios(criteria, user_text) != _canon_de_criterios({}, user_text)
+    )
+
+# =========================
+# Extracción local de criterios (sin LLM)
+# =========================
+COLORES: Dict[str, str] = {
+    # forma normalizada -> color canónico
+    "azul": "azul", "azules": "azul", "cobalto": "azul", "celeste": "azul",
+    "rojo": "rojo", "roja": "rojo", "rojos": "rojo", "rojas": "rojo",
+    "verde": "verde", "verdes": "verde",
+    "amarillo": "amarillo", "amarilla": "amarillo", "amarillos": "amarillo", "amarillas": "amarillo",
+    "blanco": "blanco", "blanca": "blanco", "blancos": "blanco", "blancas": "blanco",
+    "negro": "negro", "negra": "negro", "negros": "negro", "negras": "negro",
+    "rosado": "rosado", "rosada": "rosado", "rosa": "rosado", "rosados": "rosado", "rosadas": "rosado",
+    "morado": "morado", "morada": "morado", "lila": "morado",
+    "naranja": "naranja", "naranjas": "naranja",
+    "gris": "gris", "grises": "gris",
+    "cafe": "cafe", "marron": "cafe",
+    "dorado": "dorado", "dorada": "dorado",
+    "turquesa": "turquesa",
+}
+
+# Palabras que no aportan criterio (no bajan la confianza)
+_RELLENO = set("""
+a al algo alguna alguno algunas algunos busco buscando como con de del dame el en es esta este
+hay la las lo los me mi muestrame necesito para por que quiero quisiera tienen tienes un una unas
+unos y o ver color colores precio barato barata baratos baratas economico economica
+menos mas hasta entre maximo minimo desde bajo sobre no tan muy
+""".split())
+
+# Montos y unidades: solo cuentan como explicados dentro de un rango de precio reconocido
+_UNIDADES_PRECIO = {"mil", "k", "millon", "millones", "pesos"}
+
+_NUM = r"(\d+(?:[.,]\d{3})*(?:[.,]\d+)?)\s*(mil|k|millon(?:es)?)?\b"
+_PRECIO_MAX = re.compile(r"\b(?:menos de|hasta|maximo|no mas de|por debajo de|bajo)\s*\$?\s*" + _NUM)
+# "no mas de" es un máximo y "no sobre" no es un mínimo
+_PRECIO_MIN = re.compile(r"\b(?:(?<!no )mas de|desde|minimo|por encima de|(?<!no )sobre)\s*\$?\s*" + _NUM)
+_PRECIO_ENTRE = re.compile(r"\bentre\s*\$?\s*" + _NUM + r"\s*y\s*\$?\s*" + _NUM)
+
+
+def _monto(numero: str, unidad: Optional[str]) -> int:
+    # "50.000" / "50,000" son miles; "1,5 mil" es decimal
+    if re.fullmatch(r"\d{1,3}(?:[.,]\d{3})+", numero):
+        valor = float(re.sub(r"[.,]", "", numero))
     else:
-        # 4) Fallback estricto por texto de producto usando sinónimos de la canónica
-        qs = _fallback_nombre_contains(qs, canon)
+        valor = float(numero.replace(",", "."))
+    if unidad == "mil" or unidad == "k":
+        valor *= 1_000
+    elif unidad and unidad.startswith("millon"):
+        valor *= 1_000_000
+    return int(valor)
 
-    # 5) Filtro suave por color/keywords (si existen)
-    text_q = Q()
-    if color:
-        text_q |= Q(nombre__icontains=color) | Q(descripcion__icontains=color)
-    for kw in kws:
-        text_q |= Q(nombre__icontains=kw) | Q(descripcion__icontains=kw)
-    if text_q:
-        qs = qs.filter(text_q)
 
-    # 6) Orden y límite
-    qs = qs.order_by("precio", "nombre")[:limit]
+def _rango_precio(nt: str) -> Tuple[Optional[dict], List[Tuple[int, int]]]:
+    """Devuelve ({"min", "max"} o None, spans del texto que explicó)."""
+    m = _PRECIO_ENTRE.search(nt)
+    if m:
+        # La unidad que solo trae un número vale para los dos: "entre 20 y 30 mil", "entre 20 mil y 30"
+        unidad = m.group(2) or m.group(4)
+        a, b = _monto(m.group(1), m.group(2) or unidad), _monto(m.group(3), m.group(4) or unidad)
+        if not unidad and a < 1_000 <= b:
+            a *= 1_000  # "entre 20 y 80.000": el primero también va en miles
+        return {"min": min(a, b), "max": max(a, b)}, [m.span()]
+    rango, spans = {}, []
+    m = _PRECIO_MAX.search(nt)
+    if m:
+        rango["max"] = _monto(m.group(1), m.group(2))
+        spans.append(m.span())
+    for m in _PRECIO_MIN.finditer(nt):
+        # Un texto que ya se leyó como máximo no se reusa como mínimo
+        if not any(a < m.end() and m.start() < b for a, b in spans):
+            rango["min"] = _monto(m.group(1), m.group(2))
+            spans.append(m.span())
+            break
+    if not rango:
+        return None, []
+    return {"min": rango.get("min"), "max": rango.get("max")}, spans
 
-    # 7) Serialización
-    out = []
-    for p in qs:
-        out.append({
-            "id": p.id,
-            "nombre": p.nombre,
-            "precio": float(p.precio),
-            "nota": (p.descripcion or "")[:180],
-            "imagen": _img_url(p),
-        })
-    return out
+
+def extract_criteria_local(user_text: str) -> Tuple[dict, float]:
+    """
+    Extrae tipo, color, rango de precio y palabras clave sin llamar al LLM.
+    Devuelve (criterios con la misma forma que groq_client.extract_criteria, confianza 0..1).
+    La confianza es alta cuando hay una sola categoría y casi todas las palabras
+    del mensaje quedan explicadas (sinónimos, colores, precio o relleno); un
+    número o unidad fuera de un rango de precio reconocido la deja baja.
+    """
+    nt = _norm(user_text) or ""
+    criteria = {"uso": None, "persona": None, "tipo": None, "color": None,
+                "estilo": None, "rango_precio": None, "palabras_clave": []}
+
+    menciones = _canons_in_text(nt)
+    rango, spans_precio = _rango_precio(nt)
+    criteria["rango_precio"] = rango
+
+    # Tokens con su posición para saber cuáles quedaron explicados
+    explicados = 0
+    precio_suelto = False  # un monto que ningún patrón de precio entendió ("de 50 mil", "por 20k")
+    spans_frases = [m.span() for m in _PHRASE_RE.finditer(nt)] if _PHRASE_RE is not None else []
+    cubierto = spans_precio + spans_frases
+    tokens = list(re.finditer(r"[a-z0-9]+", nt))
+    for m in tokens:
+        tok = m.group()
+        if any(a <= m.start() < b for a, b in cubierto) or tok in INVERTED or tok in _RELLENO:
+            explicados += 1
+        elif tok in COLORES:
+            explicados += 1
+            criteria["color"] = criteria["color"] or COLORES[tok]
+        elif tok in _UNIDADES_PRECIO or any(ch.isdigit() for ch in tok):
+            precio_suelto = True
+    # Las palabras no explicadas solo bajan la confianza: como filtro vaciarían la búsqueda
+
+    if not menciones:
+        return criteria, 0.0
+    criteria["tipo"] = _first_canon_in_text(nt)
+
+    confianza = 0.5 + 0.5 * (explicados / len(tokens)) if tokens else 0.5
+    if len({c for _, c in menciones}) > 1:
+        confianza -= 0.3  # "taza y plato": mejor que decida el LLM
+    if precio_suelto:
+        confianza = min(confianza, 0.5)  # el precio se perdería: que lo lea el LLM
+    return criteria, round(max(0.0, min(1.0, confianza)), 3)
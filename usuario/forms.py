@@ -1,6 +1,7 @@
 # Autor: Maria Alejandra Ocampo
 from django import forms
 from django.contrib.auth.models import User
+from producto.models import Producto
 
 class CrearCuentaForm(forms.Form):
     """Formulario de registro de CuentaCliente."""
@@ -48,3 +49,54 @@ class CrearCuentaForm(forms.Form):
             password=datos["contrasena1"],
         )
         return user
+
+
+class FiltroReporteForm(forms.Form):
+    """Filtros de los reportes de ventas (todos opcionales)."""
+    desde = forms.DateField(label="Desde", required=False, widget=forms.DateInput(attrs={
+        "type": "date", "class": "form-control form-control-sm"
+    }))
+    hasta = forms.DateField(label="Hasta", required=False, widget=forms.DateInput(attrs={
+        "type": "date", "class": "form-control form-control-sm"
+    }))
+    departamento = forms.CharField(label="Departamento", max_length=100, required=False, widget=forms.TextInput(attrs={
+        "class": "form-control form-control-sm"
+    }))
+    municipio = forms.CharField(label="Municipio", max_length=100, required=False, widget=forms.TextInput(attrs={
+        "class": "form-control form-control-sm"
+    }))
+    producto = forms.ModelChoiceField(
+        label="Producto",
+        queryset=Producto.objects.order_by("nombre"),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+    incremental = forms.BooleanField(
+        label="Solo pedidos nuevos desde el último reporte",
+        required=False,
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
+
+    def clean(self):
+        datos = super().clean()
+        desde, hasta = datos.get("desde"), datos.get("hasta")
+        if desde and hasta and desde > hasta:
+            self.add_error("hasta", "La fecha final debe ser posterior a la inicial.")
+        return datos
+
+
+class FiltroAnaliticaForm(forms.Form):
+    """Rango de fechas del tablero de analítica (por defecto, los últimos 30 días)."""
+    desde = forms.DateField(label="Desde", required=False, widget=forms.DateInput(attrs={
+        "type": "date", "class": "form-control form-control-sm"
+    }))
+    hasta = forms.DateField(label="Hasta", required=False, widget=forms.DateInput(attrs={
+        "type": "date", "class": "form-control form-control-sm"
+    }))
+
+    def clean(self):
+        datos = super().clean()
+        desde, hasta = datos.get("desde"), datos.get("hasta")
+        if desde and hasta and desde > hasta:
+            self.add_error("hasta", "La fecha final debe ser posterior a la inicial.")
+        return datos
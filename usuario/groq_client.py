@@ -1,7 +1,18 @@
 # usuario/groq_client.py
+import hashlib
 import json
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
 import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.core.cache import caches
+
+from Barrovivo.rendimiento import medir
 
 def _headers():
     return {
@@ -10,22 +21,149 @@ def _headers():
         "Accept": "application/json",
     }
 
-def _post_chat(messages):
+# =========================
+# Sesión HTTP compartida (keep-alive + pool de conexiones)
+# =========================
+_session = None
+_session_lock = threading.Lock()
+
+def _get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                size = getattr(settings, "GROQ_POOL_SIZE", 10)
+                s.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+                s.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+                _session = s
+    return _session
+
+# =========================
+# Caché de respuestas (TTL + LRU en memoria, o un backend de Django)
+# =========================
+class _CacheLocal:
+    """LRU con expiración por TTL, segura entre hilos."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._data = OrderedDict()  # key -> (expira, valor)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            expira, valor = hit
+            if expira < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return valor
+
+    def set(self, key, valor, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, valor)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class _CacheDjango:
+    """Delegado a settings.CACHES[alias] (p. ej. Redis/Memcached compartido entre procesos)."""
+
+    def __init__(self, alias: str):
+        self.alias = alias
+
+    def get(self, key):
+        return caches[self.alias].get(key)
+
+    def set(self, key, valor, ttl):
+        caches[self.alias].set(key, valor, ttl)
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+_cache_local = None
+
+def _get_cache():
     """
-    Llama a GROQ (OpenAI-compatible) con un modelo fijo (settings.GROQ_MODEL).
+    GROQ_CACHE_BACKEND: "local" (por defecto), "django:<alias>" o None para desactivar.
     """
-    payload = {
-        "model": settings.GROQ_MODEL,   # <- modelo fijo
-        "messages": messages,
-        "temperature": 0.2,
-    }
+    global _cache_local
+    backend = getattr(settings, "GROQ_CACHE_BACKEND", "local")
+    if not backend:
+        return None
+    if backend.startswith("django"):
+        _, _, alias = backend.partition(":")
+        return _CacheDjango(alias or "default")
+    if _cache_local is None:
+        _cache_local = _CacheLocal(getattr(settings, "GROQ_CACHE_MAX_ITEMS", 512))
+    return _cache_local
 
-    r = requests.post(
-        settings.GROQ_API_URL,
-        headers=_headers(),
-        data=json.dumps(payload),
-        timeout=settings.GROQ_TIMEOUT,
-    )
+def _norm_content(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+def _cache_key(payload: dict) -> str:
+    """Clave estable del payload con el texto de los mensajes normalizado (mayúsculas/espacios)."""
+    normal = dict(payload)
+    normal["messages"] = [
+        {"role": m.get("role"), "content": _norm_content(m.get("content"))}
+        for m in payload.get("messages", [])
+    ]
+    raw = json.dumps(normal, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return "groq:" + hashlib.sha256(raw).hexdigest()
+
+# =========================
+# Single-flight: una sola petición en vuelo por clave
+# =========================
+class _Vuelo:
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+_en_vuelo = {}
+_en_vuelo_lock = threading.Lock()
+
+def _single_flight(key: str, fn):
+    with _en_vuelo_lock:
+        vuelo = _en_vuelo.get(key)
+        lider = vuelo is None
+        if lider:
+            vuelo = _en_vuelo[key] = _Vuelo()
+
+    if not lider:
+        vuelo.listo.wait()
+        if vuelo.error is not None:
+            raise vuelo.error
+        return vuelo.resultado
+
+    try:
+        vuelo.resultado = fn()
+        return vuelo.resultado
+    except Exception as e:
+        vuelo.error = e
+        raise
+    finally:
+        with _en_vuelo_lock:
+            _en_vuelo.pop(key, None)
+        vuelo.listo.set()
+
+def _request_chat(payload: dict) -> str:
+    with medir("groq"):
+        r = _get_session().post(
+            settings.GROQ_API_URL,
+            headers=_headers(),
+            data=json.dumps(payload),
+            timeout=settings.GROQ_TIMEOUT,
+        )
 
     if r.status_code >= 400:
         # Muestra el cuerpo para entender el 400 si algo pasa
@@ -38,11 +176,40 @@ def _post_chat(messages):
     data = r.json()
     return data["choices"][0]["message"]["content"]
 
-def extract_criteria(user_text: str) -> dict:
+def _post_chat(messages):
     """
-    Pide a la IA que devuelva SOLO JSON, sin response_format (algunos modelos lo rechazan).
+    Llama a GROQ (OpenAI-compatible) con un modelo fijo (settings.GROQ_MODEL).
+    Las respuestas se cachean por payload normalizado y las peticiones idénticas
+    simultáneas comparten una sola llamada.
     """
-    messages = [
+    payload = {
+        "model": settings.GROQ_MODEL,   # <- modelo fijo
+        "messages": messages,
+        "temperature": 0.2,
+    }
+
+    cache = _get_cache()
+    if cache is None:
+        return _request_chat(payload)
+
+    key = _cache_key(payload)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+
+    def _llamar():
+        # Otro hilo pudo llenar la caché mientras esperábamos el candado
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+        content = _request_chat(payload)
+        cache.set(key, content, getattr(settings, "GROQ_CACHE_TTL", 600))
+        return content
+
+    return _single_flight(key, _llamar)
+
+def _criteria_messages(user_text: str) -> list:
+    return [
         {"role": "system", "content": (
             "Eres un parser. RESPONDE EXCLUSIVAMENTE un JSON válido con estas claves: "
             "uso, persona, tipo, color, estilo, rango_precio, palabras_clave. "
@@ -50,7 +217,8 @@ def extract_criteria(user_text: str) -> dict:
         )},
         {"role": "user", "content": user_text}
     ]
-    text = _post_chat(messages)
+
+def _parse_criteria(text: str) -> dict:
     # Parseo robusto
     try:
         return json.loads(text)
@@ -61,11 +229,8 @@ def extract_criteria(user_text: str) -> dict:
         return {"uso": None, "persona": None, "tipo": None, "color": None,
                 "estilo": None, "rango_precio": None, "palabras_clave": []}
 
-def write_answer(criteria: dict, products: list) -> str:
-    """
-    Redacta 1–2 párrafos sobre los productos candidatos (sin inventar).
-    """
-    messages = [
+def _answer_messages(criteria: dict, products: list) -> list:
+    return [
         {"role": "system", "content": (
             "Eres un asesor de compras de cerámica. Español, breve y claro. "
             "NO inventes productos ni características no listadas."
@@ -77,4 +242,89 @@ def write_answer(criteria: dict, products: list) -> str:
             json.dumps(products, ensure_ascii=False)
         )}
     ]
-    return _post_chat(messages)
+
+def extract_criteria(user_text: str) -> dict:
+    """
+    Pide a la IA que devuelva SOLO JSON, sin response_format (algunos modelos lo rechazan).
+    """
+    return _parse_criteria(_post_chat(_criteria_messages(user_text)))
+
+def write_answer(criteria: dict, products: list) -> str:
+    """
+    Redacta 1–2 párrafos sobre los productos candidatos (sin inventar).
+    """
+    return _post_chat(_answer_messages(criteria, products))
+
+# =========================
+# Variante async (httpx) para la vista de chat en streaming
+# =========================
+def async_client() -> httpx.AsyncClient:
+    """Cliente async para una request de chat (reutiliza la conexión entre parse y respuesta)."""
+    return httpx.AsyncClient(
+        headers=_headers(),
+        timeout=settings.GROQ_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=getattr(settings, "GROQ_POOL_SIZE", 10)),
+    )
+
+def _payload(messages, stream: bool = False) -> dict:
+    payload = {"model": settings.GROQ_MODEL, "messages": messages, "temperature": 0.2}
+    if stream:
+        payload["stream"] = True
+    return payload
+
+async def _apost_chat(client: httpx.AsyncClient, messages) -> str:
+    """Igual que _post_chat pero sin bloquear el hilo (comparte la caché de respuestas)."""
+    payload = _payload(messages)
+    cache = _get_cache()
+    key = _cache_key(payload)
+    if cache is not None:
+        hit = await sync_to_async(cache.get)(key)
+        if hit is not None:
+            return hit
+
+    with medir("groq"):
+        r = await client.post(settings.GROQ_API_URL, json=payload)
+    if r.status_code >= 400:
+        raise RuntimeError(f"GROQ {r.status_code}: {r.text}")
+    content = r.json()["choices"][0]["message"]["content"]
+    if cache is not None:
+        await sync_to_async(cache.set)(key, content, getattr(settings, "GROQ_CACHE_TTL", 600))
+    return content
+
+async def aextract_criteria(client: httpx.AsyncClient, user_text: str) -> dict:
+    return _parse_criteria(await _apost_chat(client, _criteria_messages(user_text)))
+
+async def astream_answer(client: httpx.AsyncClient, criteria: dict, products: list):
+    """
+    Genera la respuesta por fragmentos (stream SSE de la API OpenAI-compatible).
+    Si la respuesta completa ya está en caché se entrega de una vez.
+    """
+    messages = _answer_messages(criteria, products)
+    cache = _get_cache()
+    key = _cache_key(_payload(messages))
+    if cache is not None:
+        hit = await sync_to_async(cache.get)(key)
+        if hit is not None:
+            yield hit
+            return
+
+    partes = []
+    # Incluye lo que tarda en pasar cada fragmento al cliente (lo mismo que espera el usuario)
+    with medir("groq"):
+        async with client.stream("POST", settings.GROQ_API_URL, json=_payload(messages, stream=True)) as r:
+            if r.status_code >= 400:
+                body = await r.aread()
+                raise RuntimeError(f"GROQ {r.status_code}: {body.decode('utf-8', 'replace')}")
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    partes.append(delta)
+                    yield delta
+
+    if cache is not None and partes:
+        await sync_to_async(cache.set)(key, "".join(partes), getattr(settings, "GROQ_CACHE_TTL", 600))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from usuario.services import reportes_jobs
+
+
+class Command(BaseCommand):
+    help = "Worker de la cola de reportes: genera los PDF/Excel pendientes y los deja en MEDIA_ROOT/reportes/."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Procesa lo pendiente y termina.")
+        parser.add_argument("--intervalo", type=float, default=5.0, help="Segundos entre revisiones de la cola.")
+        parser.add_argument("--timeout", type=int, default=30,
+                            help="Minutos tras los cuales un job 'procesando' se reintenta.")
+
+    def handle(self, *args, **options):
+        while True:
+            liberados = reportes_jobs.liberar_colgados(options["timeout"])
+            if liberados:
+                self.stdout.write(self.style.WARNING(f"{liberados} reporte(s) colgado(s) devuelto(s) a la cola."))
+            hechos = reportes_jobs.procesar_pendientes()
+            if hechos:
+                self.stdout.write(self.style.SUCCESS(f"{hechos} reporte(s) procesado(s)."))
+            if options["once"]:
+                return
+            time.sleep(options["intervalo"])
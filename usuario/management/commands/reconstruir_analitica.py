@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from usuario.services import analitica
+
+
+class Command(BaseCommand):
+    help = "Reconstruye las ventas agregadas del tablero de analítica a partir de PedidoItem."
+
+    def handle(self, *args, **options):
+        filas = analitica.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"Analítica reconstruida ({filas} fila(s) agregadas)."))
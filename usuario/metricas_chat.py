@@ -0,0 +1,43 @@
+# usuario/metricas_chat.py
+"""
+Métricas en memoria del chat: cuántas veces se evitó el parse del LLM
+y la latencia (p50/p95) de cada ruta. Son por proceso.
+"""
+from Barrovivo.metricas import VentanaMetricas
+
+RUTA_LOCAL = "local"  # criterios por reglas, sin LLM
+RUTA_LLM = "llm"      # criterios con groq_client.extract_criteria
+
+_MUESTRAS = 1000  # ventana por ruta
+
+
+class MetricasChat:
+    def __init__(self):
+        self._ventana = VentanaMetricas(_MUESTRAS)
+
+    def registrar(self, ruta: str, segundos: float) -> None:
+        self._ventana.registrar(ruta, {"mensajes": 1}, {"ms": segundos * 1000})
+
+    def resumen(self) -> dict:
+        foto = self._ventana.foto(cuantiles=(50, 95))
+        rutas = {}
+        for ruta in (RUTA_LOCAL, RUTA_LLM):
+            datos = foto.get(ruta, {"contadores": {}, "cuantiles": {}})
+            ms = datos["cuantiles"].get("ms", {})
+            rutas[ruta] = {
+                "mensajes": datos["contadores"].get("mensajes", 0),
+                "p50_ms": round(ms.get(50, 0.0), 1),
+                "p95_ms": round(ms.get(95, 0.0), 1),
+            }
+        total = sum(r["mensajes"] for r in rutas.values())
+        return {
+            "mensajes": total,
+            "tasa_sin_llm": round(rutas[RUTA_LOCAL]["mensajes"] / total, 3) if total else 0.0,
+            "rutas": rutas,
+        }
+
+    def reiniciar(self) -> None:
+        self._ventana.reiniciar()
+
+
+metricas = MetricasChat()
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuario', '0002_reportejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaAgregada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('dia', 'Día'), ('producto', 'Producto'), ('categoria', 'Categoría'), ('departamento', 'Departamento')], max_length=12)),
+                ('clave', models.CharField(blank=True, max_length=100)),
+                ('fecha', models.DateField()),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('unidades', models.PositiveBigIntegerField(default=0)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Venta agregada',
+                'verbose_name_plural': 'Ventas agregadas',
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'fecha', 'clave'), name='venta_agregada_unica')],
+            },
+        ),
+    ]
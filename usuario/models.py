@@ -1,3 +1,101 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class ReporteCheckpoint(models.Model):
+    """Último pedido incluido en un reporte incremental (uno por tipo de reporte)."""
+    nombre = models.CharField(max_length=50, unique=True)
+    ultimo_pedido_id = models.PositiveBigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Checkpoint de reporte"
+        verbose_name_plural = "Checkpoints de reportes"
+
+    def __str__(self):
+        return f"{self.nombre} (hasta pedido {self.ultimo_pedido_id})"
+
+
+def _ruta_reporte(instance, filename):
+    # Nombre no adivinable: los archivos solo se descargan por la vista de staff
+    return f"reportes/{uuid.uuid4().hex}/{filename}"
+
+
+class ReporteJob(models.Model):
+    """Reporte de ventas generado en segundo plano (cola en base de datos)."""
+    PENDIENTE = "pendiente"
+    PROCESANDO = "procesando"
+    LISTO = "listo"
+    ERROR = "error"
+    ESTADOS = [
+        (PENDIENTE, "Pendiente"),
+        (PROCESANDO, "Procesando"),
+        (LISTO, "Listo"),
+        (ERROR, "Error"),
+    ]
+
+    formato = models.CharField(max_length=10)
+    parametros = models.JSONField(default=dict, blank=True)
+    # formato + parámetros normalizados: dos solicitudes iguales comparten job
+    firma = models.CharField(max_length=64, db_index=True)
+    # "max_id:count" de Pedido al generar; si cambia, el archivo ya no sirve
+    version_datos = models.CharField(max_length=50, blank=True)
+    estado = models.CharField(max_length=12, choices=ESTADOS, default=PENDIENTE, db_index=True)
+    archivo = models.FileField(upload_to=_ruta_reporte, blank=True)
+    error = models.TextField(blank=True)
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="reportes_solicitados"
+    )
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-creado"]
+        verbose_name = "Reporte en segundo plano"
+        verbose_name_plural = "Reportes en segundo plano"
+
+    def __str__(self):
+        return f"Reporte {self.formato} #{self.id} ({self.estado})"
+
+    @property
+    def terminado_ok(self) -> bool:
+        return self.estado == self.LISTO and bool(self.archivo)
+
+
+class VentaAgregada(models.Model):
+    """
+    Ventas pre-agregadas por día y dimensión (tablero de analítica).
+    Se actualiza en cada checkout y se reconstruye con `manage.py reconstruir_analitica`.
+    """
+    DIA = "dia"
+    PRODUCTO = "producto"
+    CATEGORIA = "categoria"
+    DEPARTAMENTO = "departamento"
+    DIMENSIONES = [
+        (DIA, "Día"),
+        (PRODUCTO, "Producto"),
+        (CATEGORIA, "Categoría"),
+        (DEPARTAMENTO, "Departamento"),
+    ]
+
+    dimension = models.CharField(max_length=12, choices=DIMENSIONES)
+    # id del producto/categoría, nombre del departamento o "" para el total del día
+    clave = models.CharField(max_length=100, blank=True)
+    fecha = models.DateField()
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    unidades = models.PositiveBigIntegerField(default=0)
+    pedidos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # También sirve de índice para "dimensión + rango de fechas"
+            models.UniqueConstraint(fields=["dimension", "fecha", "clave"], name="venta_agregada_unica"),
+        ]
+        verbose_name = "Venta agregada"
+        verbose_name_plural = "Ventas agregadas"
+
+    def __str__(self):
+        return f"{self.dimension} {self.clave} {self.fecha}: {self.ingresos}"
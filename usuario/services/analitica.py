@@ -0,0 +1,174 @@
+# usuario/services/analitica.py
+"""
+Ventas pre-agregadas (VentaAgregada) para el tablero de analítica.
+
+- registrar_pedido(): lo llama CheckoutView dentro de su transacción; suma el
+  pedido a sus filas (día, productos, categorías, departamento) con un solo UPDATE.
+- reconstruir(): recalcula todo desde PedidoItem (comando reconstruir_analitica).
+- resumen(): lo que muestra el tablero; solo lee la tabla agregada.
+
+Los ingresos salen de cantidad * precio de las líneas, así todas las dimensiones
+cuadran entre sí. Un producto puede estar en varias categorías: en esa vista una
+venta cuenta en cada una de ellas.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from pedido.models import PedidoItem
+from producto.models import Categoria, Producto
+
+from ..models import VentaAgregada
+
+Clave = Tuple[str, str]  # (dimension, clave)
+
+
+def _sumar(deltas: Dict[Clave, list], clave: Clave, ingresos, unidades, pedidos=0) -> None:
+    d = deltas[clave]
+    d[0] += ingresos
+    d[1] += unidades
+    d[2] += pedidos
+
+
+def registrar_pedido(pedido, lineas: Optional[Iterable[Tuple[int, int, Decimal]]] = None) -> None:
+    """
+    Suma un pedido nuevo a las tablas agregadas.
+    `lineas`: (producto_id, cantidad, precio); si no se pasan se leen de la base.
+    """
+    if lineas is None:
+        lineas = pedido.items.values_list("producto_id", "cantidad", "precio")
+    lineas = list(lineas)
+    if not lineas:
+        return
+
+    categorias = defaultdict(set)
+    for producto_id, categoria_id in Producto.categorias.through.objects.filter(
+        producto_id__in={p for p, _, _ in lineas}
+    ).values_list("producto_id", "categoria_id"):
+        categorias[producto_id].add(categoria_id)
+
+    deltas: Dict[Clave, list] = defaultdict(lambda: [Decimal("0"), 0, 0])
+    vistos = set()
+    for producto_id, cantidad, precio in lineas:
+        subtotal = precio * cantidad
+        claves = [(VentaAgregada.DIA, ""), (VentaAgregada.DEPARTAMENTO, pedido.departamento.strip()),
+                  (VentaAgregada.PRODUCTO, str(producto_id))]
+        claves += [(VentaAgregada.CATEGORIA, str(c)) for c in categorias[producto_id]]
+        for clave in claves:
+            # "pedidos" cuenta el pedido una vez por fila, aunque tenga varias líneas que caen en ella
+            _sumar(deltas, clave, subtotal, cantidad, 0 if clave in vistos else 1)
+            vistos.add(clave)
+
+    fecha = timezone.localdate(pedido.fecha)
+    with transaction.atomic():
+        VentaAgregada.objects.bulk_create(
+            [VentaAgregada(dimension=d, clave=c, fecha=fecha) for d, c in deltas],
+            ignore_conflicts=True,
+        )
+
+        def caso(indice, output_field):
+            return Case(
+                *[When(dimension=d, clave=c, then=Value(v[indice])) for (d, c), v in deltas.items()],
+                default=Value(0), output_field=output_field,
+            )
+
+        filtro = Q()
+        for d, c in deltas:
+            filtro |= Q(dimension=d, clave=c)
+        VentaAgregada.objects.filter(filtro, fecha=fecha).update(
+            ingresos=F("ingresos") + caso(0, DecimalField(max_digits=14, decimal_places=2)),
+            unidades=F("unidades") + caso(1, IntegerField()),
+            pedidos=F("pedidos") + caso(2, IntegerField()),
+        )
+
+
+def reconstruir(lote: int = 2000) -> int:
+    """Borra y recalcula las tablas agregadas desde PedidoItem. Devuelve cuántas filas creó."""
+    dia = TruncDate("pedido__fecha", tzinfo=timezone.get_current_timezone())
+    metricas = {
+        "ingresos": Sum(F("cantidad") * F("precio"), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        "unidades": Sum("cantidad"),
+        "pedidos": Count("pedido", distinct=True),
+    }
+    consultas = [
+        (VentaAgregada.DIA, None),
+        (VentaAgregada.DEPARTAMENTO, "pedido__departamento"),
+        (VentaAgregada.PRODUCTO, "producto_id"),
+        (VentaAgregada.CATEGORIA, "producto__categorias"),
+    ]
+
+    n = 0
+    with transaction.atomic():
+        VentaAgregada.objects.all().delete()
+        for dimension, campo in consultas:
+            qs = PedidoItem.objects.annotate(dia=dia)
+            if campo:
+                qs = qs.filter(**{f"{campo}__isnull": False}).values("dia", campo)
+            else:
+                qs = qs.values("dia")
+            filas = []
+            for r in qs.annotate(**metricas).order_by().iterator(chunk_size=lote):
+                clave = str(r[campo]).strip() if campo else ""
+                filas.append(VentaAgregada(
+                    dimension=dimension, clave=clave, fecha=r["dia"],
+                    ingresos=r["ingresos"] or 0, unidades=r["unidades"] or 0, pedidos=r["pedidos"],
+                ))
+                if len(filas) >= lote:
+                    n += len(VentaAgregada.objects.bulk_create(filas))
+                    filas = []
+            n += len(VentaAgregada.objects.bulk_create(filas))
+    return n
+
+
+def _ranking(base, dimension: str, top: int) -> List[dict]:
+    return list(
+        base.filter(dimension=dimension)
+        .values("clave")
+        .annotate(ingresos=Sum("ingresos"), unidades=Sum("unidades"), pedidos=Sum("pedidos"))
+        .order_by("-ingresos")[:top]
+    )
+
+
+def _con_barra(filas: List[dict]) -> List[dict]:
+    """Ancho relativo (0-100) para las barras del tablero."""
+    maximo = max((f["ingresos"] for f in filas), default=0) or 1
+    for f in filas:
+        f["barra"] = int(f["ingresos"] * 100 / maximo)
+    return filas
+
+
+def resumen(desde, hasta, top: int = 10) -> dict:
+    base = VentaAgregada.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+
+    por_dia = list(base.filter(dimension=VentaAgregada.DIA)
+                   .order_by("fecha").values("fecha", "ingresos", "unidades", "pedidos"))
+    productos = _ranking(base, VentaAgregada.PRODUCTO, top)
+    categorias = _ranking(base, VentaAgregada.CATEGORIA, top)
+    departamentos = _ranking(base, VentaAgregada.DEPARTAMENTO, top)
+
+    nombres = Producto.objects.in_bulk([int(f["clave"]) for f in productos])
+    for f in productos:
+        p = nombres.get(int(f["clave"]))
+        f["nombre"] = p.nombre if p else f"Producto #{f['clave']} (eliminado)"
+    nombres = Categoria.objects.in_bulk([int(f["clave"]) for f in categorias])
+    for f in categorias:
+        c = nombres.get(int(f["clave"]))
+        f["nombre"] = c.nombre if c else f"Categoría #{f['clave']} (eliminada)"
+    for f in departamentos:
+        f["nombre"] = f["clave"] or "Sin departamento"
+
+    return {
+        "totales": {
+            "ingresos": sum((f["ingresos"] for f in por_dia), Decimal("0")),
+            "unidades": sum(f["unidades"] for f in por_dia),
+            "pedidos": sum(f["pedidos"] for f in por_dia),
+        },
+        "por_dia": _con_barra(por_dia),
+        "productos": _con_barra(productos),
+        "categorias": _con_barra(categorias),
+        "departamentos": _con_barra(departamentos),
+    }
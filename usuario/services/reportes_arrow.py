@@ -0,0 +1,88 @@
+# usuario/services/reportes_arrow.py
+"""
+Exportación columnar (Parquet y Arrow IPC) para analítica.
+
+pyarrow es opcional: si no está instalado estos formatos no se registran
+(ver reportes_registro.GENERADORES) y pedirlos responde que falta pyarrow.
+"""
+from abc import abstractmethod
+from itertools import islice
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, Iterable
+
+from .reportes_consulta import COLUMNAS, filas_reporte
+from .reportes_interface import ReporteVentasGenerator, SPOOL_MAX_BYTES
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende del entorno
+    pa = pq = None
+
+
+def disponible() -> bool:
+    return pa is not None
+
+
+def esquema():
+    tipos = {
+        "pedido_id": pa.int64(),
+        "fecha": pa.timestamp("us", tz="UTC"),
+        "total": pa.decimal128(10, 2),
+        "item_id": pa.int64(),
+        "cantidad": pa.int64(),
+        "precio": pa.decimal128(10, 2),
+    }
+    return pa.schema([(nombre, tipos.get(nombre, pa.string())) for nombre, _ in COLUMNAS])
+
+
+class _ColumnarReporteVentasGenerator(ReporteVentasGenerator):
+    """Lee las filas por lotes y arma cada lote como un RecordBatch (columna por columna)."""
+    lote = 10000
+
+    @abstractmethod
+    def _abrir(self, destino, schema):
+        """Writer de pyarrow sobre `destino` (context manager con write_batch)."""
+
+    def _lotes(self, pedidos: Iterable[Any], schema):
+        filas = filas_reporte(pedidos, chunk_size=self.lote)
+        while True:
+            bloque = list(islice(filas, self.lote))
+            if not bloque:
+                return
+            columnas = zip(*bloque)
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, schema)],
+                schema=schema,
+            )
+
+    def escribir(self, pedidos: Iterable[Any], destino: IO[bytes]) -> None:
+        schema = esquema()
+        with self._abrir(destino, schema) as writer:
+            for batch in self._lotes(pedidos, schema):
+                writer.write_batch(batch)
+
+    def render(self, pedidos: Iterable[Any]) -> bytes:
+        return self.render_archivo(pedidos).read()
+
+    def render_archivo(self, pedidos: Iterable[Any]) -> IO[bytes]:
+        f = SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        self.escribir(pedidos, f)
+        f.seek(0)
+        return f
+
+
+class ParquetReporteVentasGenerator(_ColumnarReporteVentasGenerator):
+    filename = "reporte_ventas.parquet"
+    content_type = "application/vnd.apache.parquet"
+
+    def _abrir(self, destino, schema):
+        return pq.ParquetWriter(destino, schema, compression="snappy")
+
+
+class ArrowReporteVentasGenerator(_ColumnarReporteVentasGenerator):
+    filename = "reporte_ventas.arrow"
+    content_type = "application/vnd.apache.arrow.file"
+
+    def _abrir(self, destino, schema):
+        return pa.ipc.new_file(destino, schema)
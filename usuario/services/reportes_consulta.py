@@ -0,0 +1,77 @@
+# usuario/services/reportes_consulta.py
+from datetime import datetime, time, timedelta
+
+from django.db.models import QuerySet
+from django.utils import timezone
+from pedido.models import Pedido
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def pedidos_para_reporte(filtros: dict, desde_pedido_id: int = 0):
+    """
+    Pedidos del reporte según los filtros (ya validados por FiltroReporteForm).
+    Las fechas filtran por rango sobre Pedido.fecha (indexado), no por fecha__date.
+    """
+    pedidos = Pedido.objects.all()
+    if filtros.get("desde"):
+        pedidos = pedidos.filter(fecha__gte=_inicio_del_dia(filtros["desde"]))
+    if filtros.get("hasta"):
+        pedidos = pedidos.filter(fecha__lt=_inicio_del_dia(filtros["hasta"] + timedelta(days=1)))
+    if filtros.get("departamento"):
+        pedidos = pedidos.filter(departamento__iexact=filtros["departamento"])
+    if filtros.get("municipio"):
+        pedidos = pedidos.filter(municipio__iexact=filtros["municipio"])
+    if desde_pedido_id:
+        pedidos = pedidos.filter(id__gt=desde_pedido_id)
+
+    producto = filtros.get("producto")
+    if producto:
+        # Solo los pedidos con ese producto, y de ellos solo sus líneas
+        pedidos = pedidos.filter(items__producto=producto).distinct()
+    return pedidos.con_items(producto or None).order_by("-fecha")
+
+
+# Columnas planas del reporte (un renglón por ítem; los pedidos sin ítems salen con ítem vacío)
+COLUMNAS = [
+    ("pedido_id", "id"),
+    ("fecha", "fecha"),
+    ("cliente", "nombre_cliente"),
+    ("correo", "correo"),
+    ("departamento", "departamento"),
+    ("municipio", "municipio"),
+    ("direccion", "direccion"),
+    ("total", "total"),
+    ("item_id", "items__id"),
+    ("producto", "items__producto__nombre"),
+    ("cantidad", "items__cantidad"),
+    ("precio", "items__precio"),
+]
+
+
+def filas_reporte(pedidos, chunk_size: int = 2000):
+    """
+    Tuplas en el orden de COLUMNAS. Con un QuerySet salen directo de la base
+    (values_list, sin instanciar modelos) y se reutiliza el join de `items` del
+    filtro por producto, así salen solo esas líneas. Con una lista de pedidos
+    se arman desde las instancias.
+    """
+    if isinstance(pedidos, QuerySet):
+        return (
+            pedidos.order_by("-fecha", "id", "items__id")
+            .values_list(*(campo for _, campo in COLUMNAS))
+            .iterator(chunk_size=chunk_size)
+        )
+    return _filas_de_instancias(pedidos)
+
+
+def _filas_de_instancias(pedidos):
+    for p in pedidos:
+        cabeza = (p.id, p.fecha, p.nombre_cliente, p.correo, p.departamento, p.municipio, p.direccion, p.total)
+        items = list(p.items.all())
+        if not items:
+            yield cabeza + (None, None, None, None)
+        for it in items:
+            yield cabeza + (it.id, it.producto.nombre, it.cantidad, it.precio)
@@ -0,0 +1,48 @@
+# usuario/services/reportes_csv.py
+import csv
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, Iterable, Iterator
+
+from .reportes_consulta import COLUMNAS, filas_reporte
+from .reportes_interface import ReporteVentasGenerator, SPOOL_MAX_BYTES
+
+
+class _Eco:
+    """csv.writer escribe aquí y devolvemos la línea en vez de guardarla."""
+    def write(self, valor):
+        return valor
+
+
+class CsvReporteVentasGenerator(ReporteVentasGenerator):
+    """
+    CSV plano (un renglón por ítem) para los procesos de analítica.
+    Las filas salen de values_list y se emiten por bloques: nada se arma en memoria.
+    """
+    filename = "reporte_ventas.csv"
+    content_type = "text/csv; charset=utf-8"
+    streaming = True
+    filas_por_bloque = 500
+
+    def stream(self, pedidos: Iterable[Any]) -> Iterator[bytes]:
+        writer = csv.writer(_Eco())
+        yield writer.writerow([nombre for nombre, _ in COLUMNAS]).encode("utf-8")
+        bloque = []
+        for fila in filas_reporte(pedidos):
+            bloque.append(writer.writerow([
+                v.isoformat() if hasattr(v, "isoformat") else ("" if v is None else v) for v in fila
+            ]))
+            if len(bloque) >= self.filas_por_bloque:
+                yield "".join(bloque).encode("utf-8")
+                bloque = []
+        if bloque:
+            yield "".join(bloque).encode("utf-8")
+
+    def render(self, pedidos: Iterable[Any]) -> bytes:
+        return b"".join(self.stream(pedidos))
+
+    def render_archivo(self, pedidos: Iterable[Any]) -> IO[bytes]:
+        f = SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        for parte in self.stream(pedidos):
+            f.write(parte)
+        f.seek(0)
+        return f
@@ -1,24 +1,41 @@
-from typing import Iterable, Any
+from typing import IO, Iterable, Any
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
-from .reportes_interface import ReporteVentasGenerator
+from .reportes_interface import ReporteVentasGenerator, SPOOL_MAX_BYTES
 
 class ExcelReporteVentasGenerator(ReporteVentasGenerator):
+    """
+    Excel en modo write-only: las filas se escriben directo al archivo y
+    los pedidos se leen por lotes, así la memoria no crece con el reporte.
+    """
     filename = "reporte_ventas.xlsx"
+    content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    chunk_size = 2000
 
-    def render(self, pedidos: Iterable[Any]) -> bytes:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Ventas"
-
-        headers = [
-            "ID Pedido", "Fecha", "Cliente", "Correo",
-            "Departamento", "Municipio", "Dirección", "Total",
-            "ID Item", "Producto", "Cantidad", "Precio"
-        ]
-        ws.append(headers)
-
-        for p in pedidos:
+    headers = [
+        "ID Pedido", "Fecha", "Cliente", "Correo",
+        "Departamento", "Municipio", "Dirección", "Total",
+        "ID Item", "Producto", "Cantidad", "Precio"
+    ]
+
+    def _iterar(self, pedidos: Iterable[Any]):
+        # QuerySet: lotes de chunk_size (con sus prefetch por lote); lista u otro iterable: tal cual
+        if hasattr(pedidos, "iterator"):
+            return pedidos.iterator(chunk_size=self.chunk_size)
+        return iter(pedidos)
+
+    def escribir(self, pedidos: Iterable[Any], destino: IO[bytes]) -> None:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title="Ventas")
+
+        for col in range(1, len(self.headers)+1):
+            ws.column_dimensions[get_column_letter(col)].width = 18
+
+        ws.append(self.headers)
+
+        for p in self._iterar(pedidos):
             items = list(p.items.all()) or [None]
             for it in items:
                 ws.append([
@@ -32,10 +49,15 @@ class ExcelReporteVentasGenerator(ReporteVentasGenerator):
                     (float(it.precio) if it else ""),
                 ])
 
-        for col in range(1, len(headers)+1):
-            ws.column_dimensions[get_column_letter(col)].width = 18
+        wb.save(destino)
 
-        from io import BytesIO
+    def render(self, pedidos: Iterable[Any]) -> bytes:
         buf = BytesIO()
-        wb.save(buf)
+        self.escribir(pedidos, buf)
         return buf.getvalue()
+
+    def render_archivo(self, pedidos: Iterable[Any]) -> IO[bytes]:
+        f = SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        self.escribir(pedidos, f)
+        f.seek(0)
+        return f
@@ -1,12 +1,26 @@
 from abc import ABC, abstractmethod
-from typing import Iterable, Protocol, Any
+from tempfile import SpooledTemporaryFile
+from typing import IO, Iterable, Protocol, Any
+
+# Hasta este tamaño el archivo del reporte vive en memoria; después pasa a disco
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
 
 class ReporteVentasGenerator(ABC):
     """Interfaz DIP para generadores de reportes de ventas."""
+    # True si implementa stream(): la vista responde por partes sin archivo intermedio
+    streaming = False
+
     @abstractmethod
     def render(self, pedidos: Iterable[Any]) -> bytes:
         ...
 
+    def render_archivo(self, pedidos: Iterable[Any]) -> IO[bytes]:
+        """Reporte como archivo temporal (posicionado al inicio) para servirlo por partes."""
+        f = SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        f.write(self.render(pedidos))
+        f.seek(0)
+        return f
+
 class HasNombreArchivo(Protocol):
     @property
     def filename(self) -> str: ...
@@ -0,0 +1,159 @@
+# usuario/services/reportes_jobs.py
+"""
+Cola de reportes en base de datos.
+
+- encolar(): valida los filtros, deduplica por firma (formato + parámetros) y
+  reutiliza un reporte ya generado mientras sus filas no cambien (version_datos:
+  huella de las filas del reporte, así cuenta también editar un pedido o ítem).
+- procesar_pendientes(): lo llama el worker (`manage.py procesar_reportes`).
+"""
+import hashlib
+import json
+import traceback
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.core.files import File
+from django.db.models import Max, Q
+from django.utils import timezone
+from pedido.models import Pedido
+
+from ..forms import FiltroReporteForm
+from ..models import ReporteJob
+from .reportes_consulta import filas_reporte, pedidos_para_reporte
+from .reportes_registro import get_generator, validar_formato
+
+
+def _filtros(datos) -> dict:
+    form = FiltroReporteForm(datos)
+    if not form.is_valid():
+        raise ValueError("Filtros inválidos: " + form.errors.as_text())
+    return form.cleaned_data
+
+
+def parametros_de(filtros: dict) -> dict:
+    """cleaned_data de FiltroReporteForm -> dict serializable solo con los filtros usados."""
+    params = {
+        "desde": filtros["desde"].isoformat() if filtros.get("desde") else "",
+        "hasta": filtros["hasta"].isoformat() if filtros.get("hasta") else "",
+        "departamento": (filtros.get("departamento") or "").strip(),
+        "municipio": (filtros.get("municipio") or "").strip(),
+        "producto": filtros["producto"].pk if filtros.get("producto") else "",
+    }
+    return {k: v for k, v in params.items() if v != ""}
+
+
+def firma(formato: str, parametros: dict) -> str:
+    raw = json.dumps({"formato": formato, "parametros": parametros}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _ultimo_pedido_id() -> int:
+    return Pedido.objects.aggregate(m=Max("id"))["m"] or 0
+
+
+def version_datos(filtros: dict, hasta_pedido_id: Optional[int] = None) -> str:
+    """
+    Huella (sha256) de las filas que tendría el reporte con estos filtros: cambia
+    si entra o sale un pedido y también si se edita uno (total, fecha, ítems...).
+    """
+    pedidos = pedidos_para_reporte(filtros)
+    if hasta_pedido_id is not None:
+        pedidos = pedidos.filter(id__lte=hasta_pedido_id)
+    huella = hashlib.sha256()
+    for fila in filas_reporte(pedidos):
+        huella.update(repr(fila).encode("utf-8"))
+    return huella.hexdigest()[:40]
+
+
+def encolar(formato: str, datos, usuario=None) -> Tuple[ReporteJob, bool]:
+    """Devuelve (job, creado). Si hay uno igual en curso o vigente, lo reutiliza."""
+    validar_formato(formato)
+    # Sin 'incremental': un job no mueve checkpoints
+    filtros = _filtros(datos)
+    parametros = parametros_de(filtros)
+    f = firma(formato, parametros)
+    version = version_datos(filtros)
+
+    vigente = (
+        ReporteJob.objects
+        .filter(firma=f)
+        .filter(Q(estado__in=[ReporteJob.PENDIENTE, ReporteJob.PROCESANDO])
+                | Q(estado=ReporteJob.LISTO, version_datos=version))
+        .order_by("-creado")
+        .first()
+    )
+    if vigente:
+        return vigente, False
+
+    # Los archivos viejos con la misma firma ya no sirven (cambiaron sus pedidos)
+    for viejo in ReporteJob.objects.filter(firma=f, estado=ReporteJob.LISTO).exclude(archivo=""):
+        viejo.archivo.delete(save=False)
+        viejo.save(update_fields=["archivo"])
+
+    job = ReporteJob.objects.create(
+        formato=formato, parametros=parametros, firma=f, solicitado_por=usuario,
+    )
+    return job, True
+
+
+def reclamar_siguiente() -> Optional[ReporteJob]:
+    """Toma el pendiente más antiguo con un UPDATE condicional (seguro con varios workers)."""
+    candidatos = (ReporteJob.objects.filter(estado=ReporteJob.PENDIENTE)
+                  .order_by("creado").values_list("id", flat=True)[:10])
+    for job_id in candidatos:
+        tomado = ReporteJob.objects.filter(pk=job_id, estado=ReporteJob.PENDIENTE).update(
+            estado=ReporteJob.PROCESANDO, iniciado=timezone.now(),
+        )
+        if tomado:
+            return ReporteJob.objects.get(pk=job_id)
+    return None
+
+
+def procesar(job: ReporteJob) -> ReporteJob:
+    try:
+        form = FiltroReporteForm(job.parametros)
+        if not form.is_valid():
+            raise ValueError("Filtros inválidos: " + form.errors.as_text())
+        # La huella se toma antes de generar: si algo cambia mientras tanto, el
+        # próximo encolar verá otra versión y lo rehace (nunca al revés)
+        max_id = _ultimo_pedido_id()
+        version = version_datos(form.cleaned_data, max_id)
+        pedidos = pedidos_para_reporte(form.cleaned_data).filter(id__lte=max_id)
+
+        generator = get_generator(job.formato)
+        archivo = generator.render_archivo(pedidos)
+        archivo.seek(0, 2)
+        if archivo.tell() == 0:
+            raise RuntimeError("El generador no produjo contenido.")
+        archivo.seek(0)
+
+        job.archivo.save(generator.filename, File(archivo), save=False)
+        job.version_datos = version
+        job.estado = ReporteJob.LISTO
+        job.error = ""
+    except Exception:
+        job.estado = ReporteJob.ERROR
+        job.error = traceback.format_exc()[-4000:]
+    job.terminado = timezone.now()
+    job.save()
+    return job
+
+
+def liberar_colgados(minutos: int) -> int:
+    """Devuelve a pendiente los jobs que llevan demasiado tiempo 'procesando' (worker caído)."""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return ReporteJob.objects.filter(estado=ReporteJob.PROCESANDO, iniciado__lt=limite).update(
+        estado=ReporteJob.PENDIENTE, iniciado=None,
+    )
+
+
+def procesar_pendientes(maximo: Optional[int] = None) -> int:
+    hechos = 0
+    while maximo is None or hechos < maximo:
+        job = reclamar_siguiente()
+        if job is None:
+            break
+        procesar(job)
+        hechos += 1
+    return hechos
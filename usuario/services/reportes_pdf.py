@@ -1,29 +1,180 @@
 # usuario/services/reportes_pdf.py
-from typing import Iterable, Any
+"""
+Reporte de ventas en PDF con xhtml2pdf.
+
+xhtml2pdf tarda más que lineal con el tamaño del HTML, así que los pedidos se
+renderizan por lotes (REPORTES_PDF_LOTE): el HTML de cada lote se arma aquí
+(necesita la base de datos) y la conversión a PDF, que es puro CPU, va a un
+ProcessPoolExecutor compartido por el proceso (se crea con el primer reporte
+grande y tiene a lo sumo REPORTES_PDF_PROCESOS procesos, sin importar cuántas
+exportaciones corran a la vez). Los lotes se leen, renderizan y envían al pool
+a medida que hay lugar, y los PDF parciales se unen con pypdf según llegan; al final se
+estampa "Página X de N" para que la numeración sea continua.
+"""
+import math
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db.models import QuerySet
 from django.template.loader import render_to_string
+from django.utils import timezone
+from pypdf import PdfReader, PdfWriter
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
 from xhtml2pdf import pisa
 
 from .reportes_interface import ReporteVentasGenerator
 
+
+def _html_a_pdf(html: str) -> Optional[bytes]:
+    """Corre en los procesos del pool: no toca Django, solo xhtml2pdf."""
+    buf = BytesIO()
+    # encoding='utf-8' para caracteres acentuados
+    pisa_status = pisa.CreatePDF(html, dest=buf, encoding='utf-8')
+    if pisa_status.err:
+        return None
+    return buf.getvalue()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _procesos_pool() -> int:
+    return getattr(settings, "REPORTES_PDF_PROCESOS", None) or os.cpu_count() or 1
+
+
+def _pool_compartido() -> ProcessPoolExecutor:
+    """Pool del proceso para todas las exportaciones; no se arma uno por request."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: los hijos no heredan conexiones ni hilos del servidor
+            _pool = ProcessPoolExecutor(max_workers=_procesos_pool(), mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _descartar_pool(roto: ProcessPoolExecutor) -> None:
+    """Si un proceso del pool murió, el próximo reporte arma uno nuevo."""
+    global _pool
+    with _pool_lock:
+        if _pool is roto:
+            _pool = None
+    roto.shutdown(wait=False, cancel_futures=True)
+
+
+def _numerar(writer: PdfWriter) -> None:
+    """Estampa 'Página X de N' al pie de cada página del documento ya unido."""
+    total = len(writer.pages)
+    buf = BytesIO()
+    c = canvas.Canvas(buf)
+    for i, page in enumerate(writer.pages, start=1):
+        ancho, alto = float(page.mediabox.width), float(page.mediabox.height)
+        c.setPageSize((ancho, alto))
+        c.setFont("Helvetica", 8)
+        c.setFillGray(0.45)
+        c.drawCentredString(ancho / 2, 10 * mm, f"Página {i} de {total}")
+        c.showPage()
+    c.save()
+    buf.seek(0)
+    for page, sello in zip(writer.pages, PdfReader(buf).pages):
+        page.merge_page(sello)
+
+
 class PdfReporteVentasGenerator(ReporteVentasGenerator):
+    """
+    Genera un PDF a partir del template HTML usando xhtml2pdf (puro Python).
+    Evitamos dependencias del sistema (GTK/Pango) que requiere WeasyPrint.
+    """
     filename = "reporte_ventas.pdf"
+    content_type = "application/pdf"
+    template_name = "reportes/ventas_pdf.html"
 
-    def render(self, pedidos: Iterable[Any]) -> bytes:
+    def __init__(self, lote: Optional[int] = None, procesos: Optional[int] = None):
+        self.lote = lote or getattr(settings, "REPORTES_PDF_LOTE", 200)
+        # Cuántos procesos del pool compartido usa este reporte a la vez
+        self.procesos = min(procesos or _procesos_pool(), _procesos_pool())
+
+    def _lotes(self, pedidos: Iterable[Any]) -> Iterator[List[Any]]:
+        # QuerySet: se lee por lotes (con sus prefetch por lote); lista u otro iterable: tal cual
+        it = pedidos.iterator(chunk_size=self.lote) if isinstance(pedidos, QuerySet) else iter(pedidos)
+        while True:
+            lote = list(islice(it, self.lote))
+            if not lote:
+                return
+            yield lote
+
+    def _htmls(self, pedidos: Iterable[Any], total: int) -> Iterator[str]:
+        """HTML de cada lote a medida que se pide (un lote leído por adelantado para saber cuál es el último)."""
+        ahora = timezone.now()
+        lotes = self._lotes(pedidos)
+        lote, i = next(lotes, []), 0
+        while True:
+            siguiente = next(lotes, None)
+            yield render_to_string(self.template_name, {
+                "pedidos": lote,
+                "total_pedidos": total,
+                "now": ahora,
+                "primer_lote": i == 0,
+                "ultimo_lote": siguiente is None,
+            })
+            if siguiente is None:
+                return
+            lote, i = siguiente, i + 1
+
+    def _pdfs(self, htmls: Iterator[str], n_lotes: int) -> Iterator[Optional[bytes]]:
         """
-        Genera un PDF a partir del template HTML usando xhtml2pdf (puro Python).
-        Evitamos dependencias del sistema (GTK/Pango) que requiere WeasyPrint.
+        PDF de cada lote, en orden. Con varios procesos se envían lotes al pool
+        a medida que se arma su HTML, con a lo sumo dos por proceso en vuelo,
+        así la memoria no crece con el tamaño del reporte.
         """
-        # Asegúrate de que el template exista en esta ruta:
-        # usuario/templates/usuario/reportes/ventas_pdf.html
-        html = render_to_string("reportes/ventas_pdf.html", {
-            "pedidos": pedidos,
-        })
+        procesos = min(self.procesos, n_lotes)
+        if procesos <= 1:
+            for html in htmls:
+                yield _html_a_pdf(html)
+            return
+        pool = _pool_compartido()
+        en_vuelo = deque()
+        try:
+            for html in htmls:
+                en_vuelo.append(pool.submit(_html_a_pdf, html))
+                if len(en_vuelo) >= 2 * procesos:
+                    yield en_vuelo.popleft().result()
+            while en_vuelo:
+                yield en_vuelo.popleft().result()
+        except BrokenProcessPool:
+            _descartar_pool(pool)
+            raise
+        finally:
+            # Si el reporte se corta a medias, sus lotes pendientes no ocupan el pool
+            for futuro in en_vuelo:
+                futuro.cancel()
+
+    def render(self, pedidos: Iterable[Any]) -> bytes:
+        if isinstance(pedidos, QuerySet):
+            total = pedidos.count()
+        else:
+            pedidos = list(pedidos)
+            total = len(pedidos)
+        n_lotes = max(1, math.ceil(total / self.lote))
+
+        # Cada PDF parcial se une en cuanto llega
+        writer = PdfWriter()
+        for parte in self._pdfs(self._htmls(pedidos, total), n_lotes):
+            if parte is None:
+                # En caso de error, devuelve PDF vacío (o lanza excepción si prefieres)
+                return b""
+            writer.append(PdfReader(BytesIO(parte)))
+        _numerar(writer)
 
         buf = BytesIO()
-        # encoding='utf-8' para caracteres acentuados
-        pisa_status = pisa.CreatePDF(html, dest=buf, encoding='utf-8')
-        if pisa_status.err:
-            # En caso de error, devuelve PDF vacío (o lanza excepción si prefieres)
-            return b""
+        writer.write(buf)
         return buf.getvalue()
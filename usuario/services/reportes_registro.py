@@ -0,0 +1,38 @@
+from typing import Dict, Type
+
+from . import reportes_arrow
+from .reportes_interface import ReporteVentasGenerator
+from .reportes_pdf import PdfReporteVentasGenerator
+from .reportes_excel import ExcelReporteVentasGenerator
+from .reportes_csv import CsvReporteVentasGenerator
+
+# formato -> generador (lo usan las vistas y la cola de reportes)
+GENERADORES: Dict[str, Type[ReporteVentasGenerator]] = {
+    "pdf": PdfReporteVentasGenerator,
+    "xlsx": ExcelReporteVentasGenerator,
+    "csv": CsvReporteVentasGenerator,
+}
+if reportes_arrow.disponible():
+    GENERADORES["parquet"] = reportes_arrow.ParquetReporteVentasGenerator
+    GENERADORES["arrow"] = reportes_arrow.ArrowReporteVentasGenerator
+
+# Formatos que dependen de un paquete opcional: formato -> paquete
+DEPENDENCIAS_OPCIONALES = {"parquet": "pyarrow", "arrow": "pyarrow"}
+
+
+class FormatoNoDisponible(ValueError):
+    """El formato existe pero falta su paquete opcional en este servidor."""
+
+
+def validar_formato(formato: str) -> None:
+    if formato in GENERADORES:
+        return
+    paquete = DEPENDENCIAS_OPCIONALES.get(formato)
+    if paquete:
+        raise FormatoNoDisponible(f"El formato {formato} necesita {paquete}, que no está instalado en el servidor.")
+    raise ValueError(f"Formato de reporte no soportado: {formato}")
+
+
+def get_generator(formato: str) -> ReporteVentasGenerator:
+    validar_formato(formato)
+    return GENERADORES[formato]()
@@ -1,3 +1,821 @@
-from django.test import TestCase
+import csv
+import json
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from decimal import Decimal
+
+from unittest import mock, skipUnless
+
+from django.db import connection
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Barrovivo import rendimiento
+from Barrovivo.consultas import PresupuestoConsultasMiddleware
+from Barrovivo.replicas import PrimariaPegadaMiddleware
+from producto import cache_catalogo
+from producto.models import Categoria, Favorito, Producto
+from django.contrib.auth.models import User
+from openpyxl import load_workbook
+
+from pedido.models import Carrito, ItemCarrito, Pedido, PedidoItem
+
+from . import chat_service, groq_client
+from .metricas_chat import RUTA_LOCAL, metricas
+from .models import ReporteCheckpoint, ReporteJob, VentaAgregada
+from .services import analitica, reportes_arrow, reportes_jobs, reportes_registro
+from .services.reportes_csv import CsvReporteVentasGenerator
+from .services.reportes_consulta import pedidos_para_reporte
+from .services import reportes_pdf
+from .services.reportes_pdf import PdfReporteVentasGenerator
+
+
+class MatcherSinonimosTests(TestCase):
+    def test_primera_mencion(self):
+        casos = {
+            "Quiero una MACETA azul": "matera",
+            "un jarrón con flores para la sala": "jarron",
+            "algo para te y una matera": "pocillo",
+            "bandeja cerámica grande": "plato",
+            "setas": None,
+            "": None,
+        }
+        for texto, esperado in casos.items():
+            self.assertEqual(chat_service._first_canon_in_text(texto), esperado, texto)
+
+    def test_frases_tienen_prioridad_sobre_palabras(self):
+        # "vaso" aparece antes, pero las frases se buscan primero (comportamiento original)
+        self.assertEqual(chat_service._first_canon_in_text("vaso o florero para plantar"), "matera")
+
+    def test_todas_las_menciones_en_orden(self):
+        canons = [c for _, c in chat_service._canons_in_text("una taza y dos platos")]
+        self.assertEqual(canons, ["pocillo", "plato"])
+
+
+class CanonCategoriaTests(TestCase):
+    def setUp(self):
+        caches["catalogo"].clear()
+        self.materas = Categoria.objects.create(nombre="Materas")
+
+    def test_sin_consultas_despues_de_calentar(self):
+        self.assertEqual(chat_service._get_categoria_id("matera"), self.materas.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(chat_service._get_categoria_id("matera"), self.materas.id)
+            self.assertIsNone(chat_service._get_categoria_id("plato"))
+
+    def test_se_refresca_al_cambiar_categorias(self):
+        self.assertIsNone(chat_service._get_categoria_id("jarron"))
+        jarrones = Categoria.objects.create(nombre="Jarrones")
+        self.assertEqual(chat_service._get_categoria_id("jarron"), jarrones.id)
+        jarrones.delete()
+        self.assertIsNone(chat_service._get_categoria_id("jarron"))
+
+    def test_cambio_en_otro_proceso_llega_por_la_version(self):
+        self.assertEqual(chat_service._get_categoria_id("matera"), self.materas.id)
+        # Otro worker renombra la categoría: aquí solo se ve la versión nueva del catálogo
+        Categoria.objects.filter(pk=self.materas.pk).update(nombre="Tazas", slug="tazas")
+        cache_catalogo.invalidar()
+        self.assertIsNone(chat_service._get_categoria_id("matera"))
+
+
+class _GroqStub(BaseHTTPRequestHandler):
+    """Servidor local que imita /chat/completions y cuenta las llamadas."""
+    llamadas = 0
+    demora = 0.0
+
+    def do_POST(self):
+        type(self).llamadas += 1
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.demora)
+        texto = body["messages"][-1]["content"]
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for t in ("Hola", ", ", "mira estas materas."):
+                chunk = {"choices": [{"delta": {"content": t}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+        data = json.dumps({"choices": [{"message": {"content": f"eco: {texto}"}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class GroqClientCacheTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _GroqStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/chat/completions"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        _GroqStub.llamadas = 0
+        _GroqStub.demora = 0.0
+        groq_client._cache_local = None
+        ajustes = override_settings(GROQ_API_URL=self.url, GROQ_CACHE_BACKEND="local", GROQ_CACHE_MAX_ITEMS=2)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _chat(self, texto):
+        return groq_client._post_chat([{"role": "user", "content": texto}])
+
+    def test_cachea_por_mensaje_normalizado(self):
+        self.assertEqual(self._chat("materas azules"), "eco: materas azules")
+        self.assertEqual(self._chat("  Materas   AZULES "), "eco: materas azules")
+        self.assertEqual(_GroqStub.llamadas, 1)
+
+    def test_lru_descarta_la_menos_usada(self):
+        self._chat("a")
+        self._chat("b")
+        self._chat("a")
+        self._chat("c")  # expulsa "b"
+        self._chat("a")
+        self._chat("b")
+        self.assertEqual(_GroqStub.llamadas, 4)
+
+    def test_ttl_expira(self):
+        with override_settings(GROQ_CACHE_TTL=0):
+            self._chat("jarrones")
+            self._chat("jarrones")
+        self.assertEqual(_GroqStub.llamadas, 2)
+
+    def test_peticiones_simultaneas_comparten_una_llamada(self):
+        _GroqStub.demora = 0.3
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            respuestas = list(pool.map(lambda _: self._chat("platos rojos"), range(8)))
+        self.assertEqual(set(respuestas), {"eco: platos rojos"})
+        self.assertEqual(_GroqStub.llamadas, 1)
+
+    def test_backend_django(self):
+        with override_settings(GROQ_CACHE_BACKEND="django:default"):
+            cache.clear()
+            self._chat("tazas")
+            self._chat("tazas")
+        self.assertEqual(_GroqStub.llamadas, 1)
+
+
+class ChatStreamTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _GroqStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/chat/completions"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        groq_client._cache_local = None
+        ajustes = override_settings(GROQ_API_URL=self.url, GROQ_API_KEY="test")
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        materas = Categoria.objects.create(nombre="Materas")
+        self.matera = Producto.objects.create(nombre="Matera verde", precio=Decimal("40000"), cantidad_disp=2)
+        self.matera.categorias.add(materas)
+
+    async def test_stream_productos_y_luego_texto(self):
+        resp = await self.async_client.post(
+            reverse("usuario:chat_api_stream"), {"message": "busco materas"}, content_type="application/json",
+        )
+        self.assertEqual(resp["Content-Type"], "text/event-stream; charset=utf-8")
+        cuerpo = b"".join([chunk async for chunk in resp.streaming_content]).decode()
+
+        eventos = [bloque.split("\n") for bloque in cuerpo.strip().split("\n\n")]
+        nombres = [e[0].removeprefix("event: ") for e in eventos]
+        self.assertEqual(nombres[0], "products")
+        self.assertEqual(nombres[-1], "done")
+        productos = json.loads(eventos[0][1].removeprefix("data: "))["products"]
+        self.assertEqual([p["id"] for p in productos], [self.matera.id])
+        texto = "".join(json.loads(e[1].removeprefix("data: "))["t"] for e in eventos if e[0] == "event: token")
+        self.assertEqual(texto, "Hola, mira estas materas.")
+
+    async def test_mensaje_vacio(self):
+        resp = await self.async_client.post(
+            reverse("usuario:chat_api_stream"), {"message": " "}, content_type="application/json",
+        )
+        self.assertEqual(resp.status_code, 400)
+
+    def test_ruta_local_no_llama_al_llm_para_el_parse(self):
+        metricas.reiniciar()
+        _GroqStub.llamadas = 0
+        resp = self.client.post(
+            reverse("usuario:chat_api"), {"message": "materas verdes"}, content_type="application/json",
+        )
+        self.assertEqual([p["id"] for p in resp.json()["products"]], [self.matera.id])
+        self.assertEqual(_GroqStub.llamadas, 1)  # solo la redacción
+
+        self.client.post(
+            reverse("usuario:chat_api"), {"message": "algo lindo para mi mamá"}, content_type="application/json",
+        )
+        self.assertEqual(_GroqStub.llamadas, 3)  # parse + redacción
+        resumen = metricas.resumen()
+        self.assertEqual(resumen["tasa_sin_llm"], 0.5)
+        self.assertEqual(resumen["rutas"][RUTA_LOCAL]["mensajes"], 1)
+
+    def test_metricas_solo_staff(self):
+        url = reverse("usuario:chat_metricas")
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user(username="staff", is_staff=True))
+        self.assertIn("tasa_sin_llm", self.client.get(url).json())
+
+
+    def test_la_pagina_del_asistente_usa_el_stream(self):
+        resp = self.client.get(reverse("usuario:asistente"))
+        self.assertContains(resp, reverse("usuario:chat_api_stream"))
+        self.assertContains(resp, reverse("usuario:chat_api"))  # fallback JSON
+
+    @override_settings(SERVER_TIMING=True)
+    def test_rendimiento_cuenta_el_tiempo_de_groq(self):
+        rendimiento.metricas.reiniciar()
+        _GroqStub.demora = 0.05
+        self.addCleanup(setattr, _GroqStub, "demora", 0.0)
+        resp = self.client.post(
+            reverse("usuario:chat_api"), {"message": "materas verdes"}, content_type="application/json",
+        )
+        self.assertIn("groq;dur=", resp["Server-Timing"])
+        groq = rendimiento.metricas.resumen()["vistas"]["usuario:chat_api"]["groq"]
+        self.assertGreaterEqual(groq["p50_ms"], 50)
+
+    async def test_rendimiento_del_stream_se_registra_al_terminar(self):
+        rendimiento.metricas.reiniciar()
+        resp = await self.async_client.post(
+            reverse("usuario:chat_api_stream"), {"message": "algo lindo para mi mamá"}, content_type="application/json",
+        )
+        self.assertNotIn("usuario:chat_api_stream", rendimiento.metricas.resumen()["vistas"])
+        [chunk async for chunk in resp.streaming_content]
+
+        vista = rendimiento.metricas.resumen()["vistas"]["usuario:chat_api_stream"]
+        self.assertEqual(vista["requests"], 1)
+        self.assertGreater(vista["groq"]["p50_ms"], 0)
+
+
+class CriteriosLocalesTests(SimpleTestCase):
+    def test_tipo_color_y_precio(self):
+        criteria, confianza = chat_service.extract_criteria_local("Quiero una matera roja de menos de 50 mil")
+        self.assertEqual(criteria["tipo"], "matera")
+        self.assertEqual(criteria["color"], "rojo")
+        self.assertEqual(criteria["rango_precio"], {"min": None, "max": 50000})
+        self.assertEqual(set(criteria), {"uso", "persona", "tipo", "color", "estilo", "rango_precio", "palabras_clave"})
+        self.assertGreaterEqual(confianza, 0.8)
+
+    def test_rangos(self):
+        casos = {
+            "jarrón entre 20 y 80.000": {"min": 20000, "max": 80000},
+            "tazas desde $15.000": {"min": 15000, "max": None},
+            "platos hasta 30k": {"min": None, "max": 30000},
+            "platos no mas de 50 mil": {"min": None, "max": 50000},
+            "materas sobre 40 mil": {"min": 40000, "max": None},
+            "tazas de mas de 20 mil y no mas de 60 mil": {"min": 20000, "max": 60000},
+            "jarrones entre 20 mil y 30": {"min": 20000, "max": 30000},
+            "jarrones entre 20 y 30 mil": {"min": 20000, "max": 30000},
+            "jarrones entre 500 mil y 2 millones": {"min": 500000, "max": 2000000},
+        }
+        for texto, rango in casos.items():
+            self.assertEqual(chat_service.extract_criteria_local(texto)[0]["rango_precio"], rango, texto)
+
+    def test_sobremesa_no_es_un_minimo(self):
+        self.assertIsNone(chat_service.extract_criteria_local("platos sobremesa 2")[0]["rango_precio"])
+
+    def test_baja_confianza(self):
+        self.assertEqual(chat_service.extract_criteria_local("algo lindo para mi mamá")[1], 0.0)
+        _, confianza = chat_service.extract_criteria_local("una taza y un plato decorado estilo rustico")
+        self.assertLess(confianza, 0.8)
+
+    def test_precio_sin_patron_lo_decide_el_llm(self):
+        # Sin "menos de", "hasta"...: el monto no se entiende, y no se puede ignorar con confianza alta
+        for texto in ("materas de 50 mil", "una matera por 20k", "una matera por 30.000"):
+            criteria, confianza = chat_service.extract_criteria_local(texto)
+            self.assertIsNone(criteria["rango_precio"], texto)
+            self.assertLess(confianza, 0.8, texto)
+
+
+class _PedidosReporteMixin:
+    def setUp(self):
+        self.staff = User.objects.create_user(username="staff", is_staff=True)
+        cliente = User.objects.create_user(username="cliente")
+        producto = Producto.objects.create(nombre="Plato Lirio", precio=Decimal("30000"), cantidad_disp=5)
+        for i in range(3):
+            pedido = Pedido.objects.create(
+                usuario=cliente, nombre_cliente=f"Cliente {i}", cedula="1", celular="3",
+                correo="c@b.co", departamento="Antioquia", municipio="Rionegro",
+                direccion="Calle 1", total=Decimal("60000"),
+            )
+            PedidoItem.objects.create(pedido=pedido, producto=producto, cantidad=2, precio=Decimal("30000"))
+        Pedido.objects.create(
+            usuario=cliente, nombre_cliente="Sin items", cedula="1", celular="3", correo="c@b.co",
+            departamento="Antioquia", municipio="Rionegro", direccion="Calle 1", total=Decimal("0"),
+        )
+
+
+class ReporteExcelTests(_PedidosReporteMixin, TestCase):
+    def test_descarga_por_partes_con_todas_las_filas(self):
+        self.client.force_login(self.staff)
+        resp = self.client.get(reverse("usuario:reporte_ventas_excel"))
+
+        self.assertTrue(resp.streaming)
+        self.assertIn('filename="reporte_ventas.xlsx"', resp["Content-Disposition"])
+        wb = load_workbook(BytesIO(b"".join(resp.streaming_content)), read_only=True)
+        filas = list(wb["Ventas"].iter_rows(values_only=True))
+        self.assertEqual(filas[0][0], "ID Pedido")
+        self.assertEqual(len(filas), 1 + 4)
+        self.assertIn("Plato Lirio", [f[9] for f in filas])
+
+    def _ids_excel(self, **params):
+        resp = self.client.get(reverse("usuario:reporte_ventas_excel"), params)
+        wb = load_workbook(BytesIO(b"".join(resp.streaming_content)), read_only=True)
+        return sorted({f[0] for f in list(wb["Ventas"].iter_rows(values_only=True))[1:]})
+
+    def test_filtros(self):
+        self.client.force_login(self.staff)
+        otro = Pedido.objects.order_by("id").first()
+        Pedido.objects.filter(pk=otro.pk).update(municipio="Medellín", fecha=timezone.now() - timedelta(days=10))
+        hoy = timezone.localdate()
+
+        self.assertEqual(self._ids_excel(municipio="medellín"), [otro.id])
+        self.assertNotIn(otro.id, self._ids_excel(desde=hoy.isoformat()))
+        self.assertEqual(len(self._ids_excel(hasta=hoy.isoformat())), 4)
+        producto = Producto.objects.get()
+        self.assertEqual(len(self._ids_excel(producto=producto.id)), 3)
+        resp = self.client.get(reverse("usuario:reporte_ventas_excel"), {"desde": "2026-02-01", "hasta": "2026-01-01"})
+        self.assertEqual(resp.status_code, 400)
+
+    def _ids_excel_incremental(self, **params):
+        resp = self.client.post(reverse("usuario:reporte_ventas_excel"), {"incremental": "on", **params})
+        wb = load_workbook(BytesIO(b"".join(resp.streaming_content)), read_only=True)
+        return sorted({f[0] for f in list(wb["Ventas"].iter_rows(values_only=True))[1:]})
+
+    def test_incremental_solo_pedidos_nuevos(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(len(self._ids_excel_incremental()), 4)
+        self.assertEqual(self._ids_excel_incremental(), [])
+
+        nuevo = Pedido.objects.create(
+            usuario=self.staff, nombre_cliente="Nuevo", cedula="1", celular="3", correo="n@b.co",
+            departamento="Antioquia", municipio="Rionegro", direccion="Calle 2", total=Decimal("1"),
+        )
+        self.assertEqual(self._ids_excel_incremental(), [nuevo.id])
+        # El modo normal sigue exportando todo
+        self.assertEqual(len(self._ids_excel()), 5)
+
+    def test_incremental_solo_por_post(self):
+        self.client.force_login(self.staff)
+        resp = self.client.get(reverse("usuario:reporte_ventas_excel"), {"incremental": "on"})
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(ReporteCheckpoint.objects.exists())
+
+    def test_incremental_filtrado_no_mueve_el_checkpoint_general(self):
+        self.client.force_login(self.staff)
+        otro = Pedido.objects.order_by("id").first()
+        Pedido.objects.filter(pk=otro.pk).update(municipio="Medellín")
+        ultimo = Pedido.objects.latest("id")
+        Pedido.objects.filter(pk=ultimo.pk).update(municipio="Medellín")
+
+        self.assertEqual(self._ids_excel_incremental(municipio="Medellín"), sorted([otro.id, ultimo.id]))
+        # Los de Rionegro, con id menor que el último de Medellín, siguen pendientes sin filtro
+        self.assertEqual(len(self._ids_excel_incremental()), 4)
+        self.assertEqual(ReporteCheckpoint.objects.count(), 2)
+
+    def test_checkpoint_avanza_solo_con_la_descarga_completa(self):
+        self.client.force_login(self.staff)
+        resp = self.client.post(reverse("usuario:reporte_ventas_excel"), {"incremental": "on"})
+        resp.close()  # descarga cortada: no se consumió el cuerpo
+        self.assertEqual(ReporteCheckpoint.objects.get().ultimo_pedido_id, 0)
+
+        self.assertEqual(len(self._ids_excel_incremental()), 4)
+        self.assertEqual(ReporteCheckpoint.objects.get().ultimo_pedido_id, Pedido.objects.latest("id").id)
+
+
+class ReporteFormatoTests(_PedidosReporteMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+
+    def test_csv_por_partes_un_renglon_por_item(self):
+        resp = self.client.get(reverse("usuario:reporte_ventas"), {"format": "csv"})
+        self.assertTrue(resp.streaming)
+        self.assertIn('filename="reporte_ventas.csv"', resp["Content-Disposition"])
+        filas = list(csv.reader(b"".join(resp.streaming_content).decode("utf-8").splitlines()))
+        self.assertEqual(filas[0][:2], ["pedido_id", "fecha"])
+        self.assertEqual(len(filas), 1 + 4)
+        self.assertEqual(sum(1 for f in filas[1:] if f[9] == "Plato Lirio"), 3)
+        self.assertIn(["", "", "", ""], [f[8:] for f in filas[1:]])
+
+    def test_csv_no_instancia_modelos_y_respeta_filtro_de_producto(self):
+        producto = Producto.objects.get()
+        otro = Producto.objects.create(nombre="Taza", precio=Decimal("5"), cantidad_disp=1)
+        pedido = Pedido.objects.order_by("id").first()
+        PedidoItem.objects.create(pedido=pedido, producto=otro, cantidad=1, precio=Decimal("5"))
+
+        with self.assertNumQueries(1):
+            data = CsvReporteVentasGenerator().render(pedidos_para_reporte({"producto": producto}))
+        filas = list(csv.reader(data.decode("utf-8").splitlines()))[1:]
+        self.assertEqual({f[9] for f in filas}, {"Plato Lirio"})
+        self.assertEqual(len(filas), 3)
+
+    def test_formato_desconocido(self):
+        resp = self.client.get(reverse("usuario:reporte_ventas"), {"format": "docx"})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_incremental_por_formato(self):
+        resp = self.client.post(reverse("usuario:reporte_ventas"), {"format": "csv", "incremental": "on"})
+        b"".join(resp.streaming_content)
+        self.assertEqual(ReporteCheckpoint.objects.get(nombre="ventas_csv").ultimo_pedido_id, Pedido.objects.latest("id").id)
+
+    def test_sin_pyarrow_responde_que_falta(self):
+        sin_arrow = {k: v for k, v in reportes_registro.GENERADORES.items() if k not in ("parquet", "arrow")}
+        with mock.patch.dict(reportes_registro.GENERADORES, sin_arrow, clear=True):
+            resp = self.client.get(reverse("usuario:reporte_ventas"), {"format": "parquet"})
+            self.assertEqual(resp.status_code, 501)
+            self.assertIn("pyarrow", resp.content.decode())
+
+            resp = self.client.post(reverse("usuario:reporte_job_crear"), {"formato": "arrow"},
+                                    HTTP_ACCEPT="application/json")
+            self.assertEqual(resp.status_code, 400)
+            self.assertIn("pyarrow", resp.json()["error"])
+            self.assertFalse(ReporteJob.objects.exists())
+
+    @skipUnless(reportes_arrow.disponible(), "pyarrow no está instalado")
+    def test_parquet_y_arrow(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        resp = self.client.get(reverse("usuario:reporte_ventas"), {"format": "parquet"})
+        tabla = pq.read_table(BytesIO(b"".join(resp.streaming_content)))
+        self.assertEqual(tabla.num_rows, 4)
+        self.assertEqual(tabla.schema.field("total").type, pa.decimal128(10, 2))
+
+        resp = self.client.get(reverse("usuario:reporte_ventas"), {"format": "arrow"})
+        tabla = pa.ipc.open_file(BytesIO(b"".join(resp.streaming_content))).read_all()
+        self.assertEqual(sorted(set(tabla.column("pedido_id").to_pylist())),
+                         sorted(Pedido.objects.values_list("id", flat=True)))
+
+
+class ReportePdfTests(_PedidosReporteMixin, TestCase):
+    def _texto(self, data):
+        from pypdf import PdfReader
+        paginas = PdfReader(BytesIO(data)).pages
+        return len(paginas), [p.extract_text() for p in paginas]
+
+    def test_por_lotes_en_paralelo_igual_contenido_y_numeracion_continua(self):
+        pedidos = pedidos_para_reporte({})
+        n_uno, textos_uno = self._texto(PdfReporteVentasGenerator(lote=100, procesos=1).render(pedidos))
+        n_lotes, textos = self._texto(PdfReporteVentasGenerator(lote=1, procesos=2).render(pedidos))
+
+        self.assertGreaterEqual(n_lotes, n_uno)
+        todo = "\n".join(textos)
+        for pedido in Pedido.objects.all():
+            self.assertIn(f"#{pedido.id}", todo)
+        self.assertEqual(todo.count("Reporte de Ventas"), 1)
+        self.assertEqual(todo.count("Documento generado automáticamente"), 1)
+        for i, texto in enumerate(textos, start=1):
+            self.assertIn(f"Página {i} de {n_lotes}", texto)
+        self.assertIn(f"Página 1 de {n_uno}", textos_uno[0])
+
+    def test_lotes_se_arman_a_medida_que_se_convierten(self):
+        gen = PdfReporteVentasGenerator(lote=1, procesos=1)
+        armados = []
+        htmls = (armados.append(h) or h for h in gen._htmls(pedidos_para_reporte({}), 4))
+        pdfs = gen._pdfs(htmls, 4)
+
+        next(pdfs)
+        self.assertEqual(len(armados), 1)
+        self.assertEqual(len(list(pdfs)), 3)
+        self.assertEqual(len(armados), 4)
+
+    @override_settings(REPORTES_PDF_PROCESOS=2)
+    def test_las_exportaciones_comparten_un_pool(self):
+        PdfReporteVentasGenerator(lote=1).render(pedidos_para_reporte({}))
+        pool = reportes_pdf._pool
+        PdfReporteVentasGenerator(lote=1).render(pedidos_para_reporte({}))
+        self.assertIsNotNone(pool)
+        self.assertIs(reportes_pdf._pool, pool)  # no se arma un pool por request
+
+    def test_sin_pedidos(self):
+        n, textos = self._texto(PdfReporteVentasGenerator().render(Pedido.objects.none()))
+        self.assertEqual(n, 1)
+        self.assertIn("No hay pedidos", textos[0])
+
+
+class AnaliticaTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username="staff", is_staff=True)
+        self.platos = Categoria.objects.create(nombre="Platos")
+        self.cocina = Categoria.objects.create(nombre="Cocina")
+        self.plato = Producto.objects.create(nombre="Plato Lirio", precio=Decimal("30000"), cantidad_disp=50)
+        self.plato.categorias.add(self.platos, self.cocina)
+        self.taza = Producto.objects.create(nombre="Taza", precio=Decimal("8000"), cantidad_disp=50)
+
+    def _pedido(self, departamento, lineas, dias=0):
+        pedido = Pedido.objects.create(
+            usuario=self.staff, nombre_cliente="C", cedula="1", celular="3", correo="c@b.co",
+            departamento=departamento, municipio="X", direccion="Calle 1", total=Decimal("0"),
+        )
+        if dias:
+            Pedido.objects.filter(pk=pedido.pk).update(fecha=timezone.now() - timedelta(days=dias))
+            pedido.refresh_from_db()
+        PedidoItem.objects.bulk_create([
+            PedidoItem(pedido=pedido, producto=p, cantidad=c, precio=p.precio) for p, c in lineas
+        ])
+        analitica.registrar_pedido(pedido)
+        return pedido
+
+    def _filas(self):
+        return sorted(VentaAgregada.objects.values_list("dimension", "clave", "fecha", "ingresos", "unidades", "pedidos"))
+
+    def test_incremental_igual_a_reconstruir(self):
+        self._pedido("Antioquia", [(self.plato, 2), (self.taza, 1)])
+        self._pedido("Antioquia", [(self.plato, 1)])
+        self._pedido("Caldas", [(self.taza, 3)], dias=3)
+        incremental = self._filas()
+
+        analitica.reconstruir()
+        self.assertEqual(self._filas(), incremental)
+
+        hoy = VentaAgregada.objects.get(dimension=VentaAgregada.DIA, fecha=timezone.localdate())
+        self.assertEqual((hoy.ingresos, hoy.unidades, hoy.pedidos), (Decimal("98000"), 4, 2))
+        cocina = VentaAgregada.objects.get(dimension=VentaAgregada.CATEGORIA, clave=str(self.cocina.id))
+        self.assertEqual((cocina.ingresos, cocina.pedidos), (Decimal("90000"), 2))
+
+    def test_tablero_lee_solo_la_tabla_agregada(self):
+        self._pedido("Antioquia", [(self.plato, 2), (self.taza, 1)])
+        self._pedido("Caldas", [(self.taza, 3)], dias=40)
+        self.client.force_login(self.staff)
+
+        # 4 consultas agregadas + 2 de nombres (productos y categorías), sin tocar Pedido
+        hoy = timezone.localdate()
+        with self.assertNumQueries(6):
+            analitica.resumen(hoy - timedelta(days=29), hoy)
+
+        resp = self.client.get(reverse("usuario:reportes_analitica"))
+        self.assertEqual(resp.context["totales"]["ingresos"], Decimal("68000"))
+        self.assertEqual([f["nombre"] for f in resp.context["productos"]], ["Plato Lirio", "Taza"])
+        self.assertEqual([f["nombre"] for f in resp.context["departamentos"]], ["Antioquia"])
+
+        resp = self.client.get(reverse("usuario:reportes_analitica"),
+                               {"desde": (timezone.localdate() - timedelta(days=60)).isoformat()})
+        self.assertEqual(resp.context["totales"]["pedidos"], 2)
+
+
+class ReporteJobTests(_PedidosReporteMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.client.force_login(self.staff)
+
+    def _encolar(self, **datos):
+        return self.client.post(
+            reverse("usuario:reporte_job_crear"), {"formato": "xlsx", **datos},
+            HTTP_ACCEPT="application/json",
+        )
+
+    def test_encola_procesa_y_descarga(self):
+        resp = self._encolar(municipio="Rionegro")
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.json()["id"]
+        self.assertEqual(resp.json()["estado"], ReporteJob.PENDIENTE)
+
+        self.assertEqual(reportes_jobs.procesar_pendientes(), 1)
+        estado = self.client.get(reverse("usuario:reporte_job_estado", args=[job_id])).json()
+        self.assertEqual(estado["estado"], ReporteJob.LISTO)
+
+        resp = self.client.get(estado["descarga"])
+        self.assertIn('filename="reporte_ventas.xlsx"', resp["Content-Disposition"])
+        wb = load_workbook(BytesIO(b"".join(resp.streaming_content)), read_only=True)
+        self.assertEqual(len(list(wb["Ventas"].iter_rows(values_only=True))), 1 + 4)
+
+    def test_solicitudes_iguales_comparten_job(self):
+        primero = self._encolar(municipio="Rionegro").json()["id"]
+        resp = self._encolar(municipio="Rionegro")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["id"], primero)
+        self.assertNotEqual(self._encolar(municipio="Medellín").json()["id"], primero)
+        self.assertNotEqual(self._encolar(formato="pdf", municipio="Rionegro").json()["id"], primero)
+
+    def test_pedido_nuevo_invalida_el_reporte_listo(self):
+        primero = self._encolar().json()["id"]
+        reportes_jobs.procesar_pendientes()
+        self.assertEqual(self._encolar().json()["id"], primero)
+
+        Pedido.objects.create(
+            usuario=self.staff, nombre_cliente="Nuevo", cedula="1", celular="3", correo="n@b.co",
+            departamento="Antioquia", municipio="Rionegro", direccion="Calle 2", total=Decimal("1"),
+        )
+        resp = self._encolar()
+        self.assertEqual(resp.status_code, 202)
+        self.assertNotEqual(resp.json()["id"], primero)
+        self.assertFalse(ReporteJob.objects.get(pk=primero).archivo)
+
+    def test_editar_un_pedido_invalida_el_reporte_listo(self):
+        primero = self._encolar().json()["id"]
+        reportes_jobs.procesar_pendientes()
+        self.assertEqual(self._encolar().json()["id"], primero)
+
+        # Mismo número de pedidos y mismo id máximo: solo cambia el total de uno
+        pedido = Pedido.objects.order_by("id").first()
+        Pedido.objects.filter(pk=pedido.pk).update(total=pedido.total + 1)
+        resp = self._encolar()
+        self.assertEqual(resp.status_code, 202)
+        self.assertNotEqual(resp.json()["id"], primero)
+
+    def test_formato_y_filtros_invalidos(self):
+        self.assertEqual(self._encolar(formato="docx").status_code, 400)
+        self.assertEqual(self._encolar(desde="2026-02-01", hasta="2026-01-01").status_code, 400)
+        self.assertFalse(ReporteJob.objects.exists())
+
+    def test_descarga_antes_de_terminar_da_404(self):
+        job_id = self._encolar().json()["id"]
+        resp = self.client.get(reverse("usuario:reporte_job_descargar", args=[job_id]))
+        self.assertEqual(resp.status_code, 404)
+
+
+class PlanesDeConsultaTests(TestCase):
+    """
+    EXPLAIN QUERY PLAN de las consultas de las vistas más visitadas: ninguna
+    puede recorrer completa una tabla que crece con el negocio (sin índice).
+    """
+    TABLAS = {
+        "producto_producto", "producto_producto_categorias", "producto_favorito",
+        "pedido_pedido", "pedido_pedidoitem", "pedido_itemcarrito",
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="ana", password="x")
+        platos = Categoria.objects.create(nombre="Platos")
+        productos = Producto.objects.bulk_create([
+            Producto(nombre=f"Plato {i:02d}", precio=Decimal("1000") * (i + 1), cantidad_disp=5,
+                     unidades_vendidas=i % 4, es_activo=i % 10 != 0)
+            for i in range(30)
+        ])
+        for p in productos:
+            p.categorias.add(platos)
+            p.save()  # índice de búsqueda
+        cls.producto = productos[1]
+        Favorito.objects.create(usuario=cls.user, producto=cls.producto)
+        ItemCarrito.objects.create(carrito=Carrito.objects.create(usuario=cls.user), producto=cls.producto)
+        for _ in range(3):
+            pedido = Pedido.objects.create(
+                usuario=cls.user, nombre_cliente="Ana", cedula="1", celular="3", correo="a@b.co",
+                departamento="Antioquia", municipio="Medellín", direccion="Calle 1", total=Decimal("2000"),
+            )
+            PedidoItem.objects.create(pedido=pedido, producto=cls.producto, cantidad=1, precio=Decimal("2000"))
+
+    def setUp(self):
+        cache.clear()
+        caches["catalogo"].clear()
+        self.client.force_login(self.user)
+
+    def _recorridos_completos(self, queries):
+        """[(sql, línea del plan)] para cada 'SCAN <tabla>' sin índice sobre TABLAS."""
+        malos = []
+        with connection.cursor() as c:
+            for q in queries:
+                sql = q["sql"]
+                if not sql.lstrip().upper().startswith("SELECT"):
+                    continue
+                c.execute("EXPLAIN QUERY PLAN " + sql)
+                for fila in c.fetchall():
+                    detalle = fila[-1]
+                    partes = detalle.split()
+                    if partes[:1] == ["SCAN"] and len(partes) > 1 and partes[1] in self.TABLAS and "USING" not in partes:
+                        malos.append((sql, detalle))
+        return malos
+
+    def _verificar(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self._recorridos_completos(ctx.captured_queries), [], f"{url} {params}")
+        return resp
+
+    def test_catalogo_y_home(self):
+        resp = self._verificar(reverse("producto:inicio"))
+        self._verificar(reverse("producto:inicio") + resp.context["pagina_siguiente_url"])
+        for orden in ("", "mas", "menos"):
+            resp = self._verificar(reverse("usuario:home"), orden=orden)
+        self._verificar(reverse("usuario:home") + resp.context["pagina_siguiente_url"])
+        self._verificar(reverse("usuario:home"), cat="platos", min="2000")
+        self._verificar(reverse("usuario:home"), q="plato")
+
+    def test_detalle_favoritos_carrito_y_perfil(self):
+        self._verificar(reverse("producto:detalle", args=[self.producto.pk]))
+        self._verificar(reverse("producto:favoritos"))
+        self._verificar(reverse("pedido:carrito"))
+        resp = self._verificar(reverse("usuario:perfil"))
+        self.assertEqual(len(resp.context["pedidos"]), 3)
+
+    def test_reporte_por_rango_de_fechas(self):
+        hoy = timezone.localdate()
+        with CaptureQueriesContext(connection) as ctx:
+            list(pedidos_para_reporte({"desde": hoy, "hasta": hoy}))
+        self.assertEqual(self._recorridos_completos(ctx.captured_queries), [])
+
+    def test_detecta_un_recorrido_completo(self):
+        # Sin índice sobre precio: así se ve una regresión
+        with CaptureQueriesContext(connection) as ctx:
+            list(Producto.objects.filter(precio__gt=0).order_by("precio")[:5])
+        self.assertEqual(len(self._recorridos_completos(ctx.captured_queries)), 1)
+
+
+class RendimientoTests(TestCase):
+    def setUp(self):
+        rendimiento.metricas.reiniciar()
+        caches["catalogo"].clear()
+        Producto.objects.create(nombre="Matera", precio=Decimal("50000"), cantidad_disp=5)
+
+    def test_mide_db_y_plantillas_por_vista(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("producto:inicio")))  # apagado por defecto
+        rendimiento.metricas.reiniciar()
+        caches["catalogo"].clear()
+        with override_settings(SERVER_TIMING=True):
+            resp = self.client.get(reverse("producto:inicio"))
+
+        self.assertRegex(resp["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ consultas", plantillas;dur=[\d.]+, total;dur=')
+        vista = rendimiento.metricas.resumen()["vistas"]["producto:inicio"]
+        self.assertEqual(vista["requests"], 1)
+        self.assertGreater(vista["consultas"]["p50"], 0)
+        self.assertGreater(vista["plantillas"]["p50_ms"], 0)
+        self.assertGreaterEqual(vista["total"]["p50_ms"], vista["db"]["p50_ms"] + vista["plantillas"]["p50_ms"])
+
+    def test_percentiles_de_la_ventana(self):
+        for ms in range(1, 101):
+            medicion = rendimiento.Medicion()
+            medicion.segundos["total"] = ms / 1000
+            rendimiento.metricas.registrar("producto:detalle", medicion)
+
+        total = rendimiento.metricas.resumen()["vistas"]["producto:detalle"]["total"]
+        self.assertEqual((total["p50_ms"], total["p95_ms"], total["p99_ms"]), (51.0, 95.0, 99.0))
+
+    async def test_middlewares_propios_no_fuerzan_modo_sync(self):
+        # En ASGI la vista async del chat no debe pasar por saltos sync_to_async/async_to_sync
+        async def vista(request):
+            return HttpResponse("ok")
+
+        for clase in (rendimiento.RendimientoMiddleware, PresupuestoConsultasMiddleware, PrimariaPegadaMiddleware):
+            middleware = clase(vista)
+            self.assertTrue(iscoroutinefunction(middleware), clase.__name__)
+            resp = await middleware(AsyncRequestFactory().get("/"))
+            self.assertEqual(resp.status_code, 200)
+
+    def test_sin_ruta_no_crea_una_serie_por_url(self):
+        self.client.get("/no-existe/1/")
+        self.client.get("/no-existe/2/")
+        self.assertEqual(list(rendimiento.metricas.resumen()["vistas"]), [rendimiento.SIN_RUTA])
+
+    @override_settings(METRICAS_TOKEN="secreto")
+    def test_prometheus_para_staff_o_con_token(self):
+        self.client.get(reverse("producto:inicio"))
+        url = reverse("usuario:rendimiento_prometheus")
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer otro").status_code, 403)
+        resp = self.client.get(url, HTTP_AUTHORIZATION="Bearer secreto")
+        self.assertEqual(resp["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        texto = resp.content.decode()
+        self.assertIn("# TYPE barrovivo_request_segundos summary", texto)
+        self.assertIn('barrovivo_request_segundos_count{vista="producto:inicio",componente="total"} 1', texto)
+        self.assertRegex(texto, r'barrovivo_request_consultas\{vista="producto:inicio",quantile="0.99"\} \d+')
+
+        self.client.force_login(User.objects.create_user(username="staff", is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_json_solo_staff(self):
+        url = reverse("usuario:rendimiento_metricas")
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user(username="staff", is_staff=True))
+        self.assertIn("vistas", self.client.get(url).json())
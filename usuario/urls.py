@@ -1,7 +1,11 @@
 from django.urls import path
-from .views import InicioView, IniciarSesionView, CerrarSesionView, PerfilView, CrearCuentaView, chat_api, AsistenteView 
+from .views import (
+    InicioView, IniciarSesionView, CerrarSesionView, PerfilView, CrearCuentaView, chat_api, chat_api_stream, ChatMetricasView, CacheMetricasView, AsistenteView,
+    RendimientoMetricasView, RendimientoPrometheusView,
+)
 from .views_reportes import (
-    ReportesIndexView, ReporteVentasPDFView, ReporteVentasExcelView
+    ReportesIndexView, AnaliticaVentasView, ReporteVentasView, ReporteVentasPDFView, ReporteVentasExcelView,
+    ReporteJobCrearView, ReporteJobEstadoView, ReporteJobDescargarView,
 )
 app_name = 'usuario'
 
@@ -12,10 +16,20 @@ urlpatterns = [
     path('perfil/', PerfilView.as_view(), name='perfil'),
     path('registro/', CrearCuentaView.as_view(), name='registro'),
     path('api/chat/', chat_api, name='chat_api'),
+    path('api/chat/stream/', chat_api_stream, name='chat_api_stream'),
+    path('api/chat/metricas/', ChatMetricasView.as_view(), name='chat_metricas'),
+    path('api/cache/metricas/', CacheMetricasView.as_view(), name='cache_metricas'),
+    path('api/rendimiento/metricas/', RendimientoMetricasView.as_view(), name='rendimiento_metricas'),
+    path('api/rendimiento/metricas/prometheus/', RendimientoPrometheusView.as_view(), name='rendimiento_prometheus'),
     path('asistente/', AsistenteView.as_view(), name='asistente'),
 
     # --- Reportes solo para admin/staff ---
     path("reportes/", ReportesIndexView.as_view(), name="reportes_index"),
+    path("reportes/analitica/", AnaliticaVentasView.as_view(), name="reportes_analitica"),
+    path("reportes/ventas/", ReporteVentasView.as_view(), name="reporte_ventas"),
     path("reportes/ventas/pdf/", ReporteVentasPDFView.as_view(), name="reporte_ventas_pdf"),
     path("reportes/ventas/excel/", ReporteVentasExcelView.as_view(), name="reporte_ventas_excel"),
+    path("reportes/jobs/", ReporteJobCrearView.as_view(), name="reporte_job_crear"),
+    path("reportes/jobs/<int:pk>/", ReporteJobEstadoView.as_view(), name="reporte_job_estado"),
+    path("reportes/jobs/<int:pk>/descargar/", ReporteJobDescargarView.as_view(), name="reporte_job_descargar"),
 ]
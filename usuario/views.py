@@ -13,15 +13,25 @@ from django.contrib import messages
 from .forms import CrearCuentaForm
 from pedido.models import Pedido
 from producto.models import Producto, Categoria, Favorito
+from producto import cache_catalogo
+from Barrovivo import rendimiento
 
+import asyncio
 import json
-from django.http import JsonResponse, HttpRequest
+import time
+import traceback
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, HttpRequest, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
+from django.views import View
 
-from .groq_client import extract_criteria, write_answer
-from .chat_service import search_products
+from .groq_client import extract_criteria, write_answer, async_client, aextract_criteria, astream_answer
+from .chat_service import search_products, asearch_products, criterios_cambian_busqueda, extract_criteria_local
+from .metricas_chat import metricas, RUTA_LOCAL, RUTA_LLM
+from .views_reportes import StaffRequiredMixin
 
 
 
@@ -40,14 +50,17 @@ from django.contrib import messages
 from .forms import CrearCuentaForm
 from pedido.models import Pedido
 from producto.models import Producto, Categoria, Favorito
+from producto.paginacion import KeysetPaginacionMixin
+from producto import busqueda
 
 
 
 
 
-class InicioView(TemplateView):
-    """Home: lista de productos con filtros por categoría, precio y ventas."""
+class InicioView(KeysetPaginacionMixin, TemplateView):
+    """Home: lista de productos con filtros por categoría, precio y ventas (paginada por cursor)."""
     template_name = "home.html"
+    presupuesto_consultas = 12
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
@@ -56,6 +69,11 @@ class InicioView(TemplateView):
         productos = Producto.objects.filter(es_activo=True, cantidad_disp__gt=0)
 
         # --- Filtros ---
+        # Búsqueda de texto (?q=...) sobre el índice FTS
+        consulta = (req.get("q") or "").strip()
+        if consulta:
+            productos = busqueda.buscar(productos, consulta.split())
+
         # Categorías seleccionadas (?cat=platos&cat=sets)
         slugs = req.getlist("cat")
         if slugs:
@@ -75,37 +93,34 @@ class InicioView(TemplateView):
         if pmax is not None:
             productos = productos.filter(precio__lte=pmax)
 
-        # --- Anotar ventas ---
-        productos = productos.annotate(
-            ventas=Coalesce(Sum("pedidoitem__cantidad"), 0)
-        )
-
-        # --- Ordenar ---
+        # --- Ordenar (ventas = contador desnormalizado Producto.unidades_vendidas) ---
         orden = req.get("orden", "")
         if orden == "mas":
-            productos = productos.order_by("-ventas", "-id")
+            campos_orden = ("-unidades_vendidas", "-id")
         elif orden == "menos":
-            productos = productos.order_by("ventas", "-id")
+            campos_orden = ("unidades_vendidas", "-id")
+        elif consulta:
+            campos_orden = ("-relevancia", "-id")
         else:
-            productos = productos.order_by("-id")
+            campos_orden = ("-id",)
+        # La página (sin datos del usuario) sale de la caché del catálogo
+        pagina = cache_catalogo.obtener("inicio", self.request, lambda: self.paginar(productos, campos_orden))
 
-        # --- Marcar favoritos ---
-        if self.request.user.is_authenticated:
-            fav_ids = set(
-                Favorito.objects.filter(usuario=self.request.user)
-                .values_list("producto_id", flat=True)
-            )
-            for p in productos:
-                p.es_favorito = p.id in fav_ids
+        # --- Marcar favoritos (solo la página visible) ---
+        Favorito.marcar(self.request.user, pagina.items)
 
         # --- Contexto ---
+        ctx.update(self.contexto_paginacion(pagina))
         ctx.update({
-            "productos": productos,
-            "categorias": Categoria.objects.order_by("nombre"),
+            "productos": pagina.items,
+            "categorias": cache_catalogo.obtener(
+                "categorias", None, lambda: list(Categoria.objects.order_by("nombre"))
+            ),
             "cats_seleccionadas": set(slugs),
             "precio_min": req.get("min", ""),
             "precio_max": req.get("max", ""),
             "orden": orden,
+            "q": consulta,
         })
         return ctx
     
@@ -129,10 +144,12 @@ class PerfilView(LoginRequiredMixin, TemplateView):
     """Página de perfil (solo autenticados)."""
     template_name = 'perfil.html'
     login_url = reverse_lazy('usuario:login')
+    presupuesto_consultas = 10
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        pedidos = Pedido.objects.filter(usuario=self.request.user).order_by('-fecha')
+        # Líneas y productos de todos los pedidos en una consulta más (no una por pedido)
+        pedidos = Pedido.objects.filter(usuario=self.request.user).order_by('-fecha').con_items()
         ctx["pedidos"] = pedidos
         return ctx
 
@@ -169,10 +186,110 @@ def chat_api(request: HttpRequest):
         return JsonResponse({"error": "Falta 'message'"}, status=400)
 
     try:
-        criteria = extract_criteria(user_text)          # 1) GROQ parse
+        inicio = time.perf_counter()
+        criteria, ruta = _criterios_locales(user_text)  # 1) reglas locales...
+        if criteria is None:
+            criteria = extract_criteria(user_text)      # 1) ...o GROQ parse
         products = search_products(criteria, user_text, limit=8)  # 2) BD con sinónimos
         answer = write_answer(criteria, products)       # 3) GROQ redacción
+        metricas.registrar(ruta, time.perf_counter() - inicio)
         return JsonResponse({"ok": True, "text": answer, "products": products})
     except Exception as e:
         import traceback; traceback.print_exc()
-        return JsonResponse({"ok": False, "error": str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+
+
+def _criterios_locales(user_text: str):
+    """(criterios, RUTA_LOCAL) si las reglas locales superan el umbral; si no (None, RUTA_LLM)."""
+    criteria, confianza = extract_criteria_local(user_text)
+    if confianza >= getattr(settings, "CHAT_UMBRAL_SIN_LLM", 0.8):
+        return criteria, RUTA_LOCAL
+    return None, RUTA_LLM
+
+
+class ChatMetricasView(StaffRequiredMixin, View):
+    """GET (staff): tasa de mensajes sin parse del LLM y p50/p95 por ruta."""
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(metricas.resumen())
+
+
+class CacheMetricasView(StaffRequiredMixin, View):
+    """GET (staff): aciertos/fallos de la caché del catálogo por vista (por proceso)."""
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(cache_catalogo.metricas.resumen())
+
+
+class RendimientoMetricasView(StaffRequiredMixin, View):
+    """GET (staff): p50/p95/p99 de tiempo total, DB, plantillas y GROQ, y consultas, por vista (por proceso)."""
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(rendimiento.metricas.resumen())
+
+
+class RendimientoPrometheusView(View):
+    """GET: lo mismo en formato de texto de Prometheus. Staff o `Authorization: Bearer <METRICAS_TOKEN>`."""
+    def get(self, request, *args, **kwargs):
+        token = getattr(settings, "METRICAS_TOKEN", "")
+        por_token = bool(token) and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+        if not (por_token or request.user.is_staff):
+            return HttpResponse(status=403)
+        return HttpResponse(rendimiento.metricas.prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _evento_sse(evento: str, data: dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@csrf_exempt
+@require_POST
+async def chat_api_stream(request: HttpRequest):
+    """
+    POST: { "message": "texto del usuario" }
+    RESP: text/event-stream con eventos
+      products -> { products[] }   (en cuanto termina la búsqueda)
+      token    -> { t }            (fragmentos de la respuesta del LLM)
+      done / error
+    La búsqueda por texto corre en paralelo con el parse del LLM; solo se repite
+    si los criterios (color, palabras clave, tipo) la cambian.
+    """
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except Exception:
+        return JsonResponse({"error": "JSON inválido"}, status=400)
+
+    user_text = (payload.get("message") or "").strip()
+    if not user_text:
+        return JsonResponse({"error": "Falta 'message'"}, status=400)
+
+    async def eventos():
+        inicio = time.perf_counter()
+        criteria, ruta = _criterios_locales(user_text)
+        async with async_client() as client:
+            especulativa = asyncio.ensure_future(asearch_products(criteria or {}, user_text, limit=8))
+            try:
+                if criteria is None:
+                    criteria = await aextract_criteria(client, user_text)       # 1) GROQ parse
+                    cambia = criterios_cambian_busqueda(criteria, user_text)
+                else:
+                    cambia = False                                             # 1) reglas locales
+                if cambia:
+                    especulativa.cancel()
+                    products = await asearch_products(criteria, user_text, limit=8)  # 2) BD con criterios
+                else:
+                    products = await especulativa                              # 2) ya estaba lista
+                yield _evento_sse("products", {"products": products})
+
+                async for delta in astream_answer(client, criteria, products):  # 3) GROQ redacción
+                    yield _evento_sse("token", {"t": delta})
+                yield _evento_sse("done", {})
+                metricas.registrar(ruta, time.perf_counter() - inicio)
+            except Exception as e:
+                traceback.print_exc()
+                yield _evento_sse("error", {"error": str(e)})
+            finally:
+                if not especulativa.done():
+                    especulativa.cancel()
+
+    resp = StreamingHttpResponse(eventos(), content_type="text/event-stream; charset=utf-8")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # que nginx no acumule el stream
+    return resp